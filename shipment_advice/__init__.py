@@ -1,2 +1,5 @@
+from . import controllers
 from . import models
 from . import wizards
+from . import report
+from .hooks import pre_init_hook
@@ -4,11 +4,12 @@
 {
     "name": "Shipment Advice",
     "summary": "Manage your (un)loading process through shipment advices.",
-    "version": "13.0.1.3.0",
+    "version": "13.0.1.4.0",
     "author": "Camptocamp, Odoo Community Association (OCA)",
     "website": "https://github.com/OCA/stock-logistics-transport",
     "category": "Warehouse Management",
     "depends": [
+        "bus",
         "stock",
         "delivery",
         # OCA/stock-logistics-transport
@@ -17,20 +18,30 @@
     "data": [
         "security/ir.model.access.csv",
         "data/ir_sequence.xml",
+        "data/ir_cron.xml",
+        "views/assets.xml",
         "views/res_config_settings.xml",
         "views/shipment_advice.xml",
         "views/stock_picking.xml",
         "views/stock_package_level.xml",
         "views/stock_move.xml",
         "views/stock_move_line.xml",
+        "views/stock_dock.xml",
         "wizards/plan_shipment.xml",
         "wizards/unplan_shipment.xml",
         "wizards/load_shipment.xml",
         "wizards/unload_shipment.xml",
+        "wizards/transfer_shipment.xml",
+        "wizards/load_deliveries_shipment.xml",
+        "wizards/cross_dock_shipment.xml",
         "report/reports.xml",
         "report/report_shipment_advice.xml",
+        "report/shipment_advice_throughput_report.xml",
+        "report/shipment_advice_dock_report.xml",
     ],
+    "qweb": ["static/src/xml/dock_screen.xml"],
     "demo": ["demo/stock_dock.xml"],
+    "pre_init_hook": "pre_init_hook",
     "license": "AGPL-3",
     "installable": True,
     "application": False,
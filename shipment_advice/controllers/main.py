@@ -0,0 +1,19 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo.http import request
+
+from odoo.addons.bus.controllers.main import BusController
+
+
+class ShipmentAdviceBusController(BusController):
+    def _poll(self, dbname, channels, last, options):
+        """Listen to the channels of the shipment advices the user can read."""
+        if request.session.uid and options.get("shipment_advice_ids"):
+            channels = list(channels)
+            channels.extend(
+                request.env["shipment.advice"]._get_readable_bus_channels(
+                    options["shipment_advice_ids"]
+                )
+            )
+        return super()._poll(dbname, channels, last, options)
@@ -0,0 +1,64 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+import logging
+
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+
+def pre_init_hook(cr):
+    init_move_line_weight(cr)
+
+
+def init_move_line_weight(cr):
+    """Initialize the weight of existing move lines in SQL.
+
+    Letting the ORM compute it for all the move lines of the database would
+    take ages on big databases.
+    """
+    if sql.column_exists(cr, "stock_move_line", "weight"):
+        return
+    _logger.info("Initializing stock_move_line.weight column...")
+    sql.create_column(cr, "stock_move_line", "weight", "numeric")
+    cr.execute(
+        """
+        WITH line_weight AS (
+            SELECT ml.id,
+                ml.package_level_id,
+                COALESCE(pp.weight, 0) * (
+                    CASE WHEN ml.qty_done > 0
+                        THEN ml.qty_done / line_uom.factor * product_uom.factor
+                        ELSE ml.product_qty
+                    END
+                ) AS weight
+            FROM stock_move_line ml
+            JOIN product_product pp ON pp.id = ml.product_id
+            JOIN product_template pt ON pt.id = pp.product_tmpl_id
+            JOIN uom_uom line_uom ON line_uom.id = ml.product_uom_id
+            JOIN uom_uom product_uom ON product_uom.id = pt.uom_id
+        ), package_weight AS (
+            SELECT line_weight.id,
+                line_weight.weight,
+                package.shipping_weight,
+                SUM(line_weight.weight)
+                    OVER (PARTITION BY line_weight.package_level_id)
+                    AS package_lines_weight
+            FROM line_weight
+            LEFT JOIN stock_package_level pl
+                ON pl.id = line_weight.package_level_id
+            LEFT JOIN stock_quant_package package ON package.id = pl.package_id
+        )
+        UPDATE stock_move_line ml
+        SET weight = CASE
+            WHEN package_weight.shipping_weight > 0
+                AND package_weight.package_lines_weight > 0
+            THEN package_weight.shipping_weight * package_weight.weight
+                / package_weight.package_lines_weight
+            ELSE package_weight.weight
+        END
+        FROM package_weight
+        WHERE package_weight.id = ml.id;
+        """
+    )
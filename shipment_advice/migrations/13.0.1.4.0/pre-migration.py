@@ -0,0 +1,8 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo.addons.shipment_advice.hooks import init_move_line_weight
+
+
+def migrate(cr, version):
+    init_move_line_weight(cr)
@@ -1,7 +1,12 @@
 from . import res_company
 from . import res_config_settings
+from . import stock_dock
+from . import stock_dock_distance
 from . import stock_move
 from . import stock_move_line
 from . import stock_package_level
+from . import stock_quant_package
 from . import shipment_advice
 from . import stock_picking
+from . import shipment_advice_scan
+from . import shipment_advice_event
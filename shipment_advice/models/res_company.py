@@ -23,3 +23,18 @@ class ResCompany(models.Model):
             "deliveries will be shipped by several trucks."
         ),
     )
+    shipment_advice_scan_dedup_window = fields.Integer(
+        string="Shipment Advice: Scan deduplication window (hours)",
+        default=24,
+        help=(
+            "How long the idempotency keys of the scans sent by devices are "
+            "kept. A scan received again during this period is not applied twice."
+        ),
+    )
+    shipment_advice_auto_close = fields.Boolean(
+        string="Shipment Advice: Close automatically",
+        help=(
+            "Close automatically the shipment advices in progress once their "
+            "departure date is over."
+        ),
+    )
@@ -10,3 +10,31 @@ class ResConfigSettings(models.TransientModel):
     shipment_advice_outgoing_backorder_policy = fields.Selection(
         related="company_id.shipment_advice_outgoing_backorder_policy", readonly=False
     )
+    shipment_advice_scan_dedup_window = fields.Integer(
+        related="company_id.shipment_advice_scan_dedup_window", readonly=False
+    )
+    shipment_advice_auto_close = fields.Boolean(
+        related="company_id.shipment_advice_auto_close", readonly=False
+    )
+    shipment_advice_auto_progress_chunk_size = fields.Integer(
+        string="Shipment Advice: Auto-progression chunk size",
+        config_parameter="shipment_advice.auto_progress_chunk_size",
+        default=100,
+    )
+    shipment_advice_closing_workers = fields.Integer(
+        string="Shipment Advice: Closing workers",
+        config_parameter="shipment_advice.closing_workers",
+        default=1,
+    )
+    shipment_advice_dock_report_materialized = fields.Boolean(
+        string="Shipment Advice: Materialized dock utilization report",
+        config_parameter="shipment_advice.dock_report_materialized",
+    )
+
+    def set_values(self):
+        report = self.env["shipment.advice.dock.report"]
+        materialized = report._is_materialized()
+        super().set_values()
+        if report._is_materialized() != materialized:
+            # Switch between a plain and a materialized view
+            report.init()
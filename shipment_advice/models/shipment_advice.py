@@ -1,8 +1,30 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+
 from odoo import _, api, fields, models
-from odoo.exceptions import UserError
+from odoo.exceptions import AccessError, MissingError, UserError, ValidationError
+from odoo.tools import float_compare, float_is_zero
+from odoo.tools.lru import LRU
+
+from ..utils import optimize_route
+
+_logger = logging.getLogger(__name__)
+
+# Content snapshots of shipments, see `ShipmentAdvice._get_content_snapshot`
+CONTENT_SNAPSHOT_CACHE = LRU(1024)
+# Dock occupancy by (database, warehouse), kept a minute at most
+DOCK_OCCUPANCY_CACHE = LRU(256)
+DOCK_OCCUPANCY_CACHE_TIMEOUT = 60
 
 
 class ShipmentAdvice(models.Model):
@@ -64,6 +86,30 @@ class ShipmentAdvice(models.Model):
         readonly=True,
         index=True,
     )
+    recommended_dock_id = fields.Many2one(
+        comodel_name="stock.dock",
+        ondelete="set null",
+        string="Recommended dock",
+        readonly=True,
+        copy=False,
+        help=(
+            "Dock recommended at the confirmation, based on the occupation of "
+            "the docks and their distance to the content of the shipment."
+        ),
+    )
+    to_close = fields.Boolean(
+        string="To close",
+        readonly=True,
+        copy=False,
+        index=True,
+        help="The shipment is waiting to be closed in the background.",
+    )
+    close_error = fields.Char(
+        string="Closing error",
+        readonly=True,
+        copy=False,
+        help="Error of the last attempt to close the shipment in the background.",
+    )
     arrival_date = fields.Datetime(
         string="Arrival date",
         states={"draft": [("readonly", False)], "confirmed": [("readonly", False)]},
@@ -95,9 +141,70 @@ class ShipmentAdvice(models.Model):
         },
         readonly=True,
     )
+    max_payload = fields.Float(
+        string="Max. payload (kg)",
+        digits=(16, 2),
+        states={
+            "draft": [("readonly", False)],
+            "confirmed": [("readonly", False)],
+            "in_progress": [("readonly", False)],
+        },
+        readonly=True,
+        help=(
+            "Maximum weight the vehicle can carry (0 = no limit). The limit "
+            "of the loading dock applies as well."
+        ),
+    )
+    max_volume = fields.Float(
+        string="Max. volume (m³)",
+        digits=(16, 2),
+        states={
+            "draft": [("readonly", False)],
+            "confirmed": [("readonly", False)],
+            "in_progress": [("readonly", False)],
+        },
+        readonly=True,
+        help=(
+            "Maximum volume the vehicle can carry (0 = no limit). The limit "
+            "of the loading dock applies as well."
+        ),
+    )
+    loaded_weight = fields.Float(
+        string="Loaded weight (kg)",
+        digits=(16, 2),
+        copy=False,
+        readonly=True,
+        help="Total of the weight loaded, updated by each change of the content.",
+    )
+    loaded_volume = fields.Float(
+        string="Loaded volume (m³)",
+        digits=(16, 2),
+        copy=False,
+        readonly=True,
+        help="Total of the volume loaded, updated by each change of the content.",
+    )
     total_load = fields.Float(
         string="Total load (kg)", digits=(16, 2), compute="_compute_total_load",
     )
+    content_version = fields.Integer(
+        string="Content version",
+        default=0,
+        copy=False,
+        readonly=True,
+        help=(
+            "Incremented each time content is planned, unplanned, loaded or "
+            "unloaded. Used by devices to synchronize only the changes."
+        ),
+    )
+    manifest = fields.Text(
+        string="Manifest",
+        copy=False,
+        readonly=True,
+        help=(
+            "Content of the shipment frozen when it is done (JSON). Counters "
+            "and reports of done shipments are read from it."
+        ),
+    )
     planned_move_ids = fields.One2many(
         comodel_name="stock.move",
         inverse_name="shipment_advice_id",
@@ -184,63 +291,273 @@ class ShipmentAdvice(models.Model):
         """
         return True
 
-    @api.depends("loaded_move_line_ids.result_package_id.shipping_weight")
+    @api.depends("loaded_move_line_ids.weight", "manifest")
     def _compute_total_load(self):
+        frozen = self.filtered("manifest")
+        for shipment in frozen:
+            shipment.total_load = shipment._get_manifest()["total_load"]
+        live = self - frozen
+        data = self.env["stock.move.line"].read_group(
+            [("shipment_advice_id", "in", live.ids)],
+            ["weight"],
+            ["shipment_advice_id"],
+        )
+        weights = {d["shipment_advice_id"][0]: d["weight"] for d in data}
+        for shipment in live:
+            shipment.total_load = weights.get(shipment.id, 0.0)
+
+    def _read_content_snapshot(self):
+        """Return the relations derived from the content of the shipment."""
+        self.ensure_one()
+        if self.manifest:
+            return self._get_manifest()["content"]
+        planned_moves = self.planned_move_ids
+        loaded_lines = self.loaded_move_line_ids
+        planned_pickings = planned_moves.picking_id
+        loaded_pickings = loaded_lines.picking_id
+        package_levels = loaded_lines.package_level_id.filtered(
+            self._check_include_package_level
+        )
+        carriers = (
+            planned_pickings.carrier_id
+            if planned_pickings
+            else loaded_pickings.carrier_id
+        )
+        return {
+            "planned_picking_ids": planned_pickings.ids,
+            "loaded_picking_ids": loaded_pickings.ids,
+            "loaded_package_level_ids": package_levels.ids,
+            "loaded_package_ids": package_levels.package_id.ids,
+            "carrier_ids": carriers.ids,
+            "planned_move_ids": planned_moves.ids,
+            "loaded_move_line_without_package_ids": loaded_lines.filtered(
+                lambda ml: not ml.package_level_id
+            ).ids,
+        }
+
+    def _get_content_snapshot(self):
+        """Return the relations derived from the content of the shipment.
+
+        Snapshots are kept in a LRU cache of the worker, keyed by the content
+        version of the shipment. The version is incremented by each plan,
+        unplan, load and unload operation, and by the changes of the moves,
+        move lines, package levels and transfers read by the snapshot made
+        through the ORM.
+
+        Snapshots hold the IDs of the whole content, shared by all users:
+        browse them with `_browse_content_snapshot` to apply the access
+        rules of the user.
+        """
+        self.ensure_one()
+        uncommitted_ids = self.env.cr.cache.get("shipment_advice_uncommitted_ids", ())
+        if not self.id or self.id in uncommitted_ids:
+            # New record (onchange) or content updated by the current
+            # transaction (which could be rolled back): nothing to cache
+            return self.sudo()._read_content_snapshot()
+        key = (self.env.cr.dbname, self.id, self.content_version)
+        try:
+            return CONTENT_SNAPSHOT_CACHE[key]
+        except KeyError:
+            pass
+        snapshot = self.sudo()._read_content_snapshot()
+        CONTENT_SNAPSHOT_CACHE[key] = snapshot
+        return snapshot
+
+    @api.model
+    def _browse_content_snapshot(self, model, ids):
+        """Return the records of a content snapshot the user can read."""
+        records = self.env[model].browse(ids)
+        if not records.check_access_rights("read", raise_exception=False):
+            return records.browse()
+        return records._filter_access_rules("read")
+
+    def _prepare_manifest_transfer_values(self, picking):
+        partner = picking.partner_id
+        return {
+            "transfer": picking.name,
+            "loading_sequence": picking.loading_sequence,
+            "scheduled_date": fields.Datetime.to_string(picking.scheduled_date),
+            "partner": partner.name or "",
+            "address": partner._display_address(without_company=True)
+            if partner
+            else "",
+        }
+
+    def _prepare_manifest(self):
+        """Return the manifest of the shipment: its content, with what is
+        printed on the shipment report.
+        """
+        self.ensure_one()
+        package_levels = self.loaded_package_level_ids.sorted(
+            key=lambda pl: pl.picking_id.loading_sequence
+        )
+        packages = []
+        for package_level in package_levels:
+            package = package_level.package_id
+            values = self._prepare_manifest_transfer_values(package_level.picking_id)
+            values.update(
+                package=package.name,
+                code=package.packaging_id.shipper_package_code or "",
+                weight=package.shipping_weight,
+            )
+            packages.append(values)
+        lines = []
+        for line in self.loaded_move_line_without_package_ids:
+            values = self._prepare_manifest_transfer_values(line.picking_id)
+            values.update(
+                product=line.product_id.display_name,
+                quantity=line.qty_done,
+                uom=line.product_uom_id.name,
+                weight=line.weight,
+            )
+            lines.append(values)
+        return {
+            "content": self._read_content_snapshot(),
+            "total_load": self.total_load,
+            "move_lines_count": len(self.loaded_move_line_ids),
+            "packages": packages,
+            "lines": lines,
+        }
+
+    def _get_manifest(self):
+        """Return the frozen manifest of the shipment, or the current one if
+        the shipment is not done yet.
+        """
+        self.ensure_one()
+        if self.manifest:
+            return json.loads(self.manifest)
+        return self._prepare_manifest()
+
+    def _freeze_manifest(self):
         for shipment in self:
-            packages = shipment.loaded_move_line_ids.result_package_id
-            shipment.total_load = sum(packages.mapped("shipping_weight"))
+            shipment.manifest = json.dumps(shipment._prepare_manifest())
 
-    @api.depends("planned_move_ids", "loaded_move_line_ids")
+    @api.depends("planned_move_ids", "loaded_move_line_ids", "content_version")
+    @api.depends_context("uid")
     def _compute_picking_ids(self):
         for shipment in self:
-            shipment.planned_picking_ids = shipment.planned_move_ids.picking_id
-            shipment.loaded_picking_ids = shipment.loaded_move_line_ids.picking_id
+            snapshot = shipment._get_content_snapshot()
+            shipment.planned_picking_ids = self._browse_content_snapshot(
+                "stock.picking", snapshot["planned_picking_ids"]
+            )
+            shipment.loaded_picking_ids = self._browse_content_snapshot(
+                "stock.picking", snapshot["loaded_picking_ids"]
+            )
 
-    @api.depends("loaded_move_line_ids.package_level_id.package_id",)
+    @api.depends("loaded_move_line_ids.package_level_id.package_id", "content_version")
+    @api.depends_context("uid")
     def _compute_package_ids(self):
         for shipment in self:
-            package_levels = shipment.loaded_move_line_ids.package_level_id
-            shipment.loaded_package_level_ids = package_levels.filtered(
-                self._check_include_package_level
+            snapshot = shipment._get_content_snapshot()
+            shipment.loaded_package_level_ids = self._browse_content_snapshot(
+                "stock.package_level", snapshot["loaded_package_level_ids"]
             )
-            package_ids = set()
-            for line in shipment.loaded_move_line_ids:
-                if line.package_level_id and self._check_include_package_level(
-                    line.package_level_id
-                ):
-                    package_ids.add(line.package_level_id.package_id.id)
-            shipment.loaded_package_ids = self.env["stock.quant.package"].browse(
-                package_ids
+            shipment.loaded_package_ids = self._browse_content_snapshot(
+                "stock.quant.package", snapshot["loaded_package_ids"]
             )
 
-    @api.depends("planned_picking_ids", "planned_move_ids")
+    @api.depends("planned_move_ids", "loaded_move_line_ids", "content_version")
+    @api.depends_context("uid")
     def _compute_count(self):
         for shipment in self:
-            shipment.planned_pickings_count = len(shipment.planned_picking_ids)
-            shipment.planned_moves_count = len(shipment.planned_move_ids)
-            shipment.loaded_pickings_count = len(shipment.loaded_picking_ids)
+            snapshot = shipment._get_content_snapshot()
+            browse = self._browse_content_snapshot
+            shipment.planned_pickings_count = len(
+                browse("stock.picking", snapshot["planned_picking_ids"])
+            )
+            shipment.planned_moves_count = len(
+                browse("stock.move", snapshot["planned_move_ids"])
+            )
+            shipment.loaded_pickings_count = len(
+                browse("stock.picking", snapshot["loaded_picking_ids"])
+            )
             shipment.loaded_move_lines_without_package_count = len(
-                shipment.loaded_move_line_without_package_ids
+                browse(
+                    "stock.move.line", snapshot["loaded_move_line_without_package_ids"]
+                )
+            )
+            shipment.loaded_packages_count = len(
+                browse("stock.quant.package", snapshot["loaded_package_ids"])
             )
-            shipment.loaded_packages_count = len(shipment.loaded_package_ids)
 
-    @api.depends("planned_picking_ids", "loaded_picking_ids")
+    @api.depends("planned_move_ids", "loaded_move_line_ids", "content_version")
+    @api.depends_context("uid")
     def _compute_carrier_ids(self):
         for shipment in self:
-            if shipment.planned_picking_ids:
-                shipment.carrier_ids = shipment.planned_picking_ids.carrier_id
-            else:
-                shipment.carrier_ids = shipment.loaded_picking_ids.carrier_id
+            snapshot = shipment._get_content_snapshot()
+            shipment.carrier_ids = self._browse_content_snapshot(
+                "delivery.carrier", snapshot["carrier_ids"]
+            )
+
+    @api.model
+    def _get_sequence(self, shipment_type):
+        if shipment_type == "incoming":
+            return self.env.ref("shipment_advice.shipment_advice_incoming_sequence")
+        return self.env.ref("shipment_advice.shipment_advice_outgoing_sequence")
 
     @api.model
-    def create(self, vals):
+    def _reserve_sequence_names(self, sequence, count):
+        """Return `count` names from the sequence.
+
+        The numbers are reserved in one go instead of one query per number,
+        except for sequences using date ranges.
+        """
+        if count == 1 or sequence.use_date_range:
+            return [sequence.next_by_id() for __ in range(count)]
+        sequence.check_access_rights("read")
+        if sequence.implementation == "standard":
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s);",
+                ("ir_sequence_%03d" % sequence.id, count),
+            )
+            numbers = sorted(row[0] for row in self.env.cr.fetchall())
+        else:
+            self.env.cr.execute(
+                "SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT;",
+                (sequence.id,),
+            )
+            number_next = self.env.cr.fetchone()[0]
+            increment = sequence.number_increment
+            self.env.cr.execute(
+                "UPDATE ir_sequence SET number_next = %s WHERE id = %s;",
+                (number_next + increment * count, sequence.id),
+            )
+            sequence.invalidate_cache(["number_next"], sequence.ids)
+            numbers = [number_next + increment * index for index in range(count)]
+        return [sequence.get_next_char(number) for number in numbers]
+
+    @api.model_create_multi
+    def create(self, vals_list):
         defaults = self.default_get(["name", "shipment_type"])
-        sequence = self.env.ref("shipment_advice.shipment_advice_outgoing_sequence")
-        if defaults["shipment_type"] == "incoming":
-            sequence = self.env.ref("shipment_advice.shipment_advice_incoming_sequence")
-        if vals.get("name", "/") == "/" and defaults.get("name", "/") == "/":
-            vals["name"] = sequence.next_by_id()
-        return super().create(vals)
+        vals_list_by_type = defaultdict(list)
+        for vals in vals_list:
+            if vals.get("name", "/") == "/" and defaults.get("name", "/") == "/":
+                shipment_type = vals.get("shipment_type") or defaults["shipment_type"]
+                vals_list_by_type[shipment_type].append(vals)
+        for shipment_type, type_vals_list in vals_list_by_type.items():
+            names = self._reserve_sequence_names(
+                self._get_sequence(shipment_type), len(type_vals_list)
+            )
+            for vals, name in zip(type_vals_list, names):
+                vals["name"] = name
+        model = self
+        if self.env.context.get("shipment_advice_bulk_create"):
+            # Skip the followers subscription and the tracking
+            model = self.with_context(tracking_disable=True)
+        shipments = super(ShipmentAdvice, model).create(vals_list)
+        shipments.filtered("dock_id")._invalidate_dock_occupancy()
+        return shipments
+
+    def write(self, vals):
+        occupancy_changed = any(
+            fname in vals for fname in self._get_dock_occupancy_fields()
+        )
+        if occupancy_changed:
+            self._invalidate_dock_occupancy()
+        res = super().write(vals)
+        if occupancy_changed and "warehouse_id" in vals:
+            self._invalidate_dock_occupancy()
+        return res
 
     def action_confirm(self):
         for shipment in self:
@@ -257,6 +574,17 @@ class ShipmentAdvice(models.Model):
                     )
                 )
             shipment.state = "confirmed"
+        self._update_recommended_dock()
+        return True
+
+    def _update_recommended_dock(self):
+        """Store the dock recommended for the shipments without dock."""
+        for shipment in self.filtered(lambda s: not s.dock_id):
+            shipment.recommended_dock_id = shipment._recommend_dock()
+
+    def button_use_recommended_dock(self):
+        for shipment in self.filtered("recommended_dock_id"):
+            shipment.dock_id = shipment.recommended_dock_id
         return True
 
     def action_in_progress(self):
@@ -275,6 +603,7 @@ class ShipmentAdvice(models.Model):
                 )
             shipment.arrival_date = fields.Datetime.now()
             shipment.state = "in_progress"
+        self._update_docks_current_shipment()
         return True
 
     def _lock_records(self, records):
@@ -326,15 +655,230 @@ class ShipmentAdvice(models.Model):
                             # no backorder needed means that all qty_done are
                             # set to fullfill the need => validate
                             picking.action_done()
-                # Unplan moves that were not loaded and validated
-                moves_to_unplan = self.loaded_move_line_ids.move_id.filtered(
-                    lambda m: m.state not in ("cancel", "done") and not m.quantity_done
-                )
-                moves_to_unplan.shipment_advice_id = False
+            # Unplan moves that were not shipped
+            shipment._release_unshipped_moves()
+            # Validating transfers may have split the content in backorders
+            shipment._bump_content_version()
             shipment.departure_date = fields.Datetime.now()
             shipment.state = "done"
+            shipment._freeze_manifest()
+        self._update_docks_current_shipment()
+        return True
+
+    def _update_docks_current_shipment(self):
+        """Point the docks to the shipments started on them, and to nothing
+        once their shipment is over.
+        """
+        for shipment in self:
+            dock = shipment.dock_id.sudo()
+            if shipment.state == "in_progress":
+                dock.current_shipment_advice_id = shipment
+            elif dock.current_shipment_advice_id == shipment:
+                dock.current_shipment_advice_id = False
+
+    @api.model
+    def _get_closing_workers(self):
+        param = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("shipment_advice.closing_workers")
+        )
+        return max(int(param or 0), 1)
+
+    def _get_closing_groups(self):
+        """Partition the shipments into groups sharing no transfer.
+
+        Shipments sharing transfers (e.g. a transfer loaded in several trucks)
+        end up in the same group, so that they are closed one after the other.
+        """
+        if not self:
+            return []
+        self.env["stock.move"].flush(["shipment_advice_id", "picking_id"])
+        self.env["stock.move.line"].flush(["shipment_advice_id", "picking_id"])
+        self.env.cr.execute(
+            """
+            SELECT shipment_advice_id, picking_id
+            FROM stock_move
+            WHERE shipment_advice_id IN %s AND picking_id IS NOT NULL
+            UNION
+            SELECT shipment_advice_id, picking_id
+            FROM stock_move_line
+            WHERE shipment_advice_id IN %s AND picking_id IS NOT NULL;
+            """,
+            (tuple(self.ids), tuple(self.ids)),
+        )
+        parent = {shipment_id: shipment_id for shipment_id in self.ids}
+
+        def find(shipment_id):
+            while parent[shipment_id] != shipment_id:
+                parent[shipment_id] = parent[parent[shipment_id]]
+                shipment_id = parent[shipment_id]
+            return shipment_id
+
+        shipment_by_picking = {}
+        for shipment_id, picking_id in self.env.cr.fetchall():
+            other_id = shipment_by_picking.setdefault(picking_id, shipment_id)
+            parent[find(shipment_id)] = find(other_id)
+        ids_by_group = defaultdict(list)
+        for shipment_id in self.ids:
+            ids_by_group[find(shipment_id)].append(shipment_id)
+        return [self.browse(ids) for ids in ids_by_group.values()]
+
+    def _close(self):
+        """Close the shipments one by one, returning the error message of
+        each shipment (False if closed).
+
+        Failures are posted on the related shipments, which are no longer
+        waiting to be closed either way.
+        """
+        errors = {}
+        for shipment in self:
+            error = shipment._run_in_savepoint(shipment.action_done)
+            if error:
+                shipment.message_post(
+                    body=_("Unable to close the shipment: {}").format(error)
+                )
+            errors[shipment.id] = error
+        self.write({"to_close": False, "close_error": False})
+        return errors
+
+    def _close_in_new_cursor(self):
+        """Close the shipments in their own transaction, to run in a thread.
+
+        Return the error message of each shipment, and whether the
+        transaction failed (e.g. on a serialization failure), nothing being
+        closed then.
+        """
+        try:
+            with api.Environment.manage(), self.pool.cursor() as cr:
+                return self.with_env(self.env(cr=cr))._close(), False
+        except Exception as exc:
+            _logger.exception("Unable to close shipment advices %s", self.ids)
+            return dict.fromkeys(self.ids, str(exc)), True
+
+    def _record_close_failure(self, error):
+        """Keep the shipments waiting to be closed again by the scheduled
+        action, with the error of the failed attempt.
+        """
+        for shipment in self:
+            if shipment.close_error != error:
+                # Posted once for the same error repeated by the retries
+                shipment.message_post(
+                    body=_("Closing failed, it will be retried: {}").format(error)
+                )
+        self.write({"close_error": error})
+
+    def _can_close_in_threads(self):
+        """Return whether the shipments can be closed in worker threads.
+
+        Threads use their own transactions, which do not see the data of the
+        transaction of a test.
+        """
+        return not getattr(threading.currentThread(), "testing", False)
+
+    def _close_in_parallel(self, workers=None):
+        """Close the shipments, the groups of shipments sharing no transfer
+        being closed in parallel, each in its own thread and transaction.
+
+        The caller must have committed the shipments to close, as the
+        threads do not see its pending changes. Shipments of a group whose
+        transaction failed stay waiting to be closed, the failure being
+        recorded on them. Return the error message of each shipment (False
+        if closed).
+        """
+        workers = workers or self._get_closing_workers()
+        groups = self._get_closing_groups()
+        if workers <= 1 or len(groups) <= 1 or not self._can_close_in_threads():
+            return self._close()
+        errors = {}
+        failed = self.browse()
+        with ThreadPoolExecutor(max_workers=min(workers, len(groups))) as pool:
+            results = pool.map(lambda group: group._close_in_new_cursor(), groups)
+            for group, (group_errors, group_failed) in zip(groups, results):
+                errors.update(group_errors)
+                if group_failed:
+                    failed |= group
+        self.invalidate_cache()
+        for shipment in failed:
+            shipment._record_close_failure(errors[shipment.id])
+        return errors
+
+    def action_done_parallel(self):
+        """Request the closing of the shipments, done in the background by
+        the scheduled action closing them in parallel.
+        """
+        for shipment in self:
+            if shipment.state != "in_progress":
+                raise UserError(
+                    _("Shipment {} is not started, operation aborted.").format(
+                        shipment.name
+                    )
+                )
+        self.write({"to_close": True})
+        return True
+
+    @api.model
+    def _cron_close(self):
+        """Close the shipments waiting to be closed, in parallel."""
+        shipments = self.search([("to_close", "=", True)])
+        if shipments:
+            shipments._close_in_parallel()
         return True
 
+    def _release_unshipped_moves(self):
+        """Unplan the moves of the shipments which have not been shipped
+        (nothing done), including backorders and moves without line.
+
+        The moves are found and unplanned in one query. Return the released
+        moves indexed by shipment ID.
+        """
+        if not self:
+            return {}
+        self.env["stock.move"].flush(["shipment_advice_id", "state"])
+        self.env["stock.move.line"].flush(["move_id", "qty_done"])
+        self.env.cr.execute(
+            """
+            UPDATE stock_move move
+            SET shipment_advice_id = NULL
+            FROM stock_move planned_move
+            WHERE planned_move.id = move.id
+                AND planned_move.shipment_advice_id IN %s
+                AND planned_move.state NOT IN ('cancel', 'done')
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM stock_move_line ml
+                    WHERE ml.move_id = move.id AND ml.qty_done > 0
+                )
+            RETURNING move.id, planned_move.shipment_advice_id;
+            """,
+            (tuple(self.ids),),
+        )
+        move_ids_by_shipment = defaultdict(list)
+        for move_id, shipment_id in self.env.cr.fetchall():
+            move_ids_by_shipment[shipment_id].append(move_id)
+        released = {}
+        move_model = self.env["stock.move"]
+        for shipment in self:
+            moves = move_model.browse(move_ids_by_shipment.get(shipment.id, []))
+            if not moves:
+                continue
+            # Recompute the stored fields depending on the planning (e.g. the
+            # planned shipment of the transfers) of these moves only
+            moves.invalidate_cache(["shipment_advice_id"], moves.ids)
+            moves.modified(["shipment_advice_id"])
+            shipment._log_content_event("unplan", [moves])
+            shipment.message_post(
+                body=_(
+                    "{count} move(s) not shipped have been unplanned: {pickings}."
+                ).format(
+                    count=len(moves),
+                    pickings=", ".join(moves.picking_id.mapped("name")),
+                )
+            )
+            released[shipment.id] = moves
+        self.invalidate_cache(["planned_move_ids"], self.ids)
+        return released
+
     def action_cancel(self):
         for shipment in self:
             if shipment.state not in ("confirmed", "in_progress"):
@@ -344,6 +888,7 @@ class ShipmentAdvice(models.Model):
                     )
                 )
             shipment.state = "cancel"
+        self._update_docks_current_shipment()
 
     def action_draft(self):
         for shipment in self:
@@ -355,6 +900,97 @@ class ShipmentAdvice(models.Model):
                 )
             shipment.state = "draft"
 
+    @api.model
+    def _get_auto_progress_chunk_size(self):
+        param = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("shipment_advice.auto_progress_chunk_size")
+        )
+        return int(param or 0) or 100
+
+    @api.model
+    def _read_auto_progress_chunk(self, limit, exclude_ids):
+        """Return the next shipments to progress with their transition
+        ('confirm', 'start' or 'close').
+
+        The conditions of the transitions are checked in one query, and the
+        returned shipments are locked (those locked by users are skipped).
+        """
+        self.flush(["state", "arrival_date", "departure_date", "dock_id"])
+        self.env["res.company"].flush(["shipment_advice_auto_close"])
+        now = fields.Datetime.now()
+        self.env.cr.execute(
+            """
+            SELECT sa.id,
+                CASE sa.state
+                    WHEN 'draft' THEN 'confirm'
+                    WHEN 'confirmed' THEN 'start'
+                    ELSE 'close'
+                END
+            FROM shipment_advice sa
+            JOIN res_company company ON company.id = sa.company_id
+            WHERE sa.id NOT IN %s
+                AND (
+                    (sa.state = 'draft' AND sa.arrival_date IS NOT NULL)
+                    OR (
+                        sa.state = 'confirmed'
+                        AND sa.dock_id IS NOT NULL
+                        AND sa.arrival_date <= %s
+                    )
+                    OR (
+                        sa.state = 'in_progress'
+                        AND sa.departure_date <= %s
+                        AND company.shipment_advice_auto_close
+                    )
+                )
+            ORDER BY sa.arrival_date, sa.id
+            LIMIT %s
+            FOR UPDATE OF sa SKIP LOCKED;
+            """,
+            (tuple(exclude_ids) or (0,), now, now, limit),
+        )
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _cron_auto_progress(self, chunk_size=None):
+        """Progress the shipments whose conditions are met, by chunks.
+
+        - draft shipments having an arrival date are confirmed
+        - confirmed shipments having a dock are started at their arrival
+        - shipments in progress are closed after their departure date if the
+          company allows it
+
+        The transaction is committed after each chunk.
+        """
+        chunk_size = chunk_size or self._get_auto_progress_chunk_size()
+        failed_ids = set()
+        while True:
+            rows = self._read_auto_progress_chunk(chunk_size, failed_ids)
+            if not rows:
+                break
+            ids_by_transition = defaultdict(list)
+            for shipment_id, transition in rows:
+                ids_by_transition[transition].append(shipment_id)
+            confirmed = self.browse(ids_by_transition["confirm"])
+            confirmed.write({"state": "confirmed"})
+            confirmed._update_recommended_dock()
+            # The planned arrival date is kept as the real one
+            started = self.browse(ids_by_transition["start"])
+            started.write({"state": "in_progress"})
+            started._update_docks_current_shipment()
+            for shipment in self.browse(ids_by_transition["close"]):
+                error = shipment._run_in_savepoint(shipment.action_done)
+                if error:
+                    _logger.warning(
+                        "Unable to close shipment advice %s: %s", shipment.name, error
+                    )
+                    failed_ids.add(shipment.id)
+            self.flush()
+            if not getattr(threading.currentThread(), "testing", False):
+                self.env.cr.commit()  # pylint: disable=invalid-commit
+        return True
+
     def button_open_planned_pickings(self):
         action = self.env.ref("stock.action_picking_tree_all").read()[0]
         action["domain"] = [("id", "in", self.planned_picking_ids.ids)]
@@ -412,6 +1048,837 @@ class ShipmentAdvice(models.Model):
                 domain.append(("carrier_id", "in", self.carrier_ids.ids))
         return domain
 
+    def _bump_content_version(self):
+        """Increment the content version of the shipments.
+
+        Return the new versions indexed by shipment ID.
+        """
+        if not self:
+            return {}
+        self.flush(["content_version"])
+        self.env.cr.execute(
+            """
+            UPDATE shipment_advice
+            SET content_version = content_version + 1
+            WHERE id IN %s
+            RETURNING id, content_version;
+            """,
+            (tuple(self.ids),),
+        )
+        versions = dict(self.env.cr.fetchall())
+        self.invalidate_cache(["content_version"], self.ids)
+        self.modified(["content_version"])
+        # Versions are not shared with other transactions until committed
+        self.env.cr.cache.setdefault("shipment_advice_uncommitted_ids", set()).update(
+            self.ids
+        )
+        return versions
+
+    def _log_content_event(self, event, recordsets):
+        """Log that the given records have been (un)planned or (un)loaded
+        in the shipment, under a new content version.
+        """
+        self.ensure_one()
+        records = [record for recordset in recordsets for record in recordset]
+        if not records:
+            return
+        version = self._bump_content_version()[self.id]
+        self.env["shipment.advice.event"]._insert_events(
+            [
+                {
+                    "shipment_advice_id": self.id,
+                    "version": version,
+                    "event": event,
+                    "res_model": record._name,
+                    "res_id": record.id,
+                }
+                for record in records
+            ]
+        )
+
+    def _get_sync_fields(self):
+        """Return the fields sent to devices, by model of content."""
+        return {
+            "stock.move": [
+                "picking_id",
+                "product_id",
+                "product_uom_qty",
+                "product_uom",
+                "state",
+            ],
+            "stock.move.line": [
+                "picking_id",
+                "move_id",
+                "product_id",
+                "lot_id",
+                "package_level_id",
+                "qty_done",
+                "product_uom_id",
+                "state",
+            ],
+            "stock.package_level": ["picking_id", "package_id", "is_done", "state"],
+        }
+
+    def get_content_changes(self, since_version=0, since_date=None):
+        """Return the content changes of the shipment since the given version
+        (or date).
+
+        The result contains the current `version` of the shipment and, for
+        each model of content (planned moves, loaded move lines and package
+        levels), the data of the records added or updated (`updated`) and the
+        IDs of the records removed (`removed`) since then. Without version
+        nor date, the whole content is returned with `full` set.
+        """
+        self.ensure_one()
+        sync_fields = self._get_sync_fields()
+        result = {
+            "version": self.content_version,
+            "full": not since_version and not since_date,
+        }
+        if result["full"]:
+            current = {
+                "stock.move": self.planned_move_ids,
+                "stock.move.line": self.loaded_move_line_ids,
+                "stock.package_level": self.loaded_move_line_ids.package_level_id,
+            }
+            for model, records in current.items():
+                result[model] = {
+                    "updated": records.read(sync_fields[model]),
+                    "removed": [],
+                }
+            return result
+        # Keep only the last event of each record
+        domain = [("shipment_advice_id", "=", self.id)]
+        if since_version:
+            domain.append(("version", ">", since_version))
+        if since_date:
+            domain.append(("date", ">", since_date))
+        events = self.env["shipment.advice.event"].search_read(
+            domain, ["res_model", "res_id", "event"], order="version, id"
+        )
+        last_events = {}
+        for event in events:
+            last_events[(event["res_model"], event["res_id"])] = event["event"]
+        removal_events = self.env["shipment.advice.event"]._get_removal_events()
+        for model, model_fields in sync_fields.items():
+            updated_ids = [
+                res_id
+                for (res_model, res_id), event in last_events.items()
+                if res_model == model and event not in removal_events
+            ]
+            removed_ids = [
+                res_id
+                for (res_model, res_id), event in last_events.items()
+                if res_model == model and event in removal_events
+            ]
+            records = self.env[model].browse(updated_ids).exists()
+            result[model] = {
+                "updated": records.read(model_fields),
+                "removed": removed_ids + list(set(updated_ids) - set(records.ids)),
+            }
+        return result
+
+    def _get_capacity_limits(self):
+        """Return the payload and volume limits of the shipment.
+
+        The lowest limit between the vehicle and the dock applies, 0 meaning
+        no limit.
+        """
+        self.ensure_one()
+        payloads = [p for p in (self.max_payload, self.dock_id.max_payload) if p]
+        volumes = [v for v in (self.max_volume, self.dock_id.max_volume) if v]
+        return min(payloads, default=0.0), min(volumes, default=0.0)
+
+    def _check_capacity(self, weight, volume):
+        """Check that loading the given weight and volume fits in the shipment.
+
+        Relies on the running totals, so it does not depend on the size of
+        the content already loaded.
+        """
+        self.ensure_one()
+        max_payload, max_volume = self._get_capacity_limits()
+        new_weight = self.loaded_weight + weight
+        if (
+            max_payload
+            and float_compare(new_weight, max_payload, precision_digits=2) > 0
+        ):
+            raise UserError(
+                _(
+                    "You cannot load this into shipment {}, its payload would be "
+                    "exceeded ({:.2f} / {:.2f} kg)."
+                ).format(self.name, new_weight, max_payload)
+            )
+        new_volume = self.loaded_volume + volume
+        if max_volume and float_compare(new_volume, max_volume, precision_digits=2) > 0:
+            raise UserError(
+                _(
+                    "You cannot load this into shipment {}, its volume would be "
+                    "exceeded ({:.2f} / {:.2f} m³)."
+                ).format(self.name, new_volume, max_volume)
+            )
+
+    def _refresh_loaded_totals(self):
+        """Compute the loaded weight and volume of the shipments in one query.
+
+        The totals are updated by the changes of the move lines, this full
+        computation repairs them when the weight of the lines changes
+        otherwise (e.g. the shipping weight of a package).
+
+        The volume is based on the same quantity as the weight of the lines:
+        the quantity done, or reserved if nothing is done.
+        """
+        if not self:
+            return
+        self.env["stock.move.line"].flush(
+            [
+                "shipment_advice_id",
+                "weight",
+                "qty_done",
+                "product_qty",
+                "product_uom_id",
+                "product_id",
+            ]
+        )
+        self.env["product.product"].flush(["volume"])
+        self.env.cr.execute(
+            """
+            WITH totals AS (
+                SELECT ml.shipment_advice_id,
+                    SUM(ml.weight) AS weight,
+                    SUM(
+                        product.volume * CASE
+                            WHEN ml.qty_done != 0
+                            THEN ml.qty_done / line_uom.factor * product_uom.factor
+                            ELSE ml.product_qty
+                        END
+                    ) AS volume
+                FROM stock_move_line ml
+                JOIN product_product product ON product.id = ml.product_id
+                JOIN product_template template
+                    ON template.id = product.product_tmpl_id
+                JOIN uom_uom line_uom ON line_uom.id = ml.product_uom_id
+                JOIN uom_uom product_uom ON product_uom.id = template.uom_id
+                WHERE ml.shipment_advice_id IN %s
+                GROUP BY ml.shipment_advice_id
+            )
+            UPDATE shipment_advice sa
+            SET loaded_weight = COALESCE(totals.weight, 0),
+                loaded_volume = COALESCE(totals.volume, 0)
+            FROM shipment_advice shipment
+            LEFT JOIN totals ON totals.shipment_advice_id = shipment.id
+            WHERE sa.id = shipment.id AND sa.id IN %s;
+            """,
+            (tuple(self.ids), tuple(self.ids)),
+        )
+        self.invalidate_cache(["loaded_weight", "loaded_volume"], self.ids)
+
+    @api.model
+    def _add_loaded_totals(self, before, after):
+        """Apply the change of the weight and volume loaded in the shipments.
+
+        `before` and `after` give the totals of the changed move lines by
+        shipment ID, as returned by `stock.move.line._get_shipment_totals`.
+        """
+        self.flush(["loaded_weight", "loaded_volume"])
+        shipment_ids = []
+        for shipment_id in set(before) | set(after):
+            weight_before, volume_before = before.get(shipment_id, (0.0, 0.0))
+            weight_after, volume_after = after.get(shipment_id, (0.0, 0.0))
+            weight, volume = weight_after - weight_before, volume_after - volume_before
+            if not weight and not volume:
+                continue
+            self.env.cr.execute(
+                """
+                UPDATE shipment_advice
+                SET loaded_weight = COALESCE(loaded_weight, 0) + %s,
+                    loaded_volume = COALESCE(loaded_volume, 0) + %s
+                WHERE id = %s;
+                """,
+                (weight, volume, shipment_id),
+            )
+            shipment_ids.append(shipment_id)
+        if shipment_ids:
+            self.invalidate_cache(["loaded_weight", "loaded_volume"], shipment_ids)
+
+    def simulate_load(self, records):
+        """Return the loading figures of the shipment if the given transfers,
+        package levels or move lines were loaded, without loading them.
+
+        The records are checked with the rules of the loading, the reasons
+        preventing it being returned as conflicts. Nothing is written.
+        """
+        self.ensure_one()
+        conflicts = []
+        if self.state not in self._get_batch_operations()["load"]["shipment_states"]:
+            conflicts.append(
+                _("Shipment {} is not in a valid state.").format(self.name)
+            )
+        eligible = records.filtered_domain(
+            self._get_batch_domain("load", records._name)
+        )
+        for record in records - eligible:
+            conflicts.append(
+                _("{} cannot be loaded in this shipment.").format(record.display_name)
+            )
+        if records._name == "stock.move.line":
+            lines = eligible
+        else:
+            lines = eligible.move_line_ids
+        if lines:
+            conflicts += lines._get_load_in_shipment_errors(self)
+        lines_to_load = lines.filtered(lambda ml: ml.shipment_advice_id != self)
+        weight = lines_to_load._get_shipment_loaded_weight()
+        volume = lines_to_load._get_shipment_loaded_volume()
+        try:
+            self._check_capacity(weight, volume)
+        except UserError as exc:
+            conflicts.append(exc.args[0])
+        max_payload, max_volume = self._get_capacity_limits()
+        new_weight = self.loaded_weight + weight
+        new_volume = self.loaded_volume + volume
+        packages = (
+            self.loaded_package_ids
+            | lines_to_load.package_level_id.filtered(
+                self._check_include_package_level
+            ).package_id
+        )
+        bulk_lines = lines_to_load.filtered(lambda ml: not ml.package_level_id)
+        return {
+            "name": self.name,
+            "loadable": not conflicts,
+            "conflicts": conflicts,
+            "pickings": len(self.loaded_picking_ids | lines.picking_id),
+            "packages": len(packages),
+            "move_lines": self.loaded_move_lines_without_package_count
+            + len(bulk_lines),
+            "weight": new_weight,
+            "volume": new_volume,
+            "payload_usage": new_weight / max_payload if max_payload else 0.0,
+            "volume_usage": new_volume / max_volume if max_volume else 0.0,
+        }
+
+    @api.model
+    def _get_dock_occupancy_fields(self):
+        return ("state", "dock_id", "arrival_date", "departure_date", "warehouse_id")
+
+    def _invalidate_dock_occupancy(self):
+        """Drop the cached occupancy of the docks of the shipments warehouses.
+
+        The occupancy is not cached for these warehouses until the end of the
+        transaction, as it could be rolled back.
+        """
+        self.env.cr.cache.setdefault(
+            "shipment_advice_uncommitted_warehouse_ids", set()
+        ).update(self.warehouse_id.ids)
+        for warehouse_id in self.warehouse_id.ids:
+            try:
+                del DOCK_OCCUPANCY_CACHE[(self.env.cr.dbname, warehouse_id)]
+            except KeyError:
+                pass
+
+    @api.model
+    def _read_dock_occupancy(self, warehouse):
+        """Return the periods the docks of the warehouse are booked by the
+        confirmed and started shipments, as a dictionary
+        {dock ID: [(shipment ID, state, start, end)]}.
+
+        The end of a shipment without departure date is one hour after its
+        arrival, and unknown for a started one.
+        """
+        self.flush(list(self._get_dock_occupancy_fields()))
+        self.env.cr.execute(
+            """
+            SELECT dock_id, id, state, arrival_date, departure_date
+            FROM shipment_advice
+            WHERE warehouse_id = %s
+                AND dock_id IS NOT NULL
+                AND arrival_date IS NOT NULL
+                AND state IN ('confirmed', 'in_progress');
+            """,
+            (warehouse.id,),
+        )
+        occupancy = defaultdict(list)
+        for dock_id, shipment_id, state, start, end in self.env.cr.fetchall():
+            if not end:
+                end = datetime.max if state == "in_progress" else start
+                end = max(end, start + timedelta(hours=1))
+            occupancy[dock_id].append((shipment_id, state, start, end))
+        return dict(occupancy)
+
+    @api.model
+    def _get_dock_occupancy(self, warehouse):
+        """Return the occupancy of the docks of the warehouse (see
+        `_read_dock_occupancy`), cached for a minute.
+        """
+        uncommitted_ids = self.env.cr.cache.get(
+            "shipment_advice_uncommitted_warehouse_ids", ()
+        )
+        if warehouse.id in uncommitted_ids:
+            return self._read_dock_occupancy(warehouse)
+        key = (self.env.cr.dbname, warehouse.id)
+        cached = DOCK_OCCUPANCY_CACHE.get(key)
+        if cached and time.time() - cached[0] < DOCK_OCCUPANCY_CACHE_TIMEOUT:
+            return cached[1]
+        occupancy = self.sudo()._read_dock_occupancy(warehouse)
+        DOCK_OCCUPANCY_CACHE[key] = (time.time(), occupancy)
+        return occupancy
+
+    def _read_dock_distances(self):
+        """Return the distance to cover between each dock of the warehouse
+        and the locations of the content of the shipment, as a dictionary
+        {dock ID: distance}.
+
+        The distance of a location is the one of its closest parent in the
+        distance table, each move line counting once. Docks without distance
+        to some of the locations are not part of the result.
+        """
+        self.ensure_one()
+        column = (
+            "location_dest_id" if self.shipment_type == "incoming" else "location_id"
+        )
+        self.env["stock.move"].flush(["shipment_advice_id"])
+        self.env["stock.move.line"].flush(
+            ["move_id", "shipment_advice_id", "state", column]
+        )
+        self.env["stock.dock.distance"].flush()
+        self.env.cr.execute(
+            """
+            WITH staging AS (
+                SELECT ml.{column} AS location_id, COUNT(*) AS line_count
+                FROM stock_move_line ml
+                JOIN stock_move move ON move.id = ml.move_id
+                WHERE (move.shipment_advice_id = %s OR ml.shipment_advice_id = %s)
+                    AND ml.state NOT IN ('cancel', 'done')
+                GROUP BY ml.{column}
+            ), staging_distance AS (
+                SELECT DISTINCT ON (staging.location_id, distance.dock_id)
+                    distance.dock_id,
+                    staging.line_count * distance.distance AS distance
+                FROM staging
+                JOIN stock_location location ON location.id = staging.location_id
+                JOIN stock_dock dock
+                    ON dock.warehouse_id = %s AND dock.active
+                JOIN stock_dock_distance distance ON distance.dock_id = dock.id
+                JOIN stock_location distance_location
+                    ON distance_location.id = distance.location_id
+                    AND location.parent_path
+                        LIKE distance_location.parent_path || '%%'
+                ORDER BY staging.location_id,
+                    distance.dock_id,
+                    LENGTH(distance_location.parent_path) DESC
+            )
+            SELECT dock_id, SUM(distance), COUNT(*), (SELECT COUNT(*) FROM staging)
+            FROM staging_distance
+            GROUP BY dock_id;
+            """.format(
+                column=column
+            ),
+            (self.id, self.id, self.warehouse_id.id),
+        )
+        return {
+            dock_id: distance
+            for dock_id, distance, location_count, staging_count in (
+                self.env.cr.fetchall()
+            )
+            if location_count == staging_count
+        }
+
+    def _get_dock_ranking(self):
+        """Return the active docks of the warehouse, the most suitable first.
+
+        Docks having another shipment in progress are left out. The others
+        are ranked by their occupation during the stay of the shipment (one
+        hour if no departure date), then by their distance to its content.
+        Return a list of dictionaries with `dock`, `overlap` (in minutes) and
+        `distance` (False if unknown) keys.
+        """
+        self.ensure_one()
+        docks = self.env["stock.dock"].search(
+            [("warehouse_id", "=", self.warehouse_id.id)]
+        )
+        occupancy = self._get_dock_occupancy(self.warehouse_id)
+        distances = self._read_dock_distances()
+        start = self.arrival_date or fields.Datetime.now()
+        end = self.departure_date or start + timedelta(hours=1)
+        ranking = []
+        for dock in docks:
+            bookings = [
+                booking
+                for booking in occupancy.get(dock.id, [])
+                if booking[0] != self.id
+            ]
+            if any(state == "in_progress" for __, state, __, __ in bookings):
+                continue
+            overlap = 0.0
+            for __, __, other_start, other_end in bookings:
+                delta = min(end, other_end) - max(start, other_start)
+                overlap += max(delta.total_seconds(), 0.0) / 60
+            ranking.append(
+                {
+                    "dock": dock,
+                    "overlap": overlap,
+                    "distance": distances.get(dock.id, False),
+                }
+            )
+        ranking.sort(
+            key=lambda rank: (
+                rank["overlap"],
+                rank["distance"] is False,
+                rank["distance"] or 0.0,
+                rank["dock"].name,
+            )
+        )
+        return ranking
+
+    def _recommend_dock(self):
+        """Return the most suitable dock for the shipment, if any."""
+        self.ensure_one()
+        ranking = self._get_dock_ranking()
+        return ranking[0]["dock"] if ranking else self.env["stock.dock"]
+
+    def _get_loading_stops(self):
+        """Return the planned and loaded transfers grouped by delivery partner,
+        each partner being a stop of the shipment.
+        """
+        self.ensure_one()
+        stops = defaultdict(lambda: self.env["stock.picking"].browse())
+        for picking in self.planned_picking_ids | self.loaded_picking_ids:
+            stops[picking.partner_id] |= picking
+        return stops
+
+    def _get_partner_coordinates(self, partner):
+        """Return the (latitude, longitude) of the partner if known."""
+        # Coordinates are provided by the 'base_geolocalize' module
+        if "partner_latitude" not in partner._fields:
+            return None
+        if not partner.partner_latitude and not partner.partner_longitude:
+            return None
+        return (partner.partner_latitude, partner.partner_longitude)
+
+    def _get_delivery_route(self, stops):
+        """Return the partners of the stops in delivery order.
+
+        Stops are ordered from the warehouse with a route heuristic on the
+        partner coordinates. Stops without coordinates are delivered last,
+        by scheduled date.
+        """
+        self.ensure_one()
+
+        def scheduled_date(partner):
+            return min(stops[partner].mapped("scheduled_date"))
+
+        located, not_located = [], []
+        for partner in stops:
+            coords = self._get_partner_coordinates(partner)
+            if coords:
+                located.append((partner, coords))
+            else:
+                not_located.append(partner)
+        not_located.sort(key=scheduled_date)
+        if not located:
+            return not_located
+        located.sort(key=lambda stop: scheduled_date(stop[0]))
+        start = self._get_partner_coordinates(self.warehouse_id.partner_id)
+        if start:
+            route = optimize_route([start] + [coords for __, coords in located])
+            route = [index - 1 for index in route[1:]]
+        else:
+            # Start from the first scheduled stop
+            route = optimize_route([coords for __, coords in located])
+        return [located[index][0] for index in route] + not_located
+
+    def action_compute_loading_sequence(self):
+        """Sequence the loading of the shipment content by delivery stop.
+
+        The content of the last stop is loaded first (LIFO).
+        """
+        for shipment in self:
+            stops = shipment._get_loading_stops()
+            route = shipment._get_delivery_route(stops)
+            for sequence, partner in enumerate(reversed(route), 1):
+                stops[partner].loading_sequence = sequence
+        return True
+
+    def _get_bus_channel(self):
+        """Return the bus channel where the loading progress is published."""
+        self.ensure_one()
+        return (self.env.cr.dbname, self._name, self.id)
+
+    @api.model
+    def _get_readable_bus_channels(self, shipment_ids):
+        """Return the bus channels of the given shipments the user can read."""
+        shipments = self.browse(
+            [
+                shipment_id
+                for shipment_id in shipment_ids
+                if isinstance(shipment_id, int)
+            ]
+        ).exists()
+        if not shipments.check_access_rights("read", raise_exception=False):
+            return []
+        shipments = shipments._filter_access_rules("read")
+        return [shipment._get_bus_channel() for shipment in shipments]
+
+    def get_loading_progress(self):
+        """Return the current loading totals of the shipment.
+
+        Used by dock screens as a starting point before applying the delta
+        events received on the bus channel of the shipment, the events of a
+        content version up to the returned one being already included.
+        """
+        self.ensure_one()
+        return {
+            "name": self.name,
+            "channel": self._get_bus_channel(),
+            "content_version": self.content_version,
+            "packages": self.loaded_packages_count,
+            "move_lines": self.loaded_move_lines_without_package_count,
+            "weight": self.loaded_weight,
+        }
+
+    def button_open_dock_screen(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.client",
+            "tag": "shipment_advice_dock_screen",
+            "name": self.name,
+            "params": {"shipment_advice_id": self.id},
+        }
+
+    @api.model
+    def _read_cross_dock_supplies(self, warehouse, date_from, date_to):
+        """Return the content planned in the incoming shipments of the
+        warehouse arriving in the period, as a list of (shipment ID, product
+        ID, lot ID, package ID, quantity) sorted by arrival.
+        """
+        self.flush(["shipment_type", "state", "warehouse_id", "arrival_date"])
+        self.env["stock.move"].flush(
+            ["shipment_advice_id", "state", "product_id", "product_qty"]
+        )
+        self.env["stock.move.line"].flush(
+            ["move_id", "lot_id", "result_package_id", "product_qty"]
+        )
+        self.env.cr.execute(
+            """
+            SELECT sa.id, move.product_id, ml.lot_id, ml.result_package_id,
+                COALESCE(ml.product_qty, move.product_qty)
+            FROM shipment_advice sa
+            JOIN stock_move move ON move.shipment_advice_id = sa.id
+            LEFT JOIN stock_move_line ml ON ml.move_id = move.id
+            WHERE sa.shipment_type = 'incoming'
+                AND sa.state IN ('confirmed', 'in_progress')
+                AND sa.warehouse_id = %s
+                AND sa.arrival_date >= %s
+                AND sa.arrival_date < %s
+                AND move.state NOT IN ('cancel', 'done')
+            ORDER BY sa.arrival_date, sa.id, move.id, ml.id;
+            """,
+            (warehouse.id, date_from, date_to),
+        )
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _read_cross_dock_demands(self, warehouse, date_to):
+        """Return the outgoing moves of the warehouse expected before the
+        given date, waiting for goods and not planned in a shipment, as a list
+        of (move ID, product ID, quantity) sorted by expected date.
+        """
+        self.env["stock.move"].flush(
+            [
+                "shipment_advice_id",
+                "state",
+                "picking_type_id",
+                "product_id",
+                "product_qty",
+                "date_expected",
+            ]
+        )
+        self.env.cr.execute(
+            """
+            SELECT move.id, move.product_id, move.product_qty
+            FROM stock_move move
+            JOIN stock_picking_type picking_type
+                ON picking_type.id = move.picking_type_id
+            WHERE picking_type.code = 'outgoing'
+                AND picking_type.warehouse_id = %s
+                AND move.state IN ('confirmed', 'waiting')
+                AND move.shipment_advice_id IS NULL
+                AND move.date_expected < %s
+            ORDER BY move.date_expected, move.id;
+            """,
+            (warehouse.id, date_to),
+        )
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _match_cross_dock(self, supplies, demands):
+        """Match the demands against the supplies in one pass.
+
+        The supplies are indexed by product, the content of each incoming
+        shipment by lot and package being consumed by order of arrival. Only
+        the demands which can be fully covered are matched.
+
+        Return the allocations of the matched moves as a dictionary
+        {move ID: [(shipment ID, lot ID, package ID, quantity)]}, and the IDs
+        of the moves which can only be partially covered.
+        """
+        precision_digits = self.env["decimal.precision"].precision_get(
+            "Product Unit of Measure"
+        )
+        supplies_by_product = defaultdict(deque)
+        available = defaultdict(float)
+        for shipment_id, product_id, lot_id, package_id, qty in supplies:
+            supplies_by_product[product_id].append(
+                [shipment_id, lot_id, package_id, qty]
+            )
+            available[product_id] += qty
+        allocations = {}
+        partial_ids = []
+        for move_id, product_id, qty in demands:
+            if float_is_zero(available[product_id], precision_digits=precision_digits):
+                continue
+            if (
+                float_compare(
+                    available[product_id], qty, precision_digits=precision_digits
+                )
+                < 0
+            ):
+                partial_ids.append(move_id)
+                continue
+            available[product_id] -= qty
+            product_supplies = supplies_by_product[product_id]
+            move_allocations = allocations[move_id] = []
+            while product_supplies and not float_is_zero(
+                qty, precision_digits=precision_digits
+            ):
+                supply = product_supplies[0]
+                allocated_qty = min(qty, supply[3])
+                move_allocations.append(tuple(supply[:3]) + (allocated_qty,))
+                supply[3] -= allocated_qty
+                qty -= allocated_qty
+                if float_is_zero(supply[3], precision_digits=precision_digits):
+                    product_supplies.popleft()
+        return allocations, partial_ids
+
+    @api.model
+    def _get_day_bounds(self, warehouse, date):
+        """Return the start and end (UTC) of the given day, in the timezone
+        of the user, or else of the warehouse.
+        """
+        tz_name = (
+            self.env.context.get("tz")
+            or self.env.user.tz
+            or warehouse.partner_id.tz
+            or "UTC"
+        )
+        tz = pytz.timezone(tz_name)
+        day = fields.Date.to_date(date)
+        return tuple(
+            tz.localize(
+                datetime.combine(day + timedelta(days=delta), datetime.min.time())
+            )
+            .astimezone(pytz.utc)
+            .replace(tzinfo=None)
+            for delta in (0, 1)
+        )
+
+    @api.model
+    def _get_cross_dock_matches(self, warehouse, date):
+        """Return the matches (see `_match_cross_dock`) between the incoming
+        shipments of the warehouse arriving on the given day and the pending
+        deliveries.
+        """
+        date_from, date_to = self._get_day_bounds(warehouse, date)
+        return self._match_cross_dock(
+            self._read_cross_dock_supplies(warehouse, date_from, date_to),
+            self._read_cross_dock_demands(warehouse, date_to),
+        )
+
+    @api.model
+    def _plan_cross_dock(self, warehouse, date):
+        """Create outgoing shipments aligned with the incoming shipments of
+        the day and plan in them the deliveries covered by their content.
+
+        Deliveries are planned in a shipment arriving with the last incoming
+        shipment they need goods from. Return the created shipments.
+        """
+        allocations, __ = self._get_cross_dock_matches(warehouse, date)
+        move_ids_by_incoming = defaultdict(list)
+        for move_id, move_allocations in allocations.items():
+            move_ids_by_incoming[move_allocations[-1][0]].append(move_id)
+        incomings = self.browse(list(move_ids_by_incoming))
+        shipments = self.with_context(shipment_advice_bulk_create=True).create(
+            [
+                {
+                    "shipment_type": "outgoing",
+                    "warehouse_id": warehouse.id,
+                    "arrival_date": incoming.arrival_date,
+                }
+                for incoming in incomings
+            ]
+        )
+        for incoming, shipment in zip(incomings, shipments):
+            moves = self.env["stock.move"].browse(move_ids_by_incoming[incoming.id])
+            moves._plan_in_shipment(shipment)
+        return shipments
+
+    def _find_deliveries_to_load(self):
+        """Return the deliveries that could be loaded at once in the shipment.
+
+        Eligible deliveries are the ones listed in the loading progress, related
+        to the shipping methods of the shipment, fully reserved and without
+        content loaded in another shipment.
+        """
+        self.ensure_one()
+        picking_model = self.env["stock.picking"]
+        if not self.carrier_ids:
+            return picking_model.browse()
+        domain = self._domain_open_deliveries_in_progress() + [
+            ("state", "=", "assigned"),
+            ("carrier_id", "in", self.carrier_ids.ids),
+            ("is_fully_loaded_in_shipment", "=", False),
+        ]
+        pickings = picking_model.search(domain)
+        if not pickings:
+            return pickings
+        # Deliveries with a move not fully reserved
+        moves_data = self.env["stock.move"].read_group(
+            [
+                ("picking_id", "in", pickings.ids),
+                ("state", "not in", ("assigned", "done", "cancel")),
+            ],
+            ["picking_id"],
+            ["picking_id"],
+        )
+        # Deliveries with content loaded in another shipment
+        lines_data = self.env["stock.move.line"].read_group(
+            [
+                ("picking_id", "in", pickings.ids),
+                ("shipment_advice_id", "!=", False),
+                ("shipment_advice_id", "!=", self.id),
+            ],
+            ["picking_id"],
+            ["picking_id"],
+        )
+        excluded_ids = {data["picking_id"][0] for data in moves_data + lines_data}
+        return pickings.filtered(lambda p: p.id not in excluded_ids)
+
+    def _load_deliveries(self, pickings):
+        """Load the given deliveries in the shipment in one batch."""
+        self.ensure_one()
+        pickings._load_in_shipment(self)
+        if self.state == "confirmed":
+            self.action_in_progress()
+        return True
+
+    def button_load_deliveries(self):
+        self.ensure_one()
+        action = self.env.ref(
+            "shipment_advice.wizard_load_deliveries_shipment_action"
+        ).read()[0]
+        action["context"] = {"default_shipment_advice_id": self.id}
+        return action
+
     def button_open_deliveries_in_progress(self):
         action = self.env.ref("stock.action_picking_tree_all").read()[0]
         view_tree = self.env.ref(
@@ -431,3 +1898,188 @@ class ShipmentAdvice(models.Model):
         action["views"][tree_view_index] = (view_tree.id, "tree")
         action["domain"] = [("id", "in", self.planned_picking_ids.ids)]
         return action
+
+    def _get_batch_operations(self):
+        """Return the specification of the operations of the batch API.
+
+        For each operation: the models it accepts, the states the shipment
+        should be in and the shipment method processing the records.
+        """
+        return {
+            "plan": {
+                "models": ("stock.picking", "stock.move"),
+                "shipment_states": ("draft", "confirmed"),
+                "process": "_batch_plan",
+            },
+            "load": {
+                "models": ("stock.picking", "stock.move.line", "stock.package_level"),
+                "shipment_states": ("confirmed", "in_progress"),
+                "process": "_batch_load",
+            },
+            "unload": {
+                "models": ("stock.picking", "stock.move.line", "stock.package_level"),
+                "shipment_states": ("in_progress",),
+                "process": "_batch_unload",
+            },
+        }
+
+    def _get_batch_domain(self, operation, model):
+        """Return the domain that records of `model` have to satisfy to be
+        processed by `operation` in the current shipment.
+        """
+        self.ensure_one()
+        type_field = {
+            "stock.picking": "picking_type_code",
+            "stock.move": "picking_type_id.code",
+            "stock.move.line": "picking_id.picking_type_id.code",
+            "stock.package_level": "picking_type_code",
+        }[model]
+        domain = [
+            ("state", "not in", ("cancel", "done")),
+            (type_field, "=", self.shipment_type),
+        ]
+        if operation == "load":
+            # Only reserved content can be loaded, as in the load wizard
+            if model == "stock.picking":
+                domain.append(("state", "=", "assigned"))
+            elif model == "stock.move.line":
+                domain.append(("state", "in", ("assigned", "partially_available")))
+        if operation == "unload":
+            loaded_field = (
+                "shipment_advice_id"
+                if model == "stock.move.line"
+                else "move_line_ids.shipment_advice_id"
+            )
+            domain.append((loaded_field, "=", self.id))
+        return domain
+
+    def _batch_plan(self, records):
+        records._plan_in_shipment(self)
+
+    def _batch_load(self, records):
+        records._load_in_shipment(self)
+        if self.state == "confirmed":
+            self.action_in_progress()
+
+    def _batch_unload(self, records):
+        records._unload_from_shipment()
+
+    def _run_in_savepoint(self, func, *args):
+        """Run `func` in a savepoint, returning the error message if any."""
+        self.flush()
+        try:
+            with self.env.cr.savepoint():
+                func(*args)
+                self.flush()
+        except (AccessError, MissingError, UserError, ValidationError) as exc:
+            self.env.clear()
+            return exc.args[0]
+        return False
+
+    @api.model
+    def _filter_batch_access(self, records):
+        """Return the records of a batch the user is allowed to modify."""
+        if not records.check_access_rights("write", raise_exception=False):
+            return records.browse()
+        return records._filter_access_rules("write")
+
+    @api.model
+    def _process_batch(self, operation, items):
+        """Process a batch of items for the given operation.
+
+        Each item is a dictionary with `shipment_advice_id`, `model` and
+        `res_id` keys. Items are grouped by shipment and model so that each
+        group is checked and processed at once. If a group fails, its items
+        are processed one by one to identify the failing ones.
+
+        Return one result per item, in the same order, as a dictionary with
+        `success` and `error` keys.
+        """
+        spec = self._get_batch_operations()[operation]
+        results = [{"success": False, "error": False} for __ in items]
+        shipments = self._filter_batch_access(
+            self.browse(
+                {item.get("shipment_advice_id") for item in items} - {None, False}
+            ).exists()
+        )
+        groups = defaultdict(list)
+        for index, item in enumerate(items):
+            model = item.get("model")
+            if model not in spec["models"]:
+                results[index]["error"] = _("Model {} is not supported.").format(model)
+            elif item.get("shipment_advice_id") not in shipments.ids:
+                results[index]["error"] = _("Shipment advice not found.")
+            elif not isinstance(item.get("res_id"), int):
+                results[index]["error"] = _("Record ID is missing.")
+            else:
+                groups[(item["shipment_advice_id"], model)].append(
+                    (index, item.get("res_id"))
+                )
+        for (shipment_id, model), group_items in groups.items():
+            shipment = self.browse(shipment_id)
+            if shipment.state not in spec["shipment_states"]:
+                error = _("Shipment {} is not in a valid state.").format(shipment.name)
+                for index, __ in group_items:
+                    results[index]["error"] = error
+                continue
+            records = (
+                self.env[model].browse([res_id for __, res_id in group_items]).exists()
+            )
+            records = self._filter_batch_access(records)
+            eligible_ids = set(
+                records.filtered_domain(
+                    shipment._get_batch_domain(operation, model)
+                ).ids
+            )
+            to_process = []
+            for index, res_id in group_items:
+                if res_id in eligible_ids:
+                    to_process.append((index, res_id))
+                else:
+                    results[index]["error"] = _(
+                        "Record {} {} not found or not eligible."
+                    ).format(model, res_id)
+            if not to_process:
+                continue
+            records = self.env[model].browse([res_id for __, res_id in to_process])
+            process = getattr(shipment, spec["process"])
+            error = shipment._run_in_savepoint(process, records)
+            if not error:
+                for index, __ in to_process:
+                    results[index]["success"] = True
+                continue
+            for index, res_id in to_process:
+                record = self.env[model].browse(res_id).exists()
+                if not record:
+                    results[index]["error"] = _("Record {} {} not found.").format(
+                        model, res_id
+                    )
+                    continue
+                error = shipment._run_in_savepoint(process, record)
+                results[index]["success"] = not error
+                results[index]["error"] = error
+        return results
+
+    @api.model
+    def plan_many(self, items):
+        """Plan transfers or moves in shipment advices.
+
+        See `_process_batch` for the format of `items` and of the result.
+        """
+        return self._process_batch("plan", items)
+
+    @api.model
+    def load_many(self, items):
+        """Load transfers, move lines or package levels in shipment advices.
+
+        See `_process_batch` for the format of `items` and of the result.
+        """
+        return self._process_batch("load", items)
+
+    @api.model
+    def unload_many(self, items):
+        """Unload transfers, move lines or package levels from shipment advices.
+
+        See `_process_batch` for the format of `items` and of the result.
+        """
+        return self._process_batch("unload", items)
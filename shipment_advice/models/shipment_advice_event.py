@@ -0,0 +1,102 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import UserError
+
+
+class ShipmentAdviceEvent(models.Model):
+    _name = "shipment.advice.event"
+    _description = "Shipment Advice content event"
+    _order = "shipment_advice_id, version, id"
+    # Append-only log: the event date and user are enough
+    _log_access = False
+
+    shipment_advice_id = fields.Many2one(
+        comodel_name="shipment.advice",
+        ondelete="cascade",
+        string="Shipment advice",
+        required=True,
+        readonly=True,
+    )
+    version = fields.Integer(required=True, readonly=True)
+    event = fields.Selection(
+        selection=[
+            ("plan", "Plan"),
+            ("unplan", "Unplan"),
+            ("load", "Load"),
+            ("unload", "Unload"),
+            ("transfer_in", "Transfer in"),
+            ("transfer_out", "Transfer out"),
+        ],
+        required=True,
+        readonly=True,
+    )
+    res_model = fields.Char(string="Model", required=True, readonly=True)
+    res_id = fields.Integer(string="Record ID", required=True, readonly=True)
+    date = fields.Datetime(required=True, readonly=True)
+    user_id = fields.Many2one(
+        comodel_name="res.users", ondelete="set null", string="User", readonly=True
+    )
+    device = fields.Char(readonly=True, help="Device which sent the operation.")
+
+    def init(self):
+        tools.create_index(
+            self.env.cr,
+            "shipment_advice_event_shipment_version_index",
+            self._table,
+            ["shipment_advice_id", "version"],
+        )
+        tools.create_index(
+            self.env.cr, "shipment_advice_event_date_index", self._table, ["date"]
+        )
+
+    def write(self, vals):
+        raise UserError(_("Shipment advice events can't be modified."))
+
+    def unlink(self):
+        raise UserError(_("Shipment advice events can't be deleted."))
+
+    @api.model
+    def _get_removal_events(self):
+        """Return the events removing a record from the shipment content."""
+        return ("unplan", "unload", "transfer_out")
+
+    @api.model
+    def _insert_events(self, vals_list):
+        """Insert the events in one query.
+
+        Events are append-only, they are inserted without going through
+        the ORM to keep the (un)loading operations cheap. The device is
+        taken from the `shipment_advice_device` context key.
+        """
+        if not vals_list:
+            return
+        now = fields.Datetime.now()
+        uid = self.env.uid
+        device = self.env.context.get("shipment_advice_device") or None
+        rows = [
+            (
+                vals["shipment_advice_id"],
+                vals["version"],
+                vals["event"],
+                vals["res_model"],
+                vals["res_id"],
+                now,
+                uid,
+                device,
+            )
+            for vals in vals_list
+        ]
+        # Each row is adapted as a parenthesized list of values
+        self.env.cr.execute(
+            """
+            INSERT INTO shipment_advice_event (
+                shipment_advice_id, version, event, res_model, res_id,
+                date, user_id, device
+            ) VALUES {}
+            """.format(
+                ", ".join(["%s"] * len(rows))
+            ),
+            rows,
+        )
@@ -0,0 +1,254 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+
+
+class ShipmentAdviceScan(models.Model):
+    _name = "shipment.advice.scan"
+    _description = "Shipment Advice scan (idempotency key)"
+    _order = "id DESC"
+
+    key = fields.Char(string="Idempotency key", required=True, readonly=True)
+    operation = fields.Selection(
+        selection=[("load", "Load"), ("unload", "Unload")],
+        required=True,
+        readonly=True,
+    )
+    shipment_advice_id = fields.Many2one(
+        comodel_name="shipment.advice",
+        ondelete="cascade",
+        string="Shipment advice",
+        readonly=True,
+    )
+    company_id = fields.Many2one(
+        comodel_name="res.company",
+        string="Company",
+        required=True,
+        readonly=True,
+        index=True,
+        default=lambda self: self.env.company,
+    )
+    res_model = fields.Char(string="Model", readonly=True)
+    res_id = fields.Integer(string="Record ID", readonly=True)
+    device = fields.Char(readonly=True)
+    success = fields.Boolean(readonly=True)
+    error = fields.Char(readonly=True)
+
+    _sql_constraints = [
+        (
+            "key_uniq",
+            "unique(key, company_id)",
+            "Idempotency key must be unique per company!",
+        ),
+    ]
+
+    @api.model
+    def ingest(self, scans):
+        """Apply load and unload scans sent by devices, at most once each.
+
+        Each scan is a dictionary with `key` (the idempotency key generated
+        by the device), `operation` (`load` or `unload`),
+        `shipment_advice_id`, `model`, `res_id` and optionally `device`
+        (recorded in the event log) keys. Scans are applied
+        in the given order, so a queue of scans recorded offline can be
+        uploaded at once.
+
+        A scan whose key has already been received in the company of its
+        shipment is not applied again: the result recorded the first time is
+        returned with `duplicate` set.
+
+        Return one result per scan, in the same order, as a dictionary with
+        `success`, `error` and `duplicate` keys.
+        """
+        shipments_by_id = {
+            shipment.id: shipment
+            for shipment in self.env["shipment.advice"]
+            .browse(
+                {
+                    scan.get("shipment_advice_id")
+                    for scan in scans
+                    if isinstance(scan.get("shipment_advice_id"), int)
+                }
+            )
+            .exists()
+        }
+        # Keys are unique by company, the one of the shipment of the scan
+        scan_keys = [
+            (self._get_scan_company(scan, shipments_by_id).id, scan.get("key"))
+            for scan in scans
+        ]
+        known = {
+            (data["company_id"][0], data["key"]): data
+            for data in self.search_read(
+                [
+                    ("key", "in", [key for __, key in scan_keys if key]),
+                    (
+                        "company_id",
+                        "in",
+                        list({company_id for company_id, __ in scan_keys}),
+                    ),
+                ],
+                ["key", "company_id", "success", "error"],
+            )
+        }
+        results = [None] * len(scans)
+        to_apply = []
+        pending_keys = set()
+        for index, scan in enumerate(scans):
+            scan_key = scan_keys[index]
+            if not scan.get("key"):
+                results[index] = {
+                    "success": False,
+                    "error": _("Missing idempotency key."),
+                    "duplicate": False,
+                }
+            elif scan_key in known:
+                results[index] = dict(
+                    success=known[scan_key]["success"],
+                    error=known[scan_key]["error"],
+                    duplicate=True,
+                )
+            elif scan_key in pending_keys:
+                # Sent twice in the batch: gets the result of the first one below
+                continue
+            elif scan.get("operation") not in ("load", "unload"):
+                results[index] = {
+                    "success": False,
+                    "error": _("Operation {} is not supported.").format(
+                        scan.get("operation")
+                    ),
+                    "duplicate": False,
+                }
+            else:
+                pending_keys.add(scan_key)
+                to_apply.append(index)
+        # Claim the keys before applying the scans: a key claimed meanwhile by
+        # a concurrent upload is not applied a second time
+        claimed = self._claim_keys(
+            [
+                self._prepare_scan_values(scans[index], shipments_by_id)
+                for index in to_apply
+            ]
+        )
+        to_apply = [index for index in to_apply if scan_keys[index] in claimed]
+        # Apply consecutive scans of the same operation and device together
+        scan_ids_by_result = defaultdict(list)
+        while to_apply:
+            operation = scans[to_apply[0]]["operation"]
+            device = scans[to_apply[0]].get("device")
+            run = []
+            while (
+                to_apply
+                and scans[to_apply[0]]["operation"] == operation
+                and scans[to_apply[0]].get("device") == device
+            ):
+                run.append(to_apply.pop(0))
+            run_results = (
+                self.env["shipment.advice"]
+                .with_context(shipment_advice_device=device)
+                ._process_batch(operation, [scans[index] for index in run])
+            )
+            for index, result in zip(run, run_results):
+                scan_key = scan_keys[index]
+                known[scan_key] = result
+                results[index] = dict(result, duplicate=False)
+                scan_ids_by_result[(result["success"], result["error"])].append(
+                    claimed[scan_key]
+                )
+        for (success, error), scan_ids in scan_ids_by_result.items():
+            self.browse(scan_ids).write({"success": success, "error": error})
+        for index, result in enumerate(results):
+            if result is None:
+                company_id, key = scan_key = scan_keys[index]
+                if scan_key not in known:
+                    # Claimed by a concurrent upload not visible from here
+                    known.update(
+                        {
+                            scan_key: data
+                            for data in self.search_read(
+                                [("key", "=", key), ("company_id", "=", company_id)],
+                                ["success", "error"],
+                            )
+                        }
+                    )
+                result = known.get(scan_key) or {
+                    "success": False,
+                    "error": _("Scan is being processed."),
+                }
+                results[index] = dict(
+                    success=result["success"], error=result["error"], duplicate=True,
+                )
+        return results
+
+    @api.model
+    def _get_scan_company(self, scan, shipments_by_id):
+        """Return the company of the scan: the one of its shipment if any."""
+        shipment = shipments_by_id.get(scan.get("shipment_advice_id"))
+        return shipment.company_id if shipment else self.env.company
+
+    def _claim_keys(self, vals_list):
+        """Insert the scans whose key is not known yet in their company.
+
+        Return the IDs of the inserted scans indexed by (company ID, key).
+        """
+        if not vals_list:
+            return {}
+        fnames = list(vals_list[0])
+        query = """
+            INSERT INTO shipment_advice_scan (
+                {columns}, create_uid, create_date, write_uid, write_date
+            )
+            VALUES {values}
+            ON CONFLICT (key, company_id) DO NOTHING
+            RETURNING company_id, key, id
+        """.format(
+            columns=", ".join(fnames),
+            values=", ".join(
+                [
+                    "({}, %s, (now() at time zone 'UTC'), "
+                    "%s, (now() at time zone 'UTC'))".format(
+                        ", ".join(["%s"] * len(fnames))
+                    )
+                ]
+                * len(vals_list)
+            ),
+        )
+        params = []
+        for vals in vals_list:
+            params.extend([vals[fname] for fname in fnames])
+            params.extend([self.env.uid, self.env.uid])
+        self.env.cr.execute(query, params)
+        return {
+            (company_id, key): scan_id
+            for company_id, key, scan_id in self.env.cr.fetchall()
+        }
+
+    def _prepare_scan_values(self, scan, shipments_by_id):
+        shipment = shipments_by_id.get(scan.get("shipment_advice_id"))
+        return {
+            "key": scan["key"],
+            "operation": scan["operation"],
+            "shipment_advice_id": shipment.id if shipment else None,
+            "company_id": self._get_scan_company(scan, shipments_by_id).id,
+            "res_model": scan.get("model"),
+            "res_id": scan["res_id"] if isinstance(scan.get("res_id"), int) else None,
+            "device": scan.get("device"),
+        }
+
+    @api.model
+    def _gc_expired_keys(self):
+        """Remove idempotency keys older than the deduplication window of
+        the company of their scan.
+        """
+        for company in self.env["res.company"].search([]):
+            window = company.shipment_advice_scan_dedup_window
+            limit_date = fields.Datetime.now() - timedelta(hours=window)
+            scans = self.search(
+                [("create_date", "<", limit_date), ("company_id", "=", company.id)]
+            )
+            scans.unlink()
+        return True
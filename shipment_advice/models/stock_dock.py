@@ -0,0 +1,27 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import api, fields, models
+
+
+class StockDock(models.Model):
+    _inherit = "stock.dock"
+
+    distance_ids = fields.One2many(
+        comodel_name="stock.dock.distance",
+        inverse_name="dock_id",
+        string="Distances to locations",
+    )
+    current_shipment_advice_id = fields.Many2one(
+        comodel_name="shipment.advice",
+        ondelete="set null",
+        string="Current shipment",
+        readonly=True,
+        copy=False,
+        help="Shipment advice in progress on the dock.",
+    )
+
+    @api.model
+    def _get_current_shipment_by_barcode(self, barcode, company=None):
+        """Return the shipment in progress on the dock having the barcode."""
+        return self._find_by_barcode(barcode, company).current_shipment_advice_id
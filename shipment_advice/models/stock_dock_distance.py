@@ -0,0 +1,38 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import fields, models
+
+
+class StockDockDistance(models.Model):
+    """Distance between a dock and a location (and its children), used to
+    recommend the dock the closest to the content of a shipment.
+    """
+
+    _name = "stock.dock.distance"
+    _description = "Distance between a dock and a location"
+    _order = "dock_id, distance"
+
+    dock_id = fields.Many2one(
+        comodel_name="stock.dock",
+        ondelete="cascade",
+        string="Dock",
+        required=True,
+        index=True,
+    )
+    location_id = fields.Many2one(
+        comodel_name="stock.location",
+        ondelete="cascade",
+        string="Location",
+        required=True,
+        help="The distance applies to the children of the location as well.",
+    )
+    distance = fields.Float(string="Distance (m)", digits=(16, 2), required=True)
+
+    _sql_constraints = [
+        (
+            "dock_location_uniq",
+            "unique(dock_id, location_id)",
+            "The distance between a dock and a location must be unique!",
+        ),
+    ]
@@ -1,19 +1,65 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
-from odoo import fields, models
+from odoo import api, fields, models
+
+from ..utils import create_index
 
 
 class StockMove(models.Model):
     _inherit = "stock.move"
 
     shipment_advice_id = fields.Many2one(
-        comodel_name="shipment.advice",
-        ondelete="set null",
-        string="Planned shipment",
-        index=True,
+        comodel_name="shipment.advice", ondelete="set null", string="Planned shipment",
     )
 
+    def init(self):
+        super().init()
+        # Most moves are not planned in a shipment: index only the planned ones
+        create_index(
+            self.env.cr,
+            "stock_move_shipment_advice_picking_index",
+            self._table,
+            ["shipment_advice_id", "picking_id"],
+            where="shipment_advice_id IS NOT NULL",
+        )
+
+    @api.model
+    def _get_shipment_content_fields(self):
+        """Return the fields changing the content of the related shipments."""
+        return {"shipment_advice_id", "picking_id", "state"}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records.shipment_advice_id._bump_content_version()
+        return records
+
+    def write(self, vals):
+        if not self._get_shipment_content_fields() & set(vals):
+            return super().write(vals)
+        shipments = self.shipment_advice_id
+        res = super().write(vals)
+        (shipments | self.shipment_advice_id)._bump_content_version()
+        return res
+
+    def unlink(self):
+        shipments = self.shipment_advice_id
+        res = super().unlink()
+        shipments._bump_content_version()
+        return res
+
     def _plan_in_shipment(self, shipment_advice):
         """Plan the moves into the given shipment advice."""
+        for shipment in self.shipment_advice_id - shipment_advice:
+            moves = self.filtered(lambda m: m.shipment_advice_id == shipment)
+            shipment._log_content_event("unplan", [moves])
         self.shipment_advice_id = shipment_advice
+        shipment_advice._log_content_event("plan", [self])
+
+    def _unplan_from_shipment(self):
+        """Unplan the moves from their related shipment advice."""
+        for shipment in self.shipment_advice_id:
+            moves = self.filtered(lambda m: m.shipment_advice_id == shipment)
+            shipment._log_content_event("unplan", [moves])
+        self.shipment_advice_id = False
@@ -1,20 +1,174 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
-from odoo import _, fields, models
+from collections import defaultdict
+
+from odoo import _, api, fields, models
 from odoo.exceptions import UserError
 
+from ..utils import create_index
+
 
 class StockMoveLine(models.Model):
     _inherit = "stock.move.line"
 
     shipment_advice_id = fields.Many2one(
-        comodel_name="shipment.advice",
-        ondelete="set null",
-        string="Shipment advice",
-        index=True,
+        comodel_name="shipment.advice", ondelete="set null", string="Shipment advice",
+    )
+
+    weight = fields.Float(
+        string="Weight",
+        digits="Stock Weight",
+        compute="_compute_weight",
+        store=True,
+        help=(
+            "Weight of the line, based on the quantity done (or reserved) and "
+            "the product weight. For the lines of a package having a shipping "
+            "weight, this weight is shared between its lines prorata their "
+            "product weight."
+        ),
     )
 
+    def init(self):
+        super().init()
+        # Most move lines are not loaded in a shipment: index only the loaded ones
+        create_index(
+            self.env.cr,
+            "stock_move_line_shipment_advice_picking_index",
+            self._table,
+            ["shipment_advice_id", "picking_id"],
+            where="shipment_advice_id IS NOT NULL",
+        )
+        create_index(
+            self.env.cr,
+            "stock_move_line_shipment_advice_package_level_index",
+            self._table,
+            ["shipment_advice_id", "package_level_id"],
+            where="shipment_advice_id IS NOT NULL",
+        )
+
+    @api.model
+    def _get_shipment_content_fields(self):
+        """Return the fields changing the content of the related shipments."""
+        return {"shipment_advice_id", "picking_id", "move_id", "package_level_id"}
+
+    @api.model
+    def _get_shipment_totals_fields(self):
+        """Return the fields changing the loaded totals of the shipments."""
+        return {
+            "shipment_advice_id",
+            "product_id",
+            "product_uom_id",
+            "product_uom_qty",
+            "qty_done",
+        }
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # The weight of the lines of the package levels is shared again
+        package_level_ids = {vals.get("package_level_id") for vals in vals_list}
+        siblings = (
+            self.env["stock.package_level"]
+            .browse(package_level_ids - {None, False})
+            .move_line_ids
+        )
+        before = siblings._get_shipment_totals()
+        records = super().create(vals_list)
+        records.shipment_advice_id._bump_content_version()
+        after = (records | siblings)._get_shipment_totals()
+        self.env["shipment.advice"]._add_loaded_totals(before, after)
+        return records
+
+    def write(self, vals):
+        content_changed = bool(self._get_shipment_content_fields() & set(vals))
+        totals_changed = bool(self._get_shipment_totals_fields() & set(vals))
+        if not content_changed and not totals_changed:
+            return super().write(vals)
+        shipments = self.shipment_advice_id
+        if totals_changed:
+            lines = self._get_shipment_totals_lines(vals.get("package_level_id"))
+            before = lines._get_shipment_totals()
+        res = super().write(vals)
+        shipments |= self.shipment_advice_id
+        if content_changed:
+            shipments._bump_content_version()
+        if totals_changed:
+            after = lines._get_shipment_totals()
+            self.env["shipment.advice"]._add_loaded_totals(before, after)
+        return res
+
+    def unlink(self):
+        shipments = self.shipment_advice_id
+        lines = self._get_shipment_totals_lines()
+        before = lines._get_shipment_totals()
+        siblings = lines - self
+        res = super().unlink()
+        shipments._bump_content_version()
+        after = siblings.exists()._get_shipment_totals()
+        self.env["shipment.advice"]._add_loaded_totals(before, after)
+        return res
+
+    def _get_shipment_totals_lines(self, package_level_id=None):
+        """Return the lines whose loaded weight or volume change with the
+        lines: the lines themselves and the other lines of their package
+        levels, which share the shipping weight of the package.
+        """
+        package_levels = self.package_level_id | self.env["stock.package_level"].browse(
+            package_level_id or []
+        )
+        return self | package_levels.move_line_ids
+
+    def _get_shipment_totals(self):
+        """Return the weight and volume loaded through the lines, by shipment."""
+        totals = defaultdict(lambda: [0.0, 0.0])
+        for line in self.filtered("shipment_advice_id"):
+            total = totals[line.shipment_advice_id.id]
+            total[0] += line.weight
+            total[1] += line.product_id.volume * line._get_product_qty()
+        return totals
+
+    @api.depends(
+        "product_id",
+        "product_uom_id",
+        "product_qty",
+        "qty_done",
+        "package_level_id.package_id.shipping_weight",
+        # The shipping weight is shared between the lines of the package
+        "package_level_id.move_line_ids.product_qty",
+        "package_level_id.move_line_ids.qty_done",
+    )
+    def _compute_weight(self):
+        package_lines = self.package_level_id.move_line_ids
+        base_weights = {
+            line: line._get_product_weight() for line in self | package_lines
+        }
+        for line in self:
+            line.weight = base_weights[line]
+            package = line.package_level_id.package_id
+            if not package.shipping_weight:
+                continue
+            package_weight = sum(
+                base_weights[pl_line] for pl_line in line.package_level_id.move_line_ids
+            )
+            if package_weight:
+                line.weight = (
+                    package.shipping_weight * base_weights[line] / package_weight
+                )
+
+    def _get_product_qty(self):
+        """Return the quantity done (or reserved) in the unit of the product."""
+        self.ensure_one()
+        if self.qty_done:
+            return self.product_uom_id._compute_quantity(
+                self.qty_done, self.product_id.uom_id, rounding_method="HALF-UP"
+            )
+        return self.product_qty
+
+    def _get_product_weight(self):
+        """Return the product weight of the quantity done (or reserved)."""
+        self.ensure_one()
+        return self.product_id.weight * self._get_product_qty()
+
     def button_load_in_shipment(self):
         action = self.env.ref(
             "shipment_advice.wizard_load_shipment_picking_action"
@@ -35,37 +189,64 @@ class StockMoveLine(models.Model):
                     return False
         return True
 
-    def _load_in_shipment(self, shipment_advice):
-        """Load the move lines into the given shipment advice."""
+    def _get_load_in_shipment_errors(self, shipment_advice):
+        """Return the reasons preventing to load the move lines into the
+        given shipment advice, its capacity apart.
+        """
+        errors = []
         # Entire package check
         if not self._check_entire_package():
-            raise UserError(
+            errors.append(
                 _(
                     "You cannot load this move line alone, you have to "
                     "move the whole package content."
                 )
             )
-        for move_line in self:
-            # Shipment has to be the planned one (if any)
-            planned_shipment = move_line.move_id.shipment_advice_id
-            if planned_shipment and planned_shipment != shipment_advice:
-                raise UserError(
-                    _(
-                        "You cannot load this into this shipment as it has been "
-                        "planned to be loaded in {}"
-                    ).format(planned_shipment.name)
-                )
-            # If no planned shipment, allow the loading only if the shipment
-            # is not a planned one
-            elif not planned_shipment and shipment_advice.planned_move_ids:
-                raise UserError(
-                    _(
-                        "You cannot load this into this shipment because its "
-                        "content is planned already."
-                    )
+        # Shipment has to be the planned one (if any)
+        planned_shipments = self.move_id.shipment_advice_id
+        other_planned_shipments = planned_shipments - shipment_advice
+        if other_planned_shipments:
+            errors.append(
+                _(
+                    "You cannot load this into this shipment as it has been "
+                    "planned to be loaded in {}"
+                ).format(fields.first(other_planned_shipments).name)
+            )
+        # If no planned shipment, allow the loading only if the shipment
+        # is not a planned one
+        not_planned_moves = self.move_id.filtered(lambda m: not m.shipment_advice_id)
+        if not_planned_moves and shipment_advice.planned_move_ids:
+            errors.append(
+                _(
+                    "You cannot load this into this shipment because its "
+                    "content is planned already."
                 )
-            move_line.shipment_advice_id = shipment_advice.id
-            move_line.qty_done = move_line.product_uom_qty
+            )
+        return errors
+
+    def _load_in_shipment(self, shipment_advice):
+        """Load the move lines into the given shipment advice."""
+        errors = self._get_load_in_shipment_errors(shipment_advice)
+        if errors:
+            raise UserError(errors[0])
+        lines_to_load = self.filtered(
+            lambda ml: ml.shipment_advice_id != shipment_advice
+        )
+        shipment_advice._check_capacity(
+            lines_to_load._get_shipment_loaded_weight(),
+            lines_to_load._get_shipment_loaded_volume(),
+        )
+        for shipment in lines_to_load.shipment_advice_id:
+            lines = lines_to_load.filtered(lambda ml: ml.shipment_advice_id == shipment)
+            lines._on_shipment_content_changed("unload", shipment)
+        self.shipment_advice_id = shipment_advice
+        # Set the done quantities with one write per distinct quantity
+        lines_by_qty = defaultdict(lambda: self.browse())
+        for move_line in self:
+            lines_by_qty[move_line.product_uom_qty] |= move_line
+        for qty, lines in lines_by_qty.items():
+            lines.qty_done = qty
+        lines_to_load._on_shipment_content_changed("load", shipment_advice)
 
     def _unload_from_shipment(self):
         """Unload the move lines from their related shipment advice."""
@@ -76,9 +257,115 @@ class StockMoveLine(models.Model):
                     "unload the whole package content."
                 )
             )
+        for shipment in self.shipment_advice_id:
+            lines = self.filtered(lambda ml: ml.shipment_advice_id == shipment)
+            lines._on_shipment_content_changed("unload", shipment)
         self.shipment_advice_id = False
         self.qty_done = 0
 
+    def _transfer_to_shipment(self, shipment_advice):
+        """Transfer the loaded move lines into the given shipment advice.
+
+        Quantities loaded are kept as is, only the shipment advice of the
+        lines (and of their planned moves if any) is updated.
+        """
+        if not self._check_entire_package():
+            raise UserError(
+                _(
+                    "You cannot transfer this move line alone, you have to "
+                    "transfer the whole package content."
+                )
+            )
+        if self.filtered(lambda ml: not ml.shipment_advice_id):
+            raise UserError(
+                _("You cannot transfer content which is not loaded in a shipment.")
+            )
+        shipments = self.shipment_advice_id | shipment_advice
+        not_in_progress = shipments.filtered(lambda s: s.state != "in_progress")
+        if not_in_progress:
+            raise UserError(
+                _("Shipment {} is not started, operation aborted.").format(
+                    ", ".join(not_in_progress.mapped("name"))
+                )
+            )
+        # Moves planned in another shipment follow their loaded content
+        moves_to_plan = self.move_id.filtered(
+            lambda m: m.shipment_advice_id and m.shipment_advice_id != shipment_advice
+        )
+        # Lines left in the source shipment would belong to a move planned
+        # in the destination one
+        partially_transferred_moves = moves_to_plan.filtered(
+            lambda m: m.move_line_ids.filtered("shipment_advice_id") - self
+        )
+        if partially_transferred_moves:
+            raise UserError(
+                _(
+                    "You cannot transfer only a part of the loaded content of "
+                    "the planned moves {}, you have to transfer all their "
+                    "loaded lines."
+                ).format(", ".join(partially_transferred_moves.mapped("display_name")))
+            )
+        not_planned_moves = self.move_id.filtered(lambda m: not m.shipment_advice_id)
+        if not_planned_moves and shipment_advice.planned_move_ids:
+            raise UserError(
+                _(
+                    "You cannot transfer this into this shipment because its "
+                    "content is planned already."
+                )
+            )
+        lines_to_transfer = self.filtered(
+            lambda ml: ml.shipment_advice_id != shipment_advice
+        )
+        shipment_advice._check_capacity(
+            lines_to_transfer._get_shipment_loaded_weight(),
+            lines_to_transfer._get_shipment_loaded_volume(),
+        )
+        moves_to_plan._plan_in_shipment(shipment_advice)
+        for shipment in self.shipment_advice_id - shipment_advice:
+            lines = self.filtered(lambda ml: ml.shipment_advice_id == shipment)
+            lines._on_shipment_content_changed("transfer_out", shipment)
+            lines._on_shipment_content_changed("transfer_in", shipment_advice)
+        self.shipment_advice_id = shipment_advice
+
+    def _get_shipment_loaded_weight(self):
+        """Return the weight loaded in a shipment through the move lines."""
+        return sum(self.mapped("weight"))
+
+    def _get_shipment_loaded_volume(self):
+        """Return the volume loaded in a shipment through the move lines."""
+        return sum(ml.product_id.volume * ml._get_product_qty() for ml in self)
+
+    def _on_shipment_content_changed(self, event, shipment_advice):
+        """Hook called when the move lines are (un)loaded in the shipment."""
+        if not self:
+            return
+        shipment_advice._log_content_event(event, [self, self.package_level_id])
+        self._notify_shipment_progress(event, shipment_advice)
+
+    def _notify_shipment_progress(self, event, shipment_advice):
+        """Publish the progress delta brought by the move lines on the bus
+        channel of the shipment advice.
+        """
+        if not self:
+            return
+        sign = -1 if event in ("unload", "transfer_out") else 1
+        package_levels = self.package_level_id.filtered(
+            shipment_advice._check_include_package_level
+        )
+        bulk_lines = self.filtered(lambda ml: not ml.package_level_id)
+        message = {
+            "event": event,
+            "shipment_advice_id": shipment_advice.id,
+            # Version logged with the change, to be compared with the one of
+            # the totals read by the dock screens
+            "content_version": shipment_advice.content_version,
+            "picking_ids": self.picking_id.ids,
+            "packages": sign * len(package_levels.package_id),
+            "move_lines": sign * len(bulk_lines),
+            "weight": sign * self._get_shipment_loaded_weight(),
+        }
+        self.env["bus.bus"].sendone(shipment_advice._get_bus_channel(), message)
+
     def _is_loaded_in_shipment(self):
         """Return `True` if the move lines are loaded in a shipment."""
         return all([line.qty_done and line.shipment_advice_id for line in self])
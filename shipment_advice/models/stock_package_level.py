@@ -11,6 +11,21 @@ class StockPackageLevel(models.Model):
     package_shipping_weight = fields.Float(related="package_id.shipping_weight")
     package_weight_uom_name = fields.Char(related="package_id.weight_uom_name")
 
+    def write(self, vals):
+        if "package_id" not in vals:
+            return super().write(vals)
+        shipments = self.move_line_ids.shipment_advice_id
+        res = super().write(vals)
+        (shipments | self.move_line_ids.shipment_advice_id)._bump_content_version()
+        return res
+
+    def unlink(self):
+        # Lines of the deleted package levels are no longer part of them
+        shipments = self.move_line_ids.shipment_advice_id
+        res = super().unlink()
+        shipments._bump_content_version()
+        return res
+
     def button_load_in_shipment(self):
         action = self.env.ref(
             "shipment_advice.wizard_load_shipment_picking_action"
@@ -31,6 +46,10 @@ class StockPackageLevel(models.Model):
         """Unload the package levels from their related shipment advice."""
         self.move_line_ids._unload_from_shipment()
 
+    def _transfer_to_shipment(self, shipment_advice):
+        """Transfer the loaded package levels into the given shipment advice."""
+        self.move_line_ids._transfer_to_shipment(shipment_advice)
+
     def _is_loaded_in_shipment(self):
         """Return `True` if the package levels are loaded in a shipment."""
         return all([pl.is_done and pl.shipment_advice_id for pl in self])
@@ -4,6 +4,8 @@
 from odoo import api, fields, models
 from odoo.tools import float_round
 
+from ..utils import create_index
+
 
 class StockPicking(models.Model):
     _inherit = "stock.picking"
@@ -12,14 +14,18 @@ class StockPicking(models.Model):
         comodel_name="shipment.advice",
         related="move_lines.shipment_advice_id",
         store=True,
-        index=True,
     )
     is_fully_loaded_in_shipment = fields.Boolean(
-        string="Is fully loaded in a shipment?", compute="_compute_loaded_in_shipment",
+        string="Is fully loaded in a shipment?",
+        compute="_compute_loaded_in_shipment",
+        store=True,
+        index=True,
     )
     is_partially_loaded_in_shipment = fields.Boolean(
         string="Is partially loaded in a shipment?",
         compute="_compute_loaded_in_shipment",
+        store=True,
+        index=True,
     )
     loaded_packages_count = fields.Integer(
         "Packages loaded", compute="_compute_shipment_loaded_progress",
@@ -61,27 +67,106 @@ class StockPicking(models.Model):
     loaded_weight_progress = fields.Char(
         "Weight/total", compute="_compute_shipment_loaded_progress"
     )
+    loading_sequence = fields.Integer(
+        string="Loading sequence",
+        copy=False,
+        readonly=True,
+        help=(
+            "Order in which the content of the transfer has to be loaded in its "
+            "shipment, the last delivered being loaded first."
+        ),
+    )
     loaded_shipment_advice_ids = fields.Many2many(
-        "shipment.advice", compute="_compute_loaded_in_shipment",
+        comodel_name="shipment.advice",
+        relation="shipment_advice_loaded_picking_rel",
+        column1="picking_id",
+        column2="shipment_advice_id",
+        compute="_compute_loaded_in_shipment",
+        store=True,
     )
 
-    @api.depends("move_line_ids.shipment_advice_id")
+    def init(self):
+        super().init()
+        # Covering index to list the planned transfers of a shipment and
+        # their state without reading the table
+        create_index(
+            self.env.cr,
+            "stock_picking_planned_shipment_advice_index",
+            self._table,
+            ["planned_shipment_advice_id"],
+            where="planned_shipment_advice_id IS NOT NULL",
+            include=["id", "state"],
+        )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "carrier_id" in vals:
+            shipments = (
+                self.planned_shipment_advice_id | self.loaded_shipment_advice_ids
+            )
+            shipments._bump_content_version()
+        return res
+
+    def _read_loaded_in_shipment_data(self):
+        """Return the loading status of the transfers, indexed by transfer ID.
+
+        The move lines of all the transfers are aggregated in one query,
+        transfers without move line are not part of the result.
+        """
+        picking_ids = tuple(filter(None, self.ids))
+        if not picking_ids:
+            return {}
+        self.env["stock.move.line"].flush(
+            ["picking_id", "shipment_advice_id", "qty_done", "product_uom_qty"]
+        )
+        self.env.cr.execute(
+            """
+            SELECT picking_id,
+                bool_and(
+                    shipment_advice_id IS NOT NULL AND qty_done = product_uom_qty
+                ),
+                bool_or(shipment_advice_id IS NOT NULL AND qty_done > 0),
+                array_agg(DISTINCT shipment_advice_id)
+                    FILTER (WHERE shipment_advice_id IS NOT NULL)
+            FROM stock_move_line
+            WHERE picking_id IN %s
+            GROUP BY picking_id;
+            """,
+            (picking_ids,),
+        )
+        return {
+            row[0]: {
+                "fully_loaded": row[1],
+                "partially_loaded": row[2],
+                "shipment_advice_ids": row[3] or [],
+            }
+            for row in self.env.cr.fetchall()
+        }
+
+    @api.depends(
+        "move_line_ids.shipment_advice_id",
+        "move_line_ids.qty_done",
+        "move_line_ids.product_uom_qty",
+    )
     def _compute_loaded_in_shipment(self):
+        data = self._read_loaded_in_shipment_data()
         for picking in self:
-            picking.is_fully_loaded_in_shipment = all(
-                line.shipment_advice_id and line.qty_done == line.product_uom_qty
-                for line in picking.move_line_ids
+            # A transfer without move line is considered as fully loaded
+            picking_data = data.get(
+                picking.id,
+                {
+                    "fully_loaded": True,
+                    "partially_loaded": False,
+                    "shipment_advice_ids": [],
+                },
             )
+            picking.is_fully_loaded_in_shipment = picking_data["fully_loaded"]
             picking.is_partially_loaded_in_shipment = (
-                not picking.is_fully_loaded_in_shipment
-                and any(
-                    line.shipment_advice_id and line.qty_done > 0
-                    for line in picking.move_line_ids
-                )
-            )
-            picking.loaded_shipment_advice_ids = (
-                picking.move_line_ids.shipment_advice_id
+                not picking_data["fully_loaded"] and picking_data["partially_loaded"]
             )
+            picking.loaded_shipment_advice_ids = [
+                (6, 0, picking_data["shipment_advice_ids"])
+            ]
 
     @api.depends("package_level_ids.package_id", "move_line_ids")
     def _compute_shipment_loaded_progress(self):
@@ -130,19 +215,10 @@ class StockPicking(models.Model):
                 )
             # Weight/total
             if picking.shipping_weight:
-                # FIXME: not sure how to get the weight of bulk line?
                 picking.loaded_weight = sum(
-                    [
-                        ml.result_package_id.shipping_weight or ml.move_id.weight
-                        for ml in picking.move_line_ids_without_package
-                        if ml.shipment_advice_id and ml.qty_done > 0
-                    ]
-                ) + sum(
-                    [
-                        pl.package_id.shipping_weight
-                        for pl in picking.package_level_ids
-                        if pl.shipment_advice_id and pl.is_done
-                    ]
+                    ml.weight
+                    for ml in picking.move_line_ids
+                    if ml.shipment_advice_id and ml.qty_done > 0
                 )
                 total_weight = float_round(
                     picking.shipping_weight, precision_rounding=0.01,
@@ -179,6 +255,13 @@ class StockPicking(models.Model):
         action["context"] = {"active_model": self._name, "active_ids": self.ids}
         return action
 
+    def button_transfer_to_shipment(self):
+        action = self.env.ref(
+            "shipment_advice.wizard_transfer_shipment_picking_action"
+        ).read()[0]
+        action["context"] = {"active_model": self._name, "active_ids": self.ids}
+        return action
+
     def _plan_in_shipment(self, shipment_advice):
         """Plan the whole transfers content into the given shipment advice."""
         self.move_lines._plan_in_shipment(shipment_advice)
@@ -186,9 +269,19 @@ class StockPicking(models.Model):
     def _load_in_shipment(self, shipment_advice):
         """Load the whole transfers content into the given shipment advice."""
         self.package_level_ids._load_in_shipment(shipment_advice)
-        self.move_line_ids._load_in_shipment(shipment_advice)
+        # Lines of package levels have already been loaded with them
+        bulk_lines = self.move_line_ids - self.package_level_ids.move_line_ids
+        bulk_lines._load_in_shipment(shipment_advice)
 
     def _unload_from_shipment(self):
         """Unload the whole transfers content from their related shipment advice."""
         self.package_level_ids._unload_from_shipment()
         self.move_line_ids._unload_from_shipment()
+
+    def _transfer_to_shipment(self, shipment_advice):
+        """Transfer the loaded content of the transfers into the given
+        shipment advice.
+        """
+        self.move_line_ids.filtered("shipment_advice_id")._transfer_to_shipment(
+            shipment_advice
+        )
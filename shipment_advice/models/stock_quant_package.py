@@ -0,0 +1,21 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import models
+
+
+class StockQuantPackage(models.Model):
+    _inherit = "stock.quant.package"
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "shipping_weight" in vals:
+            # The weight of the loaded lines of the packages is shared again
+            lines = self.env["stock.move.line"].search(
+                [
+                    ("package_level_id.package_id", "in", self.ids),
+                    ("shipment_advice_id", "!=", False),
+                ]
+            )
+            lines.shipment_advice_id._refresh_loaded_totals()
+        return res
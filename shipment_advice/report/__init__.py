@@ -0,0 +1,2 @@
+from . import shipment_advice_throughput_report
+from . import shipment_advice_dock_report
@@ -0,0 +1,164 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import api, fields, models, tools
+
+
+class ShipmentAdviceDockReport(models.Model):
+    """Dock utilization, one row per shipment advice started on a dock.
+
+    The view can be materialized (see the settings) to keep long periods
+    fast to analyze, it is then refreshed by a scheduled action.
+    """
+
+    _name = "shipment.advice.dock.report"
+    _description = "Shipment Advice dock utilization"
+    _auto = False
+    _order = "date DESC"
+
+    shipment_advice_id = fields.Many2one(
+        comodel_name="shipment.advice", string="Shipment advice", readonly=True
+    )
+    date = fields.Date(string="Day", readonly=True)
+    company_id = fields.Many2one(
+        comodel_name="res.company", string="Company", readonly=True
+    )
+    warehouse_id = fields.Many2one(
+        comodel_name="stock.warehouse", string="Warehouse", readonly=True
+    )
+    dock_id = fields.Many2one(
+        comodel_name="stock.dock", string="Loading dock", readonly=True
+    )
+    shipment_type = fields.Selection(
+        selection=[("outgoing", "Outgoing"), ("incoming", "Incoming")],
+        string="Type",
+        readonly=True,
+    )
+    state = fields.Selection(
+        selection=[("in_progress", "In progress"), ("done", "Done")],
+        string="Status",
+        readonly=True,
+    )
+    truck_count = fields.Integer(string="Trucks", readonly=True)
+    occupancy_hours = fields.Float(string="Occupancy (hours)", readonly=True)
+    duration_minutes = fields.Float(
+        string="Avg. duration (minutes)", group_operator="avg", readonly=True
+    )
+    package_count = fields.Integer(string="Packages loaded", readonly=True)
+    move_line_count = fields.Integer(string="Lines loaded", readonly=True)
+    loaded_weight = fields.Float(string="Weight loaded", readonly=True)
+    minutes_per_package = fields.Float(
+        string="Avg. minutes per package", group_operator="avg", readonly=True
+    )
+
+    def _query(self):
+        return """
+            WITH content AS (
+                -- Content of the shipments being loaded
+                SELECT ml.shipment_advice_id,
+                    COUNT(DISTINCT ml.package_level_id) AS package_count,
+                    COUNT(*) AS move_line_count,
+                    SUM(ml.weight) AS weight
+                FROM stock_move_line ml
+                JOIN shipment_advice sa ON sa.id = ml.shipment_advice_id
+                WHERE sa.state != 'done' OR sa.manifest IS NULL
+                GROUP BY ml.shipment_advice_id
+                UNION ALL
+                -- Content of the done shipments, frozen in their manifest
+                SELECT sa.id,
+                    jsonb_array_length(manifest.data->'packages'),
+                    COALESCE(
+                        (manifest.data->>'move_lines_count')::integer,
+                        jsonb_array_length(manifest.data->'lines')
+                    ),
+                    (manifest.data->>'total_load')::numeric
+                FROM shipment_advice sa,
+                    LATERAL (SELECT sa.manifest::jsonb AS data) manifest
+                WHERE sa.state = 'done' AND sa.manifest IS NOT NULL
+            ), shipment AS (
+                SELECT sa.*,
+                    EXTRACT(
+                        EPOCH FROM COALESCE(
+                            sa.departure_date, NOW() AT TIME ZONE 'UTC'
+                        ) - sa.arrival_date
+                    ) / 60.0 AS duration
+                FROM shipment_advice sa
+                WHERE sa.state IN ('in_progress', 'done')
+                    AND sa.dock_id IS NOT NULL
+                    AND sa.arrival_date IS NOT NULL
+            )
+            SELECT shipment.id,
+                shipment.id AS shipment_advice_id,
+                shipment.arrival_date::date AS date,
+                shipment.company_id,
+                shipment.warehouse_id,
+                shipment.dock_id,
+                shipment.shipment_type,
+                shipment.state,
+                1 AS truck_count,
+                shipment.duration / 60.0 AS occupancy_hours,
+                shipment.duration AS duration_minutes,
+                COALESCE(content.package_count, 0) AS package_count,
+                COALESCE(content.move_line_count, 0) AS move_line_count,
+                COALESCE(content.weight, 0) AS loaded_weight,
+                CASE WHEN content.package_count > 0
+                    THEN shipment.duration / content.package_count
+                END AS minutes_per_package
+            FROM shipment
+            LEFT JOIN content ON content.shipment_advice_id = shipment.id
+        """
+
+    @api.model
+    def _is_materialized(self):
+        param = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("shipment_advice.dock_report_materialized")
+        )
+        return bool(param)
+
+    @api.model
+    def _drop_view(self):
+        self.env.cr.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s", (self._table,)
+        )
+        row = self.env.cr.fetchone()
+        if row and row[0] == "m":
+            self.env.cr.execute(
+                "DROP MATERIALIZED VIEW IF EXISTS {} CASCADE".format(self._table)
+            )
+        else:
+            tools.drop_view_if_exists(self.env.cr, self._table)
+
+    def init(self):
+        self._drop_view()
+        if self._is_materialized():
+            self.env.cr.execute(
+                "CREATE MATERIALIZED VIEW {} AS ({})".format(self._table, self._query())
+            )
+            # Required to refresh the view concurrently
+            self.env.cr.execute(
+                "CREATE UNIQUE INDEX {table}_id_index ON {table} (id)".format(
+                    table=self._table
+                )
+            )
+            tools.create_index(
+                self.env.cr,
+                "%s_date_dock_index" % self._table,
+                self._table,
+                ["date", "dock_id"],
+            )
+        else:
+            self.env.cr.execute(
+                "CREATE OR REPLACE VIEW {} AS ({})".format(self._table, self._query())
+            )
+
+    @api.model
+    def _refresh_materialized_view(self):
+        if not self._is_materialized():
+            return
+        self.env["shipment.advice"].flush()
+        self.env["stock.move.line"].flush(["shipment_advice_id", "weight"])
+        self.env.cr.execute(
+            "REFRESH MATERIALIZED VIEW CONCURRENTLY {}".format(self._table)
+        )
@@ -0,0 +1,83 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import fields, models, tools
+
+
+class ShipmentAdviceThroughputReport(models.Model):
+    _name = "shipment.advice.throughput.report"
+    _description = "Shipment Advice loading throughput"
+    _auto = False
+    _order = "date DESC"
+
+    date = fields.Datetime(string="Hour", readonly=True)
+    company_id = fields.Many2one(
+        comodel_name="res.company", string="Company", readonly=True
+    )
+    warehouse_id = fields.Many2one(
+        comodel_name="stock.warehouse", string="Warehouse", readonly=True
+    )
+    dock_id = fields.Many2one(
+        comodel_name="stock.dock", string="Loading dock", readonly=True
+    )
+    shipment_type = fields.Selection(
+        selection=[("outgoing", "Outgoing"), ("incoming", "Incoming")],
+        string="Type",
+        readonly=True,
+    )
+    user_id = fields.Many2one(
+        comodel_name="res.users", string="Operator", readonly=True
+    )
+    device = fields.Char(readonly=True)
+    shipment_count = fields.Integer(string="Shipments", readonly=True)
+    loaded_package_count = fields.Integer(string="Packages loaded", readonly=True)
+    loaded_move_line_count = fields.Integer(string="Lines loaded", readonly=True)
+    loaded_weight = fields.Float(string="Weight loaded", readonly=True)
+    unloaded_move_line_count = fields.Integer(string="Lines unloaded", readonly=True)
+
+    def _query(self):
+        return """
+            SELECT MIN(event.id) AS id,
+                date_trunc('hour', event.date) AS date,
+                shipment.company_id,
+                shipment.warehouse_id,
+                shipment.dock_id,
+                shipment.shipment_type,
+                event.user_id,
+                event.device,
+                COUNT(DISTINCT event.shipment_advice_id) AS shipment_count,
+                COUNT(*) FILTER (
+                    WHERE event.event = 'load'
+                        AND event.res_model = 'stock.package_level'
+                ) AS loaded_package_count,
+                COUNT(*) FILTER (
+                    WHERE event.event = 'load'
+                        AND event.res_model = 'stock.move.line'
+                ) AS loaded_move_line_count,
+                COALESCE(
+                    SUM(ml.weight) FILTER (WHERE event.event = 'load'), 0
+                ) AS loaded_weight,
+                COUNT(*) FILTER (
+                    WHERE event.event = 'unload'
+                        AND event.res_model = 'stock.move.line'
+                ) AS unloaded_move_line_count
+            FROM shipment_advice_event event
+            JOIN shipment_advice shipment
+                ON shipment.id = event.shipment_advice_id
+            LEFT JOIN stock_move_line ml
+                ON event.res_model = 'stock.move.line' AND ml.id = event.res_id
+            WHERE event.event IN ('load', 'unload')
+            GROUP BY date_trunc('hour', event.date),
+                shipment.company_id,
+                shipment.warehouse_id,
+                shipment.dock_id,
+                shipment.shipment_type,
+                event.user_id,
+                event.device
+        """
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(
+            "CREATE OR REPLACE VIEW {} AS ({})".format(self._table, self._query())
+        )
@@ -0,0 +1,110 @@
+/* Copyright 2021 Camptocamp SA
+ * License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl). */
+
+odoo.define("shipment_advice.DockScreen", function(require) {
+    "use strict";
+
+    var AbstractAction = require("web.AbstractAction");
+    var core = require("web.core");
+
+    var QWeb = core.qweb;
+
+    /**
+     * Display the loading progress of a shipment advice on a dock screen.
+     *
+     * The totals are read once when the screen is opened, then kept up to
+     * date with the delta events published on the bus channel of the
+     * shipment advice by the load and unload operations. Each event carries
+     * the content version it was logged with, so that the events already
+     * included in the totals are not applied twice.
+     */
+    var DockScreen = AbstractAction.extend({
+        template: "shipment_advice.DockScreen",
+
+        init: function(parent, action) {
+            this._super.apply(this, arguments);
+            this.shipmentId = action.params.shipment_advice_id;
+            this.totals = null;
+            this.pendingNotifications = [];
+        },
+
+        willStart: function() {
+            var self = this;
+            // Subscribe before reading the totals so that no delta is missed,
+            // the deltas already included in the totals are skipped by version.
+            // The channel is added by the server once the access to the
+            // shipment advice is checked.
+            this.call("bus_service", "updateOption", "shipment_advice_ids", [
+                this.shipmentId,
+            ]);
+            this.call("bus_service", "onNotification", this, this._onNotification);
+            this.call("bus_service", "startPolling");
+            var def = this._rpc({
+                model: "shipment.advice",
+                method: "get_loading_progress",
+                args: [[this.shipmentId]],
+            }).then(function(totals) {
+                self.totals = totals;
+                var notifications = self.pendingNotifications;
+                self.pendingNotifications = [];
+                _.each(notifications, self._applyNotification.bind(self));
+            });
+            return Promise.all([this._super.apply(this, arguments), def]);
+        },
+
+        start: function() {
+            this._renderTotals();
+            return this._super.apply(this, arguments);
+        },
+
+        destroy: function() {
+            this.call("bus_service", "deleteOption", "shipment_advice_ids");
+            this._super.apply(this, arguments);
+        },
+
+        _renderTotals: function() {
+            this.$(".o_shipment_advice_dock_screen_totals").html(
+                QWeb.render("shipment_advice.DockScreenTotals", {
+                    totals: this.totals,
+                })
+            );
+        },
+
+        _applyNotification: function(notification) {
+            if (!_.isEqual(notification[0], this.totals.channel)) {
+                return false;
+            }
+            var event = notification[1];
+            if (event.content_version <= this.totals.content_version) {
+                // Already included in the totals
+                return false;
+            }
+            this.totals.packages += event.packages;
+            this.totals.move_lines += event.move_lines;
+            this.totals.weight += event.weight;
+            return true;
+        },
+
+        _onNotification: function(notifications) {
+            var self = this;
+            if (!this.totals) {
+                // Totals not read yet, applied once read
+                this.pendingNotifications = this.pendingNotifications.concat(
+                    notifications
+                );
+                return;
+            }
+            var updated = false;
+            _.each(notifications, function(notification) {
+                updated = self._applyNotification(notification) || updated;
+            });
+            if (updated) {
+                this._renderTotals();
+            }
+        },
+    });
+
+    core.action_registry.add("shipment_advice_dock_screen", DockScreen);
+
+    return DockScreen;
+});
@@ -2,3 +2,7 @@ from . import test_shipment_advice
 from . import test_shipment_advice_plan
 from . import test_shipment_advice_load
 from . import test_shipment_advice_unload
+from . import test_shipment_advice_transfer
+from . import test_shipment_advice_scan
+from . import test_shipment_advice_loading_sequence
+from . import test_shipment_advice_index
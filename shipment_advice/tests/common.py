@@ -147,3 +147,14 @@ class Common(SavepointCase):
         wiz = wiz_model.create({})
         wiz.action_unload()
         return wiz
+
+    def _transfer_records_to_shipment(self, shipment_advice, records):
+        """Move loaded pickings, move lines or package levels to the given
+        shipment.
+        """
+        wiz_model = self.env["wizard.transfer.shipment"].with_context(
+            active_model=records._name, active_ids=records.ids,
+        )
+        wiz = wiz_model.create({"shipment_advice_id": shipment_advice.id})
+        wiz.action_transfer()
+        return wiz
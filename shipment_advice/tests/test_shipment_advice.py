@@ -1,9 +1,16 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
+from datetime import timedelta
+from unittest.mock import patch
+
+from psycopg2 import IntegrityError, OperationalError
+
 from odoo import fields
 from odoo.exceptions import UserError
+from odoo.tools import mute_logger
 
+from ..models.shipment_advice import CONTENT_SNAPSHOT_CACHE
 from .common import Common
 
 
@@ -138,6 +145,211 @@ class TestShipmentAdvice(Common):
         )
         self.assertEqual(picking2.state, "assigned")
 
+    def test_shipment_advice_done_release_unshipped_moves(self):
+        company = self.shipment_advice_out.company_id
+        company.shipment_advice_outgoing_backorder_policy = "leave_open"
+        shipment = self.shipment_advice_out
+        picking = self.move_product_out1.picking_id
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._in_progress_shipment_advice(shipment)
+        self._plan_records_in_shipment(shipment, picking)
+        self._load_records_in_shipment(shipment, package_level)
+        shipped_moves = package_level.move_line_ids.move_id
+        released_moves = picking.move_lines - shipped_moves
+        version = shipment.content_version
+        shipment.action_done()
+        # Moves not shipped are released, the transfer stays planned with the
+        # loaded ones
+        self.assertFalse(released_moves.shipment_advice_id)
+        self.assertEqual(shipped_moves.shipment_advice_id, shipment)
+        self.assertEqual(shipment.planned_move_ids, shipped_moves)
+        self.assertEqual(picking.planned_shipment_advice_id, shipment)
+        self.assertGreater(shipment.content_version, version)
+        self.assertTrue(
+            any(picking.name in message.body for message in shipment.message_ids)
+        )
+
+    def test_shipment_advice_done_parallel(self):
+        shipment = self.shipment_advice_out
+        shipment_sharing, shipment_alone = self.env["shipment.advice"].create(
+            [{"shipment_type": "outgoing"}, {"shipment_type": "outgoing"}]
+        )
+        picking = self.move_product_out1.picking_id
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._in_progress_shipment_advice(shipment)
+        self._in_progress_shipment_advice(shipment_sharing)
+        self._plan_records_in_shipment(shipment, picking)
+        self._load_records_in_shipment(shipment_sharing, package_level)
+        self._plan_records_in_shipment(
+            self.shipment_advice_in, self.move_product_in1.picking_id
+        )
+        shipments = shipment | shipment_sharing | shipment_alone
+        shipments |= self.shipment_advice_in
+        # Shipments sharing a transfer are in the same group
+        groups = shipments._get_closing_groups()
+        self.assertEqual(
+            sorted(group.ids for group in groups),
+            sorted(
+                [
+                    (shipment | shipment_sharing).ids,
+                    shipment_alone.ids,
+                    self.shipment_advice_in.ids,
+                ]
+            ),
+        )
+        # Only started shipments can be requested to be closed
+        with self.assertRaises(UserError):
+            (shipment_sharing | shipment_alone).action_done_parallel()
+        shipment_sharing.action_done_parallel()
+        self.assertTrue(shipment_sharing.to_close)
+        self.assertEqual(shipment_sharing.state, "in_progress")
+        # The worker closes its group in its own transaction, reporting the
+        # errors by shipment
+        shipment_alone.to_close = True
+        workers = shipment_sharing | shipment_alone
+        self.env["base"].flush()
+        self.registry.enter_test_mode(self.env.cr)
+        try:
+            errors, failed = workers._close_in_new_cursor()
+        finally:
+            self.registry.leave_test_mode()
+        workers.invalidate_cache()
+        self.assertFalse(failed)
+        self.assertFalse(errors[shipment_sharing.id])
+        self.assertEqual(shipment_sharing.state, "done")
+        self.assertIn(shipment_alone.name, errors[shipment_alone.id])
+        self.assertEqual(shipment_alone.state, "draft")
+        self.assertIn(
+            shipment_alone.name, shipment_alone.message_ids[0].body,
+        )
+        self.assertFalse(workers.filtered("to_close"))
+        # The scheduled action closes the requested shipments
+        self._in_progress_shipment_advice(shipment_alone)
+        shipment_alone.action_done_parallel()
+        self.env["shipment.advice"]._cron_close()
+        self.assertEqual(shipment_alone.state, "done")
+        self.assertFalse(shipment_alone.to_close)
+
+    def test_shipment_advice_close_in_threads(self):
+        shipment_model = self.env["shipment.advice"]
+        shipment, shipment_failing = shipment_model.create(
+            [{"shipment_type": "outgoing"}, {"shipment_type": "outgoing"}]
+        )
+        shipments = shipment | shipment_failing
+        for record in shipments:
+            self._in_progress_shipment_advice(record)
+        shipments.action_done_parallel()
+        self.assertEqual(len(shipments._get_closing_groups()), 2)
+        shipment_class = type(shipment_model)
+        close = shipment_class._close
+
+        def close_or_fail(records):
+            if shipment_failing in records:
+                raise OperationalError("could not serialize access")
+            return close(records)
+
+        self.env["base"].flush()
+        # Threads share the transaction of the test
+        self.registry.enter_test_mode(self.env.cr)
+        try:
+            with patch.object(
+                shipment_class, "_can_close_in_threads", return_value=True
+            ), patch.object(
+                shipment_class, "_close", autospec=True, side_effect=close_or_fail
+            ) as close_mock, mute_logger(
+                "odoo.addons.shipment_advice.models.shipment_advice"
+            ):
+                errors = shipments._close_in_parallel(workers=2)
+        finally:
+            self.registry.leave_test_mode()
+        self.assertEqual(close_mock.call_count, 2)
+        self.assertFalse(errors[shipment.id])
+        self.assertIn("serialize", errors[shipment_failing.id])
+        self.assertEqual(shipment.state, "done")
+        self.assertFalse(shipment.to_close)
+        # The failure is recorded, the shipment is closed again later
+        self.assertEqual(shipment_failing.state, "in_progress")
+        self.assertTrue(shipment_failing.to_close)
+        self.assertIn("serialize", shipment_failing.close_error)
+        self.assertIn("retried", shipment_failing.message_ids[0].body)
+        shipment_model._cron_close()
+        self.assertEqual(shipment_failing.state, "done")
+        self.assertFalse(shipment_failing.to_close)
+        self.assertFalse(shipment_failing.close_error)
+
+    def test_shipment_advice_recommend_dock(self):
+        warehouse = self.shipment_advice_out.warehouse_id
+        dock2 = self.env["stock.dock"].create(
+            {"name": "Dock 02", "warehouse_id": warehouse.id}
+        )
+        self.env["stock.dock.distance"].create(
+            [
+                {
+                    "dock_id": self.dock.id,
+                    "location_id": warehouse.view_location_id.id,
+                    "distance": 10,
+                },
+                {
+                    "dock_id": dock2.id,
+                    "location_id": warehouse.view_location_id.id,
+                    "distance": 5,
+                },
+            ]
+        )
+        shipment = self.shipment_advice_out
+        self._plan_records_in_shipment(shipment, self.move_product_out1.picking_id)
+        self.assertGreater(shipment._read_dock_distances()[self.dock.id], 0)
+        # The closest dock has a shipment in progress
+        self._in_progress_shipment_advice(self.shipment_advice_in, dock2)
+        self._confirm_shipment_advice(shipment)
+        self.assertEqual(shipment.recommended_dock_id, self.dock)
+        ranked_docks = [rank["dock"] for rank in shipment._get_dock_ranking()]
+        self.assertNotIn(dock2, ranked_docks)
+        # The closest dock is booked during the stay of the shipment
+        self.shipment_advice_in.action_cancel()
+        other_shipment = self.env["shipment.advice"].create(
+            {
+                "shipment_type": "outgoing",
+                "dock_id": dock2.id,
+                "arrival_date": shipment.arrival_date,
+            }
+        )
+        other_shipment.action_confirm()
+        ranking = shipment._get_dock_ranking()
+        self.assertEqual(ranking[0]["dock"], self.dock)
+        self.assertEqual(ranking[1]["dock"], dock2)
+        self.assertGreater(ranking[1]["overlap"], 0)
+        # The closest dock is free
+        other_shipment.arrival_date = shipment.arrival_date + timedelta(days=1)
+        self.assertEqual(shipment._recommend_dock(), dock2)
+        # The recommendation is only a suggestion
+        shipment._update_recommended_dock()
+        with self.assertRaisesRegex(UserError, "Dock should be set"):
+            shipment.action_in_progress()
+        shipment.button_use_recommended_dock()
+        shipment.action_in_progress()
+        self.assertEqual(shipment.dock_id, dock2)
+
+    def test_shipment_advice_dock_current_shipment(self):
+        self.dock.barcode = "DOCK01"
+        dock_model = self.env["stock.dock"]
+        self.assertEqual(dock_model._find_by_barcode("DOCK01"), self.dock)
+        with mute_logger("odoo.sql_db"), self.assertRaises(IntegrityError):
+            with self.env.cr.savepoint():
+                dock_model.create({"name": "Dock 02", "barcode": "DOCK01"})
+        shipment = self.shipment_advice_out
+        self._in_progress_shipment_advice(shipment)
+        self.assertEqual(
+            dock_model._get_current_shipment_by_barcode("DOCK01"), shipment
+        )
+        self._load_records_in_shipment(shipment, self.move_product_out1.picking_id)
+        shipment.action_done()
+        self.assertFalse(self.dock.current_shipment_advice_id)
+        # The cached mapping follows the barcode changes
+        self.dock.barcode = "DOCK02"
+        self.assertFalse(dock_model._find_by_barcode("DOCK01"))
+        self.assertEqual(dock_model._find_by_barcode("DOCK02"), self.dock)
+
     def test_shipment_advice_cancel(self):
         self._in_progress_shipment_advice(self.shipment_advice_out)
         self.shipment_advice_out.action_cancel()
@@ -147,3 +359,200 @@ class TestShipmentAdvice(Common):
         self._cancel_shipment_advice(self.shipment_advice_out)
         self.shipment_advice_out.action_draft()
         self.assertEqual(self.shipment_advice_out.state, "draft")
+
+    def test_shipment_advice_content_snapshot_cache(self):
+        shipment = self.shipment_advice_out
+        picking = self.move_product_out1.picking_id
+        self._plan_records_in_shipment(shipment, picking)
+        # Content updated in the current transaction is not cached
+        shipment.invalidate_cache()
+        self.assertEqual(shipment.planned_picking_ids, picking)
+        key = (self.env.cr.dbname, shipment.id, shipment.content_version)
+        self.assertNotIn(key, CONTENT_SNAPSHOT_CACHE)
+        # Simulate a commit of the transaction
+        self.env.cr.cache.pop("shipment_advice_uncommitted_ids")
+        shipment.invalidate_cache()
+        self.assertEqual(shipment.planned_picking_ids, picking)
+        self.assertIn(key, CONTENT_SNAPSHOT_CACHE)
+        # Unplanning creates a new version, so a new snapshot
+        picking.move_lines._unplan_from_shipment()
+        self.assertFalse(shipment.planned_picking_ids)
+        self.assertEqual(shipment.planned_moves_count, 0)
+        self.assertEqual(len(CONTENT_SNAPSHOT_CACHE[key]["planned_move_ids"]), 3)
+
+    def test_shipment_advice_content_snapshot_cache_access(self):
+        shipment = self.shipment_advice_out
+        picking = self.move_product_out1.picking_id
+        self._plan_records_in_shipment(shipment, picking)
+        group = self.env["res.groups"].create({"name": "Restricted pickings"})
+        self.env["ir.rule"].create(
+            {
+                "name": "Hide the picking",
+                "model_id": self.env.ref("stock.model_stock_picking").id,
+                "groups": [(6, 0, group.ids)],
+                "domain_force": "[('id', '!=', {})]".format(picking.id),
+            }
+        )
+        user = self.env["res.users"].create(
+            {
+                "name": "Restricted user",
+                "login": "shipment_advice_restricted_user",
+                "groups_id": [
+                    (6, 0, (group | self.env.ref("stock.group_stock_user")).ids)
+                ],
+            }
+        )
+        # Simulate a commit of the transaction, the snapshot is cached
+        self.env.cr.cache.pop("shipment_advice_uncommitted_ids")
+        shipment.invalidate_cache()
+        self.assertEqual(shipment.planned_picking_ids, picking)
+        self.assertEqual(shipment.planned_pickings_count, 1)
+        # The cached snapshot is filtered with the access rules of the user
+        shipment.invalidate_cache()
+        restricted_shipment = shipment.with_user(user)
+        self.assertFalse(restricted_shipment.planned_picking_ids)
+        self.assertEqual(restricted_shipment.planned_pickings_count, 0)
+
+    def test_shipment_advice_content_snapshot_cache_orm_changes(self):
+        shipment = self.shipment_advice_out
+        picking = self.move_product_out1.picking_id
+        move_line = self.move_product_out1.move_line_ids
+        self._in_progress_shipment_advice(shipment)
+        self._load_records_in_shipment(shipment, move_line)
+        carrier = self.env.ref("delivery.free_delivery_carrier")
+        # Simulate a commit of the transaction
+        self.env.cr.cache.pop("shipment_advice_uncommitted_ids")
+        shipment.invalidate_cache()
+        self.assertEqual(shipment.loaded_move_lines_without_package_count, 1)
+        self.assertFalse(shipment.carrier_ids)
+        version = shipment.content_version
+        # Changes made outside of the shipment operations create new versions
+        picking.carrier_id = carrier
+        self.assertGreater(shipment.content_version, version)
+        self.assertEqual(shipment.carrier_ids, carrier)
+        self.env.cr.cache.pop("shipment_advice_uncommitted_ids")
+        shipment.invalidate_cache()
+        self.assertEqual(shipment.loaded_move_lines_without_package_count, 1)
+        move_line.unlink()
+        self.assertEqual(shipment.loaded_move_lines_without_package_count, 0)
+        self.assertFalse(shipment.loaded_picking_ids)
+
+    def test_shipment_advice_cron_auto_progress(self):
+        now = fields.Datetime.now()
+        shipment_draft = self.shipment_advice_out
+        shipment_draft.arrival_date = now
+        shipment_undated = self.shipment_advice_in
+        shipment_confirmed = self.shipment_advice_out.copy()
+        self._confirm_shipment_advice(shipment_confirmed, arrival_date=now)
+        shipment_confirmed.dock_id = self.dock
+        shipment_in_progress = self.shipment_advice_out.copy()
+        self._in_progress_shipment_advice(shipment_in_progress)
+        shipment_in_progress.departure_date = now
+        dock2 = self.env["stock.dock"].create(
+            {"name": "Dock 02", "warehouse_id": shipment_draft.warehouse_id.id}
+        )
+        self.env["shipment.advice"]._cron_auto_progress(chunk_size=1)
+        # Without dock, the confirmed shipment can't be started, a free dock
+        # is recommended
+        self.assertEqual(shipment_draft.state, "confirmed")
+        self.assertEqual(shipment_draft.recommended_dock_id, dock2)
+        self.assertEqual(shipment_undated.state, "draft")
+        self.assertEqual(shipment_confirmed.state, "in_progress")
+        self.assertEqual(shipment_in_progress.state, "in_progress")
+        # Closing depends on the company policy
+        shipment_in_progress.company_id.shipment_advice_auto_close = True
+        self.env["shipment.advice"]._cron_auto_progress()
+        self.assertEqual(shipment_in_progress.state, "done")
+        self.assertEqual(shipment_confirmed.state, "in_progress")
+
+    def test_shipment_advice_create_multi(self):
+        shipment_model = self.env["shipment.advice"]
+        sequence_model = self.env["ir.sequence"]
+        reserve = type(shipment_model)._reserve_sequence_names
+        next_by_id = type(sequence_model).next_by_id
+        reservations = []
+
+        def reserve_sequence_names(model, sequence, count):
+            reservations.append((sequence.code, count))
+            return reserve(model, sequence, count)
+
+        def sequence_next_by_id(sequence, *args, **kwargs):
+            reservations.append((sequence.code, 1))
+            return next_by_id(sequence, *args, **kwargs)
+
+        with patch.object(
+            type(shipment_model), "_reserve_sequence_names", reserve_sequence_names
+        ), patch.object(type(sequence_model), "next_by_id", sequence_next_by_id):
+            shipments = shipment_model.with_context(
+                shipment_advice_bulk_create=True
+            ).create(
+                [{"shipment_type": "outgoing"} for __ in range(5)]
+                + [{"shipment_type": "incoming"} for __ in range(2)]
+            )
+        outgoing = shipments.filtered(lambda s: s.shipment_type == "outgoing")
+        incoming = shipments - outgoing
+        # One reservation per sequence, for all its records
+        self.assertEqual(
+            sorted(reservations),
+            sorted(
+                [
+                    (shipment_model._get_sequence("outgoing").code, 5),
+                    (shipment_model._get_sequence("incoming").code, 2),
+                ]
+            ),
+        )
+        for records, prefix in ((outgoing, "SA/OUT/"), (incoming, "SA/IN/")):
+            names = records.mapped("name")
+            self.assertTrue(all(name.startswith(prefix) for name in names))
+            # Distinct and gap-free names
+            numbers = sorted(int(name.split("/")[-1]) for name in names)
+            self.assertEqual(
+                numbers, list(range(numbers[0], numbers[0] + len(records)))
+            )
+        # Next numbers follow the reserved ones
+        shipment = shipment_model.create({"shipment_type": "outgoing"})
+        self.assertEqual(
+            int(shipment.name.split("/")[-1]),
+            max(int(name.split("/")[-1]) for name in outgoing.mapped("name")) + 1,
+        )
+
+    def test_shipment_advice_done_manifest(self):
+        shipment = self.shipment_advice_out
+        picking = self.move_product_out1.picking_id
+        self.product_out1.weight = 2.0
+        self.product_out2.weight = self.product_out3.weight = 0.0
+        self._in_progress_shipment_advice(shipment)
+        self._load_records_in_shipment(shipment, picking)
+        self.assertFalse(shipment.manifest)
+        shipment.action_done()
+        manifest = shipment._get_manifest()
+        self.assertEqual(manifest["content"]["loaded_picking_ids"], picking.ids)
+        self.assertEqual(len(manifest["packages"]), 1)
+        self.assertEqual(manifest["packages"][0]["package"], self.package.name)
+        self.assertEqual(len(manifest["lines"]), 1)
+        self.assertEqual(manifest["lines"][0]["transfer"], picking.name)
+        self.assertEqual(manifest["move_lines_count"], 3)
+        self.assertAlmostEqual(manifest["total_load"], 40.0)
+        # Counters and total load of the done shipment no longer depend on
+        # the stock tables
+        self.env.cr.execute(
+            "UPDATE stock_move_line SET shipment_advice_id = NULL "
+            "WHERE shipment_advice_id = %s",
+            (shipment.id,),
+        )
+        shipment.invalidate_cache()
+        self.assertEqual(shipment.loaded_pickings_count, 1)
+        self.assertEqual(shipment.loaded_packages_count, 1)
+        self.assertAlmostEqual(shipment.total_load, 40.0)
+        row = self.env["shipment.advice.dock.report"].search(
+            [("shipment_advice_id", "=", shipment.id)]
+        )
+        self.assertEqual(row.state, "done")
+        self.assertEqual(row.package_count, 1)
+        self.assertEqual(row.move_line_count, 3)
+        self.assertAlmostEqual(row.loaded_weight, 40.0)
+        # The report is printed from the manifest
+        html = self.env.ref(
+            "shipment_advice.action_report_shipment_advice"
+        ).render_qweb_html(shipment.ids)[0]
+        self.assertIn(self.package.name, html.decode())
@@ -0,0 +1,97 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from .common import Common
+
+
+class TestShipmentAdviceIndex(Common):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Large synthetic dataset of moves, lines and transfers not related
+        # to any shipment, duplicated from the existing ones
+        cls.env["base"].flush()
+        move = cls.move_product_in1
+        cls._duplicate_row("stock_move", move.id, 20000)
+        cls._duplicate_row("stock_move_line", move.move_line_ids[:1].id, 20000)
+        cls._duplicate_row(
+            "stock_picking",
+            move.picking_id.id,
+            20000,
+            overrides={"name": "name || '-' || serie"},
+        )
+        for table in ("stock_move", "stock_move_line", "stock_picking"):
+            cls.env.cr.execute("ANALYZE %s" % table)
+
+    @classmethod
+    def _duplicate_row(cls, table, res_id, count, overrides=None):
+        overrides = overrides or {}
+        cls.env.cr.execute(
+            """
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = %s AND column_name != 'id';
+            """,
+            (table,),
+        )
+        columns = [row[0] for row in cls.env.cr.fetchall()]
+        cls.env.cr.execute(
+            "INSERT INTO {table} ({columns}) "
+            "SELECT {values} FROM {table}, generate_series(1, %s) AS serie "
+            "WHERE id = %s".format(
+                table=table,
+                columns=", ".join('"%s"' % column for column in columns),
+                values=", ".join(
+                    overrides.get(column, '"%s"' % column) for column in columns
+                ),
+            ),
+            (count, res_id),
+        )
+
+    def _explain(self, model, domain):
+        self.env[model].flush()
+        query = self.env[model]._where_calc(domain)
+        from_clause, where_clause, params = query.get_sql()
+        self.env.cr.execute(
+            "EXPLAIN SELECT id FROM {} WHERE {}".format(from_clause, where_clause),
+            params,
+        )
+        return "\n".join(row[0] for row in self.env.cr.fetchall())
+
+    def test_shipment_advice_index(self):
+        shipment = self.shipment_advice_out
+        picking = self.move_product_out1.picking_id
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._in_progress_shipment_advice(shipment)
+        self._plan_records_in_shipment(shipment, picking)
+        self._load_records_in_shipment(shipment, picking)
+        self.assertIn(
+            "stock_move_shipment_advice_picking_index",
+            self._explain("stock.move", [("shipment_advice_id", "=", shipment.id)]),
+        )
+        self.assertIn(
+            "stock_move_line_shipment_advice_picking_index",
+            self._explain(
+                "stock.move.line",
+                [
+                    ("shipment_advice_id", "=", shipment.id),
+                    ("picking_id", "=", picking.id),
+                ],
+            ),
+        )
+        self.assertIn(
+            "stock_move_line_shipment_advice_package_level_index",
+            self._explain(
+                "stock.move.line",
+                [
+                    ("shipment_advice_id", "=", shipment.id),
+                    ("package_level_id", "=", package_level.id),
+                ],
+            ),
+        )
+        self.assertIn(
+            "stock_picking_planned_shipment_advice_index",
+            self._explain(
+                "stock.picking", [("planned_shipment_advice_id", "=", shipment.id)]
+            ),
+        )
@@ -1,8 +1,13 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
+import json
+from unittest.mock import patch
+
 from odoo.exceptions import UserError
 
+from odoo.addons.bus.models.bus import json_dump
+
 from .common import Common
 
 
@@ -130,3 +135,405 @@ class TestShipmentAdviceLoad(Common):
             self._load_records_in_shipment(
                 self.shipment_advice_out, package_level,
             )
+
+    def test_shipment_advice_load_picking_loading_status(self):
+        picking = self.move_product_out1.picking_id
+        self.assertFalse(picking.is_fully_loaded_in_shipment)
+        self.assertFalse(picking.is_partially_loaded_in_shipment)
+        self.assertFalse(picking.loaded_shipment_advice_ids)
+        # Load a package => the transfer is partially loaded
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self._load_records_in_shipment(self.shipment_advice_out, package_level)
+        self.assertFalse(picking.is_fully_loaded_in_shipment)
+        self.assertTrue(picking.is_partially_loaded_in_shipment)
+        self.assertEqual(picking.loaded_shipment_advice_ids, self.shipment_advice_out)
+        # Load the remaining content => the transfer is fully loaded
+        self._load_records_in_shipment(
+            self.shipment_advice_out, self.move_product_out1.move_line_ids
+        )
+        self.assertTrue(picking.is_fully_loaded_in_shipment)
+        self.assertFalse(picking.is_partially_loaded_in_shipment)
+        # Stored flags can be searched
+        self.assertIn(
+            picking,
+            self.env["stock.picking"].search(
+                [("is_fully_loaded_in_shipment", "=", True)]
+            ),
+        )
+
+    def test_shipment_advice_load_deliveries_by_carrier(self):
+        carrier = self.env.ref("delivery.free_delivery_carrier")
+        picking = self.move_product_out1.picking_id
+        picking.carrier_id = carrier
+        self._update_qty_in_location(
+            self.picking_type_out.default_location_src_id, self.product_out1, 30,
+        )
+        group2 = self.env["procurement.group"].create({})
+        move2 = self._create_move(self.picking_type_out, self.product_out1, 10, group2)
+        picking2 = move2.picking_id
+        picking2.carrier_id = carrier
+        # No shipping method on the shipment yet => nothing to load
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self.assertFalse(self.shipment_advice_out._find_deliveries_to_load())
+        # Load a first package: the shipment is now related to the carrier
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._load_records_in_shipment(self.shipment_advice_out, package_level)
+        self.assertEqual(self.shipment_advice_out.carrier_ids, carrier)
+        # Dry-run summary, the deliveries are searched once
+        shipment_class = type(self.shipment_advice_out)
+        find_deliveries = shipment_class._find_deliveries_to_load
+        with patch.object(
+            shipment_class,
+            "_find_deliveries_to_load",
+            autospec=True,
+            side_effect=find_deliveries,
+        ) as find_mock:
+            wiz = (
+                self.env["wizard.load.deliveries.shipment"]
+                .with_context(default_shipment_advice_id=self.shipment_advice_out.id)
+                .create({})
+            )
+            self.assertEqual(wiz.picking_ids, picking | picking2)
+            self.assertEqual(wiz.pickings_count, 2)
+            self.assertEqual(wiz.packages_count, 1)
+            self.assertEqual(wiz.move_lines_count, 2)
+            self.assertFalse(wiz.warning)
+        self.assertEqual(find_mock.call_count, 1)
+        # The preview weight is the one checked against the capacity
+        self.assertAlmostEqual(
+            wiz.weight, sum((picking | picking2).move_line_ids.mapped("weight"))
+        )
+        # A delivery no longer eligible at confirmation is not loaded
+        picking2.do_unreserve()
+        wiz.action_load()
+        self.assertEqual(self.shipment_advice_out.loaded_picking_ids, picking)
+        self.assertTrue(picking.is_fully_loaded_in_shipment)
+        self.assertFalse(picking2.move_line_ids)
+        self.assertIn(picking2.name, self.shipment_advice_out.message_ids[0].body)
+
+    def test_shipment_advice_load_many(self):
+        picking = self.move_product_out1.picking_id
+        self._plan_records_in_shipment(self.shipment_advice_out, picking)
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        shipment2 = self.env["shipment.advice"].create({"shipment_type": "outgoing"})
+        self._in_progress_shipment_advice(shipment2)
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        move_line = self.move_product_out1.move_line_ids
+        results = self.env["shipment.advice"].load_many(
+            [
+                {
+                    "shipment_advice_id": self.shipment_advice_out.id,
+                    "model": "stock.package_level",
+                    "res_id": package_level.id,
+                },
+                # Planned in another shipment
+                {
+                    "shipment_advice_id": shipment2.id,
+                    "model": "stock.move.line",
+                    "res_id": move_line.id,
+                },
+            ]
+        )
+        self.assertTrue(results[0]["success"])
+        self.assertFalse(results[1]["success"])
+        self.assertIn("planned", results[1]["error"])
+        self.assertEqual(self.shipment_advice_out.loaded_package_ids, self.package)
+        self.assertFalse(shipment2.loaded_move_line_ids)
+        self.assertFalse(move_line.qty_done)
+
+    def test_shipment_advice_load_many_access(self):
+        shipment = self.shipment_advice_out
+        self._in_progress_shipment_advice(shipment)
+        shipment2 = self.env["shipment.advice"].create({"shipment_type": "outgoing"})
+        self._in_progress_shipment_advice(shipment2)
+        group = self.env["res.groups"].create({"name": "Restricted shipments"})
+        self.env["ir.rule"].create(
+            {
+                "name": "Hide the shipment",
+                "model_id": self.env.ref("shipment_advice.model_shipment_advice").id,
+                "groups": [(6, 0, group.ids)],
+                "domain_force": "[('id', '!=', {})]".format(shipment2.id),
+            }
+        )
+        user = self.env["res.users"].create(
+            {
+                "name": "Restricted user",
+                "login": "shipment_advice_restricted_user",
+                "groups_id": [
+                    (6, 0, (group | self.env.ref("stock.group_stock_user")).ids)
+                ],
+            }
+        )
+        # A picking not reserved is not loaded
+        group2 = self.env["procurement.group"].create({})
+        product = self.env["product.product"].create(
+            {"name": "Out of stock", "type": "product"}
+        )
+        move2 = self._create_move(self.picking_type_out, product, 1, group2)
+        self.assertEqual(move2.picking_id.state, "confirmed")
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        results = (
+            self.env["shipment.advice"]
+            .with_user(user)
+            .load_many(
+                [
+                    {
+                        "shipment_advice_id": shipment.id,
+                        "model": "stock.picking",
+                        "res_id": move2.picking_id.id,
+                    },
+                    # Shipment the user cannot modify
+                    {
+                        "shipment_advice_id": shipment2.id,
+                        "model": "stock.package_level",
+                        "res_id": package_level.id,
+                    },
+                ]
+            )
+        )
+        self.assertFalse(results[0]["success"])
+        self.assertIn("not eligible", results[0]["error"])
+        self.assertFalse(results[1]["success"])
+        self.assertIn("not found", results[1]["error"])
+        self.assertFalse(shipment2.loaded_package_ids)
+
+    def test_shipment_advice_load_many_deleted_record(self):
+        shipment = self.shipment_advice_out
+        self._in_progress_shipment_advice(shipment)
+        deleted = self.move_product_out1.picking_id.copy()
+        deleted.unlink()
+        results = self.env["shipment.advice"].load_many(
+            [
+                {
+                    "shipment_advice_id": shipment.id,
+                    "model": "stock.picking",
+                    "res_id": deleted.id,
+                }
+            ]
+        )
+        self.assertFalse(results[0]["success"])
+        self.assertIn(str(deleted.id), results[0]["error"])
+        # A deleted record is reported as an error, not raised
+        error = shipment._run_in_savepoint(deleted._load_in_shipment, shipment)
+        self.assertTrue(error)
+
+    def test_shipment_advice_load_notify_progress(self):
+        shipment = self.shipment_advice_out
+        self._in_progress_shipment_advice(shipment)
+        channel = shipment._get_bus_channel()
+        bus_model = self.env["bus.bus"]
+        bus_model.search([]).unlink()
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._load_records_in_shipment(self.shipment_advice_out, package_level)
+        self.assertEqual(channel, (self.env.cr.dbname, "shipment.advice", shipment.id))
+        notifications = bus_model.search([("channel", "=", json_dump(channel))])
+        self.assertEqual(len(notifications), 1)
+        message = json.loads(notifications.message)
+        self.assertEqual(message["event"], "load")
+        self.assertEqual(message["packages"], 1)
+        self.assertEqual(message["move_lines"], 0)
+        progress = self.shipment_advice_out.get_loading_progress()
+        self.assertEqual(progress["packages"], 1)
+        self.assertEqual(progress["channel"], channel)
+        self.assertEqual(progress["weight"], shipment.loaded_weight)
+        # The delta is included in the totals of its content version
+        self.assertLessEqual(message["content_version"], progress["content_version"])
+        # Unloading publishes the opposite delta
+        package_level._unload_from_shipment()
+        notifications = bus_model.search(
+            [("channel", "=", json_dump(channel))], order="id DESC", limit=1
+        )
+        message = json.loads(notifications.message)
+        self.assertEqual(message["event"], "unload")
+        self.assertGreater(message["content_version"], progress["content_version"])
+        self.assertEqual(message["packages"], -1)
+
+    def test_shipment_advice_bus_channel_access(self):
+        shipment = self.shipment_advice_out
+        shipment_model = self.env["shipment.advice"]
+        self.assertEqual(
+            shipment_model._get_readable_bus_channels([shipment.id, "1", -1]),
+            [shipment._get_bus_channel()],
+        )
+        portal_user = self.env.ref("base.demo_user0")
+        self.assertFalse(
+            shipment_model.with_user(portal_user)._get_readable_bus_channels(
+                [shipment.id]
+            )
+        )
+
+    def test_shipment_advice_load_capacity(self):
+        self.product_out1.volume = 0.1
+        self.dock.max_volume = 1.5
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        move_line = self.move_product_out1.move_line_ids
+        # 20 units of 0.1 m³ do not fit
+        with self.assertRaisesRegex(UserError, "volume would be exceeded"):
+            self._load_records_in_shipment(self.shipment_advice_out, move_line)
+        self.dock.max_volume = 0
+        self.shipment_advice_out.max_volume = 2
+        self._load_records_in_shipment(self.shipment_advice_out, move_line)
+        self.assertAlmostEqual(self.shipment_advice_out.loaded_volume, 2.0)
+        # Loading the same content again does not change the running totals
+        self._load_records_in_shipment(self.shipment_advice_out, move_line)
+        self.assertAlmostEqual(self.shipment_advice_out.loaded_volume, 2.0)
+        self._unload_records_from_shipment(self.shipment_advice_out, move_line)
+        self.assertAlmostEqual(self.shipment_advice_out.loaded_volume, 0.0)
+
+    def test_shipment_advice_load_weight(self):
+        self.product_out1.weight = 2.0
+        self.product_out2.weight = 1.0
+        self.product_out3.weight = 3.0
+        self.package.shipping_weight = 60.0
+        move_line = self.move_product_out1.move_line_ids
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self._load_records_in_shipment(self.shipment_advice_out, move_line)
+        self._load_records_in_shipment(self.shipment_advice_out, package_level)
+        # Bulk line: 20 units of 2 kg
+        self.assertAlmostEqual(move_line.weight, 40.0)
+        # Package lines share the shipping weight of the package (10 + 30 kg)
+        self.assertAlmostEqual(self.move_product_out2.move_line_ids.weight, 15.0)
+        self.assertAlmostEqual(self.move_product_out3.move_line_ids.weight, 45.0)
+        self.assertAlmostEqual(self.shipment_advice_out.total_load, 100.0)
+        self.assertAlmostEqual(self.shipment_advice_out.loaded_weight, 100.0)
+
+    def test_shipment_advice_load_weight_changed(self):
+        self.product_out2.weight = 1.0
+        self.product_out3.weight = 3.0
+        self.product_out2.volume = self.product_out3.volume = 0.1
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        shipment = self.shipment_advice_out
+        self._in_progress_shipment_advice(shipment)
+        # Loading applies the totals of the loaded lines, without computing
+        # the totals of the whole shipment again
+        shipment_class = type(shipment)
+        with patch.object(
+            shipment_class,
+            "_refresh_loaded_totals",
+            autospec=True,
+            side_effect=shipment_class._refresh_loaded_totals,
+        ) as refresh_mock:
+            self._load_records_in_shipment(shipment, package_level)
+            # A quantity change only applies the change of its weight
+            self.move_product_out2.move_line_ids.qty_done = 5.0
+            self.assertAlmostEqual(shipment.loaded_weight, 35.0)
+            self.move_product_out2.move_line_ids.qty_done = 10.0
+        self.assertFalse(refresh_mock.called)
+        self.assertAlmostEqual(shipment.loaded_weight, 40.0)
+        self.assertAlmostEqual(shipment.loaded_volume, 2.0)
+        # Same totals as the full computation
+        shipment._refresh_loaded_totals()
+        self.assertAlmostEqual(shipment.loaded_weight, 40.0)
+        self.assertAlmostEqual(shipment.loaded_volume, 2.0)
+        # The pallet is weighed once loaded
+        self.package.shipping_weight = 55.0
+        self.assertAlmostEqual(shipment.loaded_weight, 55.0)
+        # The shares of the lines follow the quantity of the other lines
+        line2 = self.move_product_out2.move_line_ids
+        line3 = self.move_product_out3.move_line_ids
+        self.assertAlmostEqual(line3.weight, 55.0 * 30.0 / 40.0)
+        line2.qty_done = 30.0
+        self.assertAlmostEqual(line3.weight, 55.0 * 30.0 / 60.0)
+        self.assertAlmostEqual(line2.weight + line3.weight, 55.0)
+        self.assertAlmostEqual(shipment.loaded_weight, 55.0)
+        line2.qty_done = 10.0
+        self._unload_records_from_shipment(shipment, package_level)
+        self.assertAlmostEqual(shipment.loaded_weight, 0.0)
+        self.assertAlmostEqual(shipment.loaded_volume, 0.0)
+
+    def test_shipment_advice_simulate_load(self):
+        self.product_out1.weight = 2.0
+        self.package.shipping_weight = 60.0
+        shipment = self.shipment_advice_out
+        shipment.max_payload = 50.0
+        picking = self.move_product_out1.picking_id
+        move_line = self.move_product_out1.move_line_ids
+        self._in_progress_shipment_advice(shipment)
+        result = shipment.simulate_load(picking)
+        self.assertFalse(result["loadable"])
+        self.assertRegex(result["conflicts"][0], "payload would be exceeded")
+        self.assertEqual(result["pickings"], 1)
+        self.assertEqual(result["packages"], 1)
+        self.assertEqual(result["move_lines"], 1)
+        self.assertAlmostEqual(result["weight"], 100.0)
+        self.assertAlmostEqual(result["payload_usage"], 2.0)
+        # Nothing has been loaded
+        self.assertFalse(picking.move_line_ids.shipment_advice_id)
+        self.assertFalse(shipment.loaded_weight)
+        result = shipment.simulate_load(move_line)
+        self.assertTrue(result["loadable"])
+        self.assertAlmostEqual(result["payload_usage"], 0.8)
+        # Same rules as the loading
+        result = shipment.simulate_load(self.move_product_out2.move_line_ids)
+        self.assertRegex(result["conflicts"][0], "whole package content")
+        self._load_records_in_shipment(shipment, move_line)
+        result = shipment.simulate_load(move_line)
+        self.assertTrue(result["loadable"])
+        self.assertEqual(result["move_lines"], 1)
+        self.assertAlmostEqual(result["weight"], 40.0)
+
+    def test_shipment_advice_dock_report(self):
+        self.product_out1.weight = 2.0
+        move_line = self.move_product_out1.move_line_ids
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self._load_records_in_shipment(self.shipment_advice_out, move_line)
+        self._load_records_in_shipment(self.shipment_advice_out, package_level)
+        self.env["base"].flush()
+        report_model = self.env["shipment.advice.dock.report"]
+        row = report_model.search(
+            [("shipment_advice_id", "=", self.shipment_advice_out.id)]
+        )
+        self.assertEqual(row.dock_id, self.dock)
+        self.assertEqual(row.truck_count, 1)
+        self.assertEqual(row.package_count, 1)
+        self.assertEqual(row.move_line_count, 3)
+        self.assertAlmostEqual(row.loaded_weight, 40.0)
+        # Materialized view, refreshed on demand
+        self.env["ir.config_parameter"].set_param(
+            "shipment_advice.dock_report_materialized", "1"
+        )
+        report_model.init()
+        self._unload_records_from_shipment(self.shipment_advice_out, package_level)
+        report_model.invalidate_cache()
+        self.assertEqual(row.package_count, 1)
+        report_model._refresh_materialized_view()
+        report_model.invalidate_cache()
+        self.assertEqual(row.package_count, 0)
+
+    def test_shipment_advice_load_wizard_selection(self):
+        picking = self.move_product_out1.picking_id
+        self._in_progress_shipment_advice(self.shipment_advice_in)
+        wiz = (
+            self.env["wizard.load.shipment"]
+            .with_context(active_model=picking._name, active_ids=picking.ids)
+            .create({"shipment_advice_id": self.shipment_advice_in.id})
+        )
+        self.assertEqual(wiz.res_model, "stock.picking")
+        self.assertEqual(wiz.picking_ids, picking)
+        self.assertEqual(wiz.selection_count, 1)
+        self.assertIn(picking.picking_type_id.name, wiz.selection_summary)
+        self.assertIn("Excluded", wiz.selection_summary)
+        # Deliveries are filtered out on confirmation for an incoming shipment
+        wiz.action_load()
+        self.assertFalse(self.shipment_advice_in.loaded_picking_ids)
+        self.assertFalse(picking.move_line_ids.shipment_advice_id)
+
+    def test_shipment_advice_load_wizard_selection_deleted(self):
+        picking = self.move_product_out1.picking_id
+        picking_deleted = picking.copy()
+        wiz = self.env["wizard.load.shipment"].new(
+            dict(
+                self.env["wizard.load.shipment"]._prepare_selection_values(
+                    picking | picking_deleted
+                ),
+                shipment_advice_id=self.shipment_advice_out.id,
+            )
+        )
+        picking_deleted.unlink()
+        # Deleted records are neither counted nor processed
+        self.assertEqual(wiz.selection_count, 1)
+        self.assertEqual(wiz._get_selection(), picking)
+        self.assertEqual(wiz._get_selection_to_process(), picking)
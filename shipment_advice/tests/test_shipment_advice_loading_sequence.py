@@ -0,0 +1,61 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from datetime import timedelta
+
+from odoo import fields
+
+from ..utils import distance_matrix, optimize_route
+from .common import Common
+
+
+class TestShipmentAdviceLoadingSequence(Common):
+    def test_optimize_route(self):
+        # Points on a line, given in a shuffled order
+        coords = [(0.0, 0.0), (0.0, 3.0), (0.0, 1.0), (0.0, 4.0), (0.0, 2.0)]
+        route = optimize_route(coords)
+        self.assertEqual(route, [0, 2, 4, 1, 3])
+        matrix = distance_matrix(coords)
+        self.assertAlmostEqual(matrix[0][2], matrix[2][0])
+        self.assertEqual(optimize_route(coords[:2]), [0, 1])
+        self.assertEqual(optimize_route([]), [])
+
+    def test_shipment_advice_loading_sequence(self):
+        picking = self.move_product_out1.picking_id
+        partner = self.env["res.partner"].create({"name": "Stop"})
+        picking.partner_id = partner
+        self._plan_records_in_shipment(self.shipment_advice_out, picking.move_lines)
+        stops = self.shipment_advice_out._get_loading_stops()
+        self.assertEqual(list(stops), [partner])
+        self.assertEqual(stops[partner], picking)
+        self.shipment_advice_out.action_compute_loading_sequence()
+        self.assertEqual(picking.loading_sequence, 1)
+        # Without coordinates, stops are delivered by scheduled date
+        route = self.shipment_advice_out._get_delivery_route(stops)
+        self.assertEqual(route, [partner])
+
+    def test_shipment_advice_loading_sequence_stops(self):
+        now = fields.Datetime.now()
+        pickings = self.env["stock.picking"].browse()
+        for day in range(3):
+            # Transfers with bulk content only, one stop each
+            move = self._create_move(
+                self.picking_type_out,
+                self.product_in,
+                1,
+                self.env["procurement.group"].create({}),
+            )
+            picking = move.picking_id
+            picking.partner_id = self.env["res.partner"].create(
+                {"name": "Stop {}".format(day)}
+            )
+            picking.scheduled_date = now + timedelta(days=day)
+            pickings |= picking
+        self.assertFalse(pickings.package_level_ids)
+        self._plan_records_in_shipment(self.shipment_advice_out, pickings)
+        stops = self.shipment_advice_out._get_loading_stops()
+        route = self.shipment_advice_out._get_delivery_route(stops)
+        self.assertEqual(route, [picking.partner_id for picking in pickings])
+        self.shipment_advice_out.action_compute_loading_sequence()
+        # The last delivered stop is loaded first
+        self.assertEqual(pickings.mapped("loading_sequence"), [3, 2, 1])
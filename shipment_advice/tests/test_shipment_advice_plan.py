@@ -1,6 +1,10 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
+from datetime import datetime, timedelta
+
+from odoo import fields
+
 from .common import Common
 
 
@@ -30,3 +34,138 @@ class TestShipmentAdvicePlan(Common):
             wiz.shipment_advice_id.planned_move_ids, self.move_product_out1
         )
         self.assertEqual(wiz.shipment_advice_id.planned_moves_count, 1)
+
+    def test_shipment_advice_plan_many(self):
+        picking = self.move_product_out1.picking_id
+        picking_in = self.move_product_in1.picking_id
+        results = self.env["shipment.advice"].plan_many(
+            [
+                {
+                    "shipment_advice_id": self.shipment_advice_out.id,
+                    "model": "stock.picking",
+                    "res_id": picking.id,
+                },
+                # Wrong shipment type
+                {
+                    "shipment_advice_id": self.shipment_advice_out.id,
+                    "model": "stock.move",
+                    "res_id": self.move_product_in1.id,
+                },
+                {
+                    "shipment_advice_id": self.shipment_advice_in.id,
+                    "model": "stock.picking",
+                    "res_id": picking_in.id,
+                },
+                # Unsupported model
+                {
+                    "shipment_advice_id": self.shipment_advice_in.id,
+                    "model": "stock.move.line",
+                    "res_id": self.move_product_in1.move_line_ids.id,
+                },
+            ]
+        )
+        self.assertEqual(
+            [res["success"] for res in results], [True, False, True, False]
+        )
+        self.assertTrue(results[1]["error"])
+        self.assertTrue(results[3]["error"])
+        self.assertEqual(self.shipment_advice_out.planned_picking_ids, picking)
+        self.assertEqual(self.shipment_advice_in.planned_picking_ids, picking_in)
+
+    def test_shipment_advice_unplan_move_exclusion(self):
+        picking = self.move_product_out1.picking_id
+        self._plan_records_in_shipment(self.shipment_advice_out, picking)
+        moves = self.move_product_out1 | self.move_product_out2 | self.move_product_in1
+        wiz = (
+            self.env["wizard.unplan.shipment"]
+            .with_context(active_model="stock.move", active_ids=moves.ids)
+            .create({})
+        )
+        # A move sharing its package with other moves is not unplanned alone
+        self.assertEqual(wiz.move_ids, self.move_product_out1)
+        self.assertIn("Linked to other moves through a package", wiz.warning)
+        self.assertIn("Not planned in a shipment", wiz.warning)
+        wiz.action_unplan()
+        self.assertFalse(self.move_product_out1.shipment_advice_id)
+        self.assertEqual(
+            self.move_product_out2.shipment_advice_id, self.shipment_advice_out
+        )
+
+    def test_shipment_advice_content_changes(self):
+        shipment = self.shipment_advice_out
+        self.assertEqual(shipment.content_version, 0)
+        picking = self.move_product_out1.picking_id
+        self._plan_records_in_shipment(shipment, picking)
+        version = shipment.content_version
+        self.assertEqual(version, 1)
+        changes = shipment.get_content_changes()
+        self.assertTrue(changes["full"])
+        self.assertEqual(len(changes["stock.move"]["updated"]), 3)
+        # Unplan a move: only this change is returned
+        self.move_product_out1._unplan_from_shipment()
+        changes = shipment.get_content_changes(since_version=version)
+        self.assertFalse(changes["full"])
+        self.assertEqual(changes["version"], 2)
+        self.assertFalse(changes["stock.move"]["updated"])
+        self.assertEqual(changes["stock.move"]["removed"], self.move_product_out1.ids)
+        # Load the package: loaded lines and package level are returned
+        self._in_progress_shipment_advice(shipment)
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._load_records_in_shipment(shipment, package_level)
+        changes = shipment.get_content_changes(since_version=2)
+        self.assertEqual(changes["version"], 3)
+        self.assertEqual(
+            {data["id"] for data in changes["stock.move.line"]["updated"]},
+            set(package_level.move_line_ids.ids),
+        )
+        self.assertEqual(
+            [data["id"] for data in changes["stock.package_level"]["updated"]],
+            package_level.ids,
+        )
+
+    def test_shipment_advice_plan_cross_dock(self):
+        product = self.env["product.product"].create(
+            {"name": "Cross-docked product", "type": "product"}
+        )
+        move_in = self._create_move(self.picking_type_in, product, 5)
+        move_out1 = self._create_move(self.picking_type_out, product, 3)
+        move_out2 = self._create_move(self.picking_type_out, product, 4)
+        self.assertEqual(move_out1.state, "confirmed")
+        shipment_in = self.shipment_advice_in
+        self._plan_records_in_shipment(shipment_in, move_in.picking_id)
+        self._confirm_shipment_advice(shipment_in)
+        wiz = (
+            self.env["wizard.cross.dock.shipment"]
+            .with_context(tz="UTC")
+            .create(
+                {
+                    "warehouse_id": shipment_in.warehouse_id.id,
+                    "date": shipment_in.arrival_date.date(),
+                }
+            )
+        )
+        # Only the first delivery can be fully covered by the receipt
+        self.assertEqual(wiz.incoming_shipments_count, 1)
+        self.assertEqual(wiz.moves_count, 1)
+        self.assertEqual(wiz.partial_moves_count, 1)
+        action = wiz.action_plan()
+        shipment_out = self.env["shipment.advice"].search(action["domain"])
+        self.assertEqual(shipment_out.shipment_type, "outgoing")
+        self.assertEqual(shipment_out.arrival_date, shipment_in.arrival_date)
+        self.assertEqual(shipment_out.planned_move_ids, move_out1)
+        self.assertFalse(move_out2.shipment_advice_id)
+
+    def test_shipment_advice_cross_dock_day_bounds(self):
+        warehouse = self.shipment_advice_in.warehouse_id
+        shipment_model = self.env["shipment.advice"].with_context(tz="Europe/Brussels")
+        # The day starts at midnight in the timezone of the user
+        date_from, date_to = shipment_model._get_day_bounds(
+            warehouse, fields.Date.to_date("2021-06-01")
+        )
+        self.assertEqual(date_from, datetime(2021, 5, 31, 22, 0))
+        self.assertEqual(date_to, datetime(2021, 6, 1, 22, 0))
+        # Day of the switch to winter time
+        date_from, date_to = shipment_model._get_day_bounds(
+            warehouse, fields.Date.to_date("2021-10-31")
+        )
+        self.assertEqual(date_to - date_from, timedelta(hours=25))
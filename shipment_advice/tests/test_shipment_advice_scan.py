@@ -0,0 +1,168 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo.exceptions import UserError
+
+from .common import Common
+
+
+class TestShipmentAdviceScan(Common):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.scan_model = cls.env["shipment.advice.scan"]
+
+    def _scan(self, key, operation, records):
+        return {
+            "key": key,
+            "operation": operation,
+            "shipment_advice_id": self.shipment_advice_out.id,
+            "model": records._name,
+            "res_id": records.id,
+        }
+
+    def test_scan_ingest_duplicate(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        scan = self._scan("DEVICE1-0001", "load", package_level)
+        results = self.scan_model.ingest([scan])
+        self.assertEqual(
+            results, [{"success": True, "error": False, "duplicate": False}]
+        )
+        self.assertEqual(self.shipment_advice_out.loaded_package_ids, self.package)
+        # The package is unloaded, a retry of the scan is not applied again
+        package_level._unload_from_shipment()
+        results = self.scan_model.ingest([scan])
+        self.assertTrue(results[0]["duplicate"])
+        self.assertTrue(results[0]["success"])
+        self.assertFalse(self.shipment_advice_out.loaded_package_ids)
+
+    def test_scan_ingest_offline_queue(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        move_line = self.move_product_out1.move_line_ids
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        results = self.scan_model.ingest(
+            [
+                self._scan("DEVICE1-0001", "load", move_line),
+                self._scan("DEVICE1-0002", "load", package_level),
+                self._scan("DEVICE1-0002", "load", package_level),
+                self._scan("DEVICE1-0003", "unload", move_line),
+                self._scan(False, "load", move_line),
+            ]
+        )
+        self.assertEqual(
+            [res["success"] for res in results], [True, True, True, True, False]
+        )
+        self.assertEqual(
+            [res["duplicate"] for res in results], [False, False, True, False, False]
+        )
+        # Scans have been applied in order
+        self.assertFalse(move_line.shipment_advice_id)
+        self.assertEqual(self.shipment_advice_out.loaded_package_ids, self.package)
+        self.assertEqual(self.scan_model.search_count([("key", "like", "DEVICE1-")]), 3)
+
+    def test_scan_ingest_event_log(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        move_line = self.move_product_out1.move_line_ids
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        scans = [
+            self._scan("DEVICE1-0001", "load", move_line),
+            self._scan("DEVICE2-0001", "load", package_level),
+        ]
+        scans[0]["device"] = "DEVICE1"
+        scans[1]["device"] = "DEVICE2"
+        self.scan_model.ingest(scans)
+        events = self.env["shipment.advice.event"].search(
+            [
+                ("shipment_advice_id", "=", self.shipment_advice_out.id),
+                ("event", "=", "load"),
+            ]
+        )
+        self.assertEqual(set(events.mapped("device")), {"DEVICE1", "DEVICE2"})
+        self.assertEqual(events.user_id, self.env.user)
+        self.assertTrue(all(events.mapped("date")))
+        with self.assertRaises(UserError):
+            events.write({"device": "DEVICE3"})
+        # Throughput report
+        self.env["shipment.advice.event"].flush()
+        report = self.env["shipment.advice.throughput.report"].search(
+            [("dock_id", "=", self.dock.id), ("device", "=", "DEVICE2")]
+        )
+        self.assertEqual(report.user_id, self.env.user)
+        self.assertEqual(report.loaded_package_count, 1)
+        self.assertEqual(
+            report.loaded_move_line_count, len(package_level.move_line_ids)
+        )
+
+    def test_scan_ingest_claimed_key(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        # The key has been claimed by another upload
+        self.scan_model.create(
+            {"key": "DEVICE1-0001", "operation": "load", "success": True}
+        )
+        scan = self._scan("DEVICE1-0001", "load", package_level)
+        vals = self.scan_model._prepare_scan_values(
+            scan, {self.shipment_advice_out.id: self.shipment_advice_out}
+        )
+        self.assertFalse(self.scan_model._claim_keys([vals]))
+        results = self.scan_model.ingest([scan])
+        self.assertTrue(results[0]["duplicate"])
+        self.assertFalse(self.shipment_advice_out.loaded_package_ids)
+        # A new key is claimed before the scan is applied, then gets its result
+        scan = self._scan("DEVICE1-0002", "load", package_level)
+        results = self.scan_model.ingest([scan])
+        self.assertFalse(results[0]["duplicate"])
+        record = self.scan_model.search([("key", "=", "DEVICE1-0002")])
+        self.assertTrue(record.success)
+        self.assertEqual(record.shipment_advice_id, self.shipment_advice_out)
+        self.assertEqual(record.company_id, self.shipment_advice_out.company_id)
+        self.assertEqual(self.shipment_advice_out.loaded_package_ids, self.package)
+
+    def test_scan_ingest_key_other_company(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        company2 = self.env["res.company"].create({"name": "Company 2"})
+        # The same key has been used by a device of another company
+        self.scan_model.create(
+            {
+                "key": "DEVICE1-0001",
+                "operation": "load",
+                "company_id": company2.id,
+                "success": True,
+            }
+        )
+        scan = self._scan("DEVICE1-0001", "load", package_level)
+        results = self.scan_model.ingest([scan])
+        self.assertEqual(
+            results, [{"success": True, "error": False, "duplicate": False}]
+        )
+        self.assertEqual(self.shipment_advice_out.loaded_package_ids, self.package)
+        self.assertEqual(
+            self.scan_model.search([("key", "=", "DEVICE1-0001")]).company_id,
+            company2 | self.shipment_advice_out.company_id,
+        )
+
+    def test_scan_gc_expired_keys(self):
+        company2 = self.env["res.company"].create(
+            {"name": "Company 2", "shipment_advice_scan_dedup_window": 48}
+        )
+        self.env.company.shipment_advice_scan_dedup_window = 1
+        scans = self.scan_model.create(
+            [
+                {"key": "DEVICE1-0001", "operation": "load"},
+                {"key": "DEVICE2-0001", "operation": "load", "company_id": company2.id},
+            ]
+        )
+        scans.flush()
+        self.env.cr.execute(
+            """
+            UPDATE shipment_advice_scan
+            SET create_date = create_date - interval '2 hours'
+            WHERE id IN %s
+            """,
+            (tuple(scans.ids),),
+        )
+        self.scan_model._gc_expired_keys()
+        # Scans without shipment follow the window of their own company
+        self.assertEqual(scans.exists().mapped("key"), ["DEVICE2-0001"])
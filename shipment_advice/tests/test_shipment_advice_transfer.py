@@ -0,0 +1,98 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo.exceptions import UserError
+
+from .common import Common
+
+
+class TestShipmentAdviceTransfer(Common):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.shipment_advice_out2 = cls.env["shipment.advice"].create(
+            {"shipment_type": "outgoing"}
+        )
+
+    def test_shipment_advice_transfer_package_level(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self._in_progress_shipment_advice(self.shipment_advice_out2)
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        self._load_records_in_shipment(self.shipment_advice_out, package_level)
+        wiz = self._transfer_records_to_shipment(
+            self.shipment_advice_out2, package_level
+        )
+        self.assertEqual(wiz.res_model, "stock.package_level")
+        self.assertEqual(wiz.selection_count, 1)
+        self.assertEqual(wiz.package_level_ids, package_level)
+        self.assertFalse(self.shipment_advice_out.loaded_package_ids)
+        self.assertEqual(
+            self.shipment_advice_out2.loaded_package_ids, package_level.package_id
+        )
+        # Quantities and package level status are kept
+        self.assertTrue(package_level.is_done)
+        self.assertEqual(self.move_product_out2.move_line_ids.qty_done, 10)
+        self.assertEqual(self.move_product_out3.move_line_ids.qty_done, 10)
+
+    def test_shipment_advice_transfer_picking_planned(self):
+        picking = self.move_product_out1.picking_id
+        self._plan_records_in_shipment(self.shipment_advice_out, picking)
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self._in_progress_shipment_advice(self.shipment_advice_out2)
+        self._load_records_in_shipment(self.shipment_advice_out, picking)
+        self._transfer_records_to_shipment(self.shipment_advice_out2, picking)
+        self.assertFalse(self.shipment_advice_out.loaded_move_line_ids)
+        self.assertEqual(
+            self.shipment_advice_out2.loaded_move_line_ids, picking.move_line_ids
+        )
+        # The plan follows the loaded content
+        self.assertFalse(self.shipment_advice_out.planned_move_ids)
+        self.assertEqual(self.shipment_advice_out2.planned_move_ids, picking.move_lines)
+        self.assertTrue(picking.is_fully_loaded_in_shipment)
+        self.assertEqual(self.move_product_out1.move_line_ids.qty_done, 20)
+
+    def test_shipment_advice_transfer_split_move(self):
+        product = self.env["product.product"].create(
+            {"name": "Split product", "type": "product"}
+        )
+        location = self.picking_type_out.default_location_src_id
+        packages = self.env["stock.quant.package"].create(
+            [{"name": "PKG_SPLIT1"}, {"name": "PKG_SPLIT2"}]
+        )
+        for package in packages:
+            self._update_qty_in_location(location, product, 5, package=package)
+        move = self._create_move(
+            self.picking_type_out,
+            product,
+            10,
+            self.env["procurement.group"].create({}),
+        )
+        package_levels = move.move_line_ids.package_level_id
+        self.assertEqual(len(package_levels), 2)
+        self._plan_records_in_shipment(self.shipment_advice_out, move)
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        self._in_progress_shipment_advice(self.shipment_advice_out2)
+        self._load_records_in_shipment(self.shipment_advice_out, package_levels)
+        # The move planned in the source shipment is split over two packages
+        with self.assertRaisesRegex(UserError, "only a part"):
+            package_levels[0]._transfer_to_shipment(self.shipment_advice_out2)
+        self.assertEqual(move.shipment_advice_id, self.shipment_advice_out)
+        # Transferring all its loaded lines moves the plan too
+        package_levels._transfer_to_shipment(self.shipment_advice_out2)
+        self.assertEqual(move.shipment_advice_id, self.shipment_advice_out2)
+        self.assertEqual(
+            self.shipment_advice_out2.loaded_move_line_ids, move.move_line_ids
+        )
+
+    def test_shipment_advice_transfer_not_loaded(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out2)
+        move_line = self.move_product_out1.move_line_ids
+        with self.assertRaisesRegex(UserError, "not loaded"):
+            move_line._transfer_to_shipment(self.shipment_advice_out2)
+
+    def test_shipment_advice_transfer_not_started(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        move_line = self.move_product_out1.move_line_ids
+        self._load_records_in_shipment(self.shipment_advice_out, move_line)
+        with self.assertRaisesRegex(UserError, "not started"):
+            move_line._transfer_to_shipment(self.shipment_advice_out2)
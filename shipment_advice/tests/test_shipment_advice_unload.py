@@ -54,3 +54,55 @@ class TestShipmentAdviceUnload(Common):
         self.assertFalse(self.move_product_out2.move_line_ids.qty_done)
         self.assertFalse(self.move_product_out3.move_line_ids.qty_done)
         self.assertFalse(self.shipment_advice_out.loaded_package_ids)
+
+    def test_shipment_advice_unload_many(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        picking = self.move_product_out1.picking_id
+        self._load_records_in_shipment(self.shipment_advice_out, picking)
+        move_line = self.move_product_out1.move_line_ids
+        package_level = self.move_product_out2.move_line_ids.package_level_id
+        results = self.env["shipment.advice"].unload_many(
+            [
+                {
+                    "shipment_advice_id": self.shipment_advice_out.id,
+                    "model": "stock.move.line",
+                    "res_id": move_line.id,
+                },
+                # Not loaded in this shipment
+                {
+                    "shipment_advice_id": self.shipment_advice_in.id,
+                    "model": "stock.package_level",
+                    "res_id": package_level.id,
+                },
+            ]
+        )
+        self.assertTrue(results[0]["success"])
+        self.assertFalse(results[1]["success"])
+        self.assertFalse(move_line.qty_done)
+        self.assertEqual(self.shipment_advice_out.loaded_package_ids, self.package)
+
+    def test_shipment_advice_unload_exclusion_warning(self):
+        self._in_progress_shipment_advice(self.shipment_advice_out)
+        picking = self.move_product_out1.picking_id
+        receipt = self.move_product_in1.picking_id
+        self._load_records_in_shipment(self.shipment_advice_out, picking)
+        wiz = (
+            self.env["wizard.unload.shipment"]
+            .with_context(
+                active_model="stock.picking", active_ids=(picking | receipt).ids
+            )
+            .create({})
+        )
+        self.assertEqual(wiz.picking_ids, picking)
+        self.assertIn("Not a delivery: {}".format(receipt.name), wiz.warning)
+        self.assertNotIn(picking.name, wiz.warning)
+        # Lines of a shipment not in progress anymore
+        line = self.move_product_out1.move_line_ids
+        self.shipment_advice_out.action_cancel()
+        wiz = (
+            self.env["wizard.unload.shipment"]
+            .with_context(active_model="stock.move.line", active_ids=line.ids)
+            .create({})
+        )
+        self.assertFalse(wiz.move_line_ids)
+        self.assertIn("Loaded in a shipment not in progress", wiz.warning)
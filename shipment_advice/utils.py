@@ -0,0 +1,104 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+"""Helpers of the shipment advice module: route heuristics used to sequence
+the loading of multi-stop shipments and database index management.
+"""
+
+from math import asin, cos, radians, sin, sqrt
+
+from odoo.tools import sql
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_distance(coord1, coord2):
+    """Return the great-circle distance in km between two (lat, lon) points."""
+    lat1, lon1 = map(radians, coord1)
+    lat2, lon2 = map(radians, coord2)
+    a = (
+        sin((lat2 - lat1) / 2) ** 2
+        + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+
+
+def distance_matrix(coords):
+    """Return the matrix of the distances between all the given points."""
+    size = len(coords)
+    matrix = [[0.0] * size for __ in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            matrix[i][j] = matrix[j][i] = haversine_distance(coords[i], coords[j])
+    return matrix
+
+
+def nearest_neighbour_route(matrix, start=0):
+    """Return an open route visiting all the points, built by going each time
+    to the nearest point not visited yet.
+    """
+    route = [start]
+    to_visit = set(range(len(matrix))) - {start}
+    while to_visit:
+        last = route[-1]
+        nearest = min(to_visit, key=lambda point: (matrix[last][point], point))
+        route.append(nearest)
+        to_visit.remove(nearest)
+    return route
+
+
+def two_opt(route, matrix, max_passes=50):
+    """Improve an open route (the first point being fixed) by reversing the
+    segments of the route as long as it shortens it.
+    """
+    route = list(route)
+    size = len(route)
+    for __ in range(max_passes):
+        improved = False
+        for i in range(1, size - 1):
+            for j in range(i + 1, size):
+                a, b = route[i - 1], route[i]
+                c = route[j]
+                delta = matrix[a][c] - matrix[a][b]
+                if j + 1 < size:
+                    d = route[j + 1]
+                    delta += matrix[b][d] - matrix[c][d]
+                if delta < -1e-9:
+                    route[i : j + 1] = reversed(route[i : j + 1])
+                    improved = True
+        if not improved:
+            break
+    return route
+
+
+def optimize_route(coords):
+    """Return the indexes of the given points in visiting order, starting
+    from the first one, using nearest neighbour then 2-opt.
+    """
+    if len(coords) <= 2:
+        return list(range(len(coords)))
+    matrix = distance_matrix(coords)
+    return two_opt(nearest_neighbour_route(matrix), matrix)
+
+
+def create_index(cr, indexname, tablename, expressions, where=None, include=None):
+    """Create the index if it does not exist yet.
+
+    The index is partial if a ``where`` clause is given, and covering if
+    ``include`` columns are given (these columns are appended to the indexed
+    ones on PostgreSQL < 11, which doesn't support ``INCLUDE``).
+    """
+    if sql.index_exists(cr, indexname):
+        return
+    expressions = list(expressions)
+    include = list(include or [])
+    include_clause = ""
+    if include and cr._cnx.server_version >= 110000:
+        include_clause = " INCLUDE (%s)" % ", ".join(include)
+    else:
+        expressions += include
+    where_clause = " WHERE %s" % where if where else ""
+    cr.execute(
+        "CREATE INDEX {} ON {} ({}){}{}".format(
+            indexname, tablename, ", ".join(expressions), include_clause, where_clause,
+        )
+    )
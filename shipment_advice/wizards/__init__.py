@@ -1,4 +1,8 @@
+from . import shipment_selection_mixin
 from . import plan_shipment
 from . import unplan_shipment
 from . import load_shipment
 from . import unload_shipment
+from . import transfer_shipment
+from . import load_deliveries_shipment
+from . import cross_dock_shipment
@@ -0,0 +1,63 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import _, api, fields, models
+
+
+class WizardCrossDockShipment(models.TransientModel):
+    _name = "wizard.cross.dock.shipment"
+    _description = "Plan deliveries from incoming shipments"
+
+    def _default_warehouse_id(self):
+        return self.env["shipment.advice"]._default_warehouse_id()
+
+    warehouse_id = fields.Many2one(
+        comodel_name="stock.warehouse",
+        string="Warehouse",
+        required=True,
+        default=_default_warehouse_id,
+    )
+    date = fields.Date(
+        string="Arrival date", required=True, default=fields.Date.context_today
+    )
+    incoming_shipments_count = fields.Integer(
+        string="Incoming shipments", compute="_compute_matches"
+    )
+    moves_count = fields.Integer(
+        string="Delivery moves to plan", compute="_compute_matches"
+    )
+    partial_moves_count = fields.Integer(
+        string="Delivery moves partially covered", compute="_compute_matches"
+    )
+    warning = fields.Char(string="Warning", compute="_compute_matches")
+
+    @api.depends("warehouse_id", "date")
+    def _compute_matches(self):
+        shipment_model = self.env["shipment.advice"]
+        for wizard in self:
+            allocations, partial_ids = {}, []
+            if wizard.warehouse_id and wizard.date:
+                allocations, partial_ids = shipment_model._get_cross_dock_matches(
+                    wizard.warehouse_id, wizard.date
+                )
+            wizard.incoming_shipments_count = len(
+                {move_allocations[-1][0] for move_allocations in allocations.values()}
+            )
+            wizard.moves_count = len(allocations)
+            wizard.partial_moves_count = len(partial_ids)
+            wizard.warning = False
+            if not allocations:
+                wizard.warning = _(
+                    "No delivery waiting for goods can be covered by the "
+                    "incoming shipments arriving on this day."
+                )
+
+    def action_plan(self):
+        """Create the outgoing shipments and plan the covered deliveries."""
+        self.ensure_one()
+        shipments = self.env["shipment.advice"]._plan_cross_dock(
+            self.warehouse_id, self.date
+        )
+        action = self.env.ref("shipment_advice.shipment_advice_action").read()[0]
+        action["domain"] = [("id", "in", shipments.ids)]
+        return action
@@ -0,0 +1,107 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+
+class WizardLoadDeliveriesShipment(models.TransientModel):
+    _name = "wizard.load.deliveries.shipment"
+    _description = "Load all eligible deliveries in a shipment"
+
+    shipment_advice_id = fields.Many2one(
+        comodel_name="shipment.advice",
+        string="Shipment Advice",
+        required=True,
+        readonly=True,
+        domain=[("state", "in", ("confirmed", "in_progress"))],
+    )
+    picking_ids = fields.Many2many(
+        comodel_name="stock.picking", string="Transfers to load", readonly=True,
+    )
+    pickings_count = fields.Integer(
+        string="Transfers to load", compute="_compute_summary"
+    )
+    packages_count = fields.Integer(
+        string="Packages to load", compute="_compute_summary"
+    )
+    move_lines_count = fields.Integer(
+        string="Bulk lines to load", compute="_compute_summary"
+    )
+    weight = fields.Float(
+        string="Weight to load (kg)", digits=(16, 2), compute="_compute_summary"
+    )
+    warning = fields.Char(string="Warning", compute="_compute_summary")
+
+    @api.model
+    def default_get(self, fields_list):
+        """'default_get' method overloaded."""
+        res = super().default_get(fields_list)
+        shipment = self.env["shipment.advice"].browse(res.get("shipment_advice_id"))
+        if not shipment:
+            raise UserError(_("Please select a shipment to load deliveries in."))
+        if shipment.shipment_type != "outgoing" or shipment.state not in (
+            "confirmed",
+            "in_progress",
+        ):
+            raise UserError(
+                _(
+                    "Deliveries can only be loaded in a confirmed or started "
+                    "outgoing shipment."
+                )
+            )
+        if "picking_ids" in fields_list:
+            # Dry-run: the deliveries found are the ones loaded by the wizard
+            pickings = shipment._find_deliveries_to_load()
+            res["picking_ids"] = [(6, 0, pickings.ids)]
+        return res
+
+    @api.depends("shipment_advice_id", "picking_ids")
+    def _compute_summary(self):
+        """Give a summary of what is going to be loaded."""
+        for wiz in self:
+            pickings = wiz.picking_ids
+            wiz.pickings_count = len(pickings)
+            wiz.packages_count = len(pickings.package_level_ids)
+            wiz.move_lines_count = len(
+                pickings.move_line_ids - pickings.package_level_ids.move_line_ids
+            )
+            # Weight checked against the capacity of the shipment
+            wiz.weight = pickings.move_line_ids._get_shipment_loaded_weight()
+            wiz.warning = False
+            if not wiz.shipment_advice_id.carrier_ids:
+                wiz.warning = _(
+                    "No shipping method related to this shipment, load a first "
+                    "delivery to define it."
+                )
+            elif not pickings:
+                wiz.warning = _(
+                    "No delivery ready to load for the shipping methods "
+                    "of this shipment."
+                )
+
+    def action_load(self):
+        """Load the deliveries found when opening the wizard in the shipment.
+
+        Deliveries which are no longer eligible (e.g. done, unreserved or
+        loaded in another shipment meanwhile) are not loaded and listed on
+        the shipment.
+        """
+        self.ensure_one()
+        shipment = self.shipment_advice_id
+        pickings = self.picking_ids & shipment._find_deliveries_to_load()
+        dropped = self.picking_ids - pickings
+        if not pickings:
+            raise UserError(
+                _("None of the deliveries to load is still eligible: {}").format(
+                    ", ".join(dropped.mapped("name"))
+                )
+            )
+        shipment._load_deliveries(pickings)
+        if dropped:
+            shipment.message_post(
+                body=_("Deliveries no longer eligible, not loaded: {}").format(
+                    ", ".join(dropped.mapped("name"))
+                )
+            )
+        return True
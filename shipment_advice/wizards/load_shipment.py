@@ -7,16 +7,23 @@ from odoo.exceptions import UserError
 
 class WizardLoadInShipment(models.TransientModel):
     _name = "wizard.load.shipment"
+    _inherit = "wizard.shipment.selection.mixin"
     _description = "Load shipment"
 
     picking_ids = fields.Many2many(
-        comodel_name="stock.picking", string="Transfers to load",
+        comodel_name="stock.picking",
+        string="Transfers to load",
+        compute="_compute_selected_records",
     )
     move_line_ids = fields.Many2many(
-        comodel_name="stock.move.line", string="Products to load"
+        comodel_name="stock.move.line",
+        string="Products to load",
+        compute="_compute_selected_records",
     )
     package_level_ids = fields.Many2many(
-        comodel_name="stock.package_level", string="Packages to load"
+        comodel_name="stock.package_level",
+        string="Packages to load",
+        compute="_compute_selected_records",
     )
     shipment_advice_id = fields.Many2one(
         comodel_name="shipment.advice",
@@ -52,7 +59,7 @@ class WizardLoadInShipment(models.TransientModel):
         pickings_to_keep = pickings.filtered_domain(
             [("state", "=", "assigned"), ("picking_type_id.code", "=", "outgoing")]
         )
-        res["picking_ids"] = pickings_to_keep.ids
+        res.update(self._prepare_selection_values(pickings_to_keep))
         if not pickings_to_keep:
             res["warning"] = _(
                 "No transfer to load among selected ones (already done or "
@@ -89,7 +96,7 @@ class WizardLoadInShipment(models.TransientModel):
                 ("picking_id.picking_type_id.code", "=", "outgoing"),
             ]
         )
-        res["move_line_ids"] = lines_to_keep.ids
+        res.update(self._prepare_selection_values(lines_to_keep))
         if not lines_to_keep:
             res["warning"] = _(
                 "No product to load among selected ones (already done or "
@@ -115,7 +122,7 @@ class WizardLoadInShipment(models.TransientModel):
                 ("picking_type_code", "=", "outgoing"),
             ]
         )
-        res["package_level_ids"] = package_levels_to_keep.ids
+        res.update(self._prepare_selection_values(package_levels_to_keep))
         if not package_levels_to_keep:
             res["warning"] = _(
                 "No package to load among selected ones (already done or "
@@ -133,69 +140,19 @@ class WizardLoadInShipment(models.TransientModel):
         ).id
         return res
 
-    @api.onchange("shipment_advice_id")
-    def _onchange_shipment_advice_id(self):
-        if not self.shipment_advice_id:
-            return
-        # Transfers
-        pickings = self.picking_ids.filtered(
-            lambda o: o.picking_type_code == self.shipment_advice_id.shipment_type
-        )
-        res = {}
-        if self.picking_ids != pickings:
-            res.update(
-                warning={
-                    "title": _("Transfers updated"),
-                    "message": _(
-                        "Transfers to load have been updated "
-                        "to match the selected shipment type."
-                    ),
-                }
-            )
-        self.picking_ids = pickings
-        # Lines
-        lines = self.move_line_ids.filtered(
-            lambda o: o.picking_id.picking_type_code
-            == self.shipment_advice_id.shipment_type
-        )
-        res = {}
-        if self.move_line_ids != lines:
-            res.update(
-                warning={
-                    "title": _("Products updated"),
-                    "message": _(
-                        "Products to load have been updated "
-                        "to match the selected shipment type."
-                    ),
-                }
-            )
-        self.move_line_ids = lines
-        # Packages
-        package_levels = self.package_level_ids.filtered(
-            lambda o: o.picking_id.picking_type_code
-            == self.shipment_advice_id.shipment_type
-        )
-        res = {}
-        if self.package_level_ids != package_levels:
-            res.update(
-                warning={
-                    "title": _("Packages updated"),
-                    "message": _(
-                        "Packages to load have been updated "
-                        "to match the selected shipment type."
-                    ),
-                }
-            )
-        self.package_level_ids = package_levels
-        return res
+    def _get_selection_shipment_type(self):
+        return self.shipment_advice_id.shipment_type
+
+    @api.depends("res_model", "res_ids", "shipment_advice_id")
+    def _compute_selection_summary(self):
+        return super()._compute_selection_summary()
 
     def action_load(self):
         """Load the selected records in the selected shipment."""
         self.ensure_one()
-        # Load whole transfers / move lines / package levels
-        self.picking_ids._load_in_shipment(self.shipment_advice_id)
-        self.move_line_ids._load_in_shipment(self.shipment_advice_id)
-        self.package_level_ids._load_in_shipment(self.shipment_advice_id)
+        # Load whole transfers / move lines / package levels matching the
+        # shipment type
+        self._get_selection_to_process()._load_in_shipment(self.shipment_advice_id)
         # Update the shipment status if needed
         if self.shipment_advice_id.state == "confirmed":
             self.shipment_advice_id.action_in_progress()
@@ -0,0 +1,172 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+import json
+from collections import defaultdict
+
+from odoo import _, api, fields, models
+from odoo.tools import html_escape
+
+
+class WizardShipmentSelectionMixin(models.AbstractModel):
+    """Selection of records to process by a shipment wizard.
+
+    The selected records are kept as a list of IDs instead of relations, so
+    that big selections are not sent back and forth to the browser: the
+    wizard only displays the number of records by operation type.
+    """
+
+    _name = "wizard.shipment.selection.mixin"
+    _description = "Records selected in a shipment wizard"
+
+    # Selection models and their related wizard fields
+    _selection_fields = {
+        "stock.picking": "picking_ids",
+        "stock.move.line": "move_line_ids",
+        "stock.package_level": "package_level_ids",
+    }
+
+    res_model = fields.Char(string="Model", readonly=True)
+    res_ids = fields.Text(string="Record IDs", readonly=True)
+    selection_count = fields.Integer(
+        string="Selected records", compute="_compute_selection_summary"
+    )
+    selection_summary = fields.Html(
+        string="Summary", compute="_compute_selection_summary"
+    )
+
+    @api.model
+    def _prepare_selection_values(self, records):
+        return {"res_model": records._name, "res_ids": json.dumps(records.ids)}
+
+    @api.model
+    def _format_exclusion_warning(self, records, reasons, limit=10):
+        """Return a text listing the excluded records grouped by reason.
+
+        `reasons` gives the reason of the exclusion of each excluded record
+        ID, at most `limit` records are named for each reason.
+        """
+        names = dict(records.browse(list(reasons)).name_get())
+        names_by_reason = defaultdict(list)
+        for res_id, reason in reasons.items():
+            names_by_reason[reason].append(names[res_id])
+        lines = []
+        for reason, reason_names in names_by_reason.items():
+            reason_names.sort()
+            listed = ", ".join(reason_names[:limit])
+            if len(reason_names) > limit:
+                listed += _(" and {} more").format(len(reason_names) - limit)
+            lines.append("{}: {}".format(reason, listed))
+        return "\n".join(lines)
+
+    def _get_selection_ids(self):
+        """Return the IDs of the selected records still existing."""
+        self.ensure_one()
+        ids = json.loads(self.res_ids or "[]")
+        if not ids or not self.res_model:
+            return ids
+        return self.env[self.res_model].browse(ids).exists().ids
+
+    def _get_selection(self):
+        self.ensure_one()
+        if not self.res_model:
+            return self.env["stock.picking"].browse()
+        return self.env[self.res_model].browse(self._get_selection_ids())
+
+    def _get_selection_shipment_type(self):
+        """Return the shipment type the records have to match, if any."""
+        return False
+
+    def _get_selection_domain(self):
+        """Return the domain filtering the selection on confirmation."""
+        shipment_type = self._get_selection_shipment_type()
+        if not shipment_type:
+            return []
+        if self.res_model == "stock.picking":
+            return [("picking_type_code", "=", shipment_type)]
+        return [("picking_id.picking_type_id.code", "=", shipment_type)]
+
+    def _get_selection_to_process(self):
+        """Return the selected records matching the wizard, searched in SQL."""
+        self.ensure_one()
+        ids = self._get_selection_ids()
+        if not ids:
+            return self._get_selection()
+        return self.env[self.res_model].search(
+            [("id", "in", ids)] + self._get_selection_domain()
+        )
+
+    def _read_selection_counts(self):
+        """Return the number of selected records by operation type as a list
+        of (picking type ID, code, count).
+        """
+        self.ensure_one()
+        ids = self._get_selection_ids()
+        if not ids:
+            return []
+        model = self.env[self.res_model]
+        model.flush(["picking_id"] if "picking_id" in model._fields else None)
+        picking_column = "id" if self.res_model == "stock.picking" else "picking_id"
+        self.env.cr.execute(
+            """
+            SELECT picking.picking_type_id, picking_type.code, COUNT(*)
+            FROM {table} record
+            JOIN stock_picking picking ON picking.id = record.{column}
+            JOIN stock_picking_type picking_type
+                ON picking_type.id = picking.picking_type_id
+            WHERE record.id IN %s
+            GROUP BY picking.picking_type_id, picking_type.code
+            ORDER BY COUNT(*) DESC;
+            """.format(
+                table=model._table, column=picking_column
+            ),
+            (tuple(ids),),
+        )
+        return self.env.cr.fetchall()
+
+    @api.depends("res_model", "res_ids")
+    def _compute_selected_records(self):
+        for wizard in self:
+            selection = wizard._get_selection()
+            for model, fname in self._selection_fields.items():
+                if fname not in wizard._fields:
+                    continue
+                if model == wizard.res_model:
+                    wizard[fname] = selection
+                else:
+                    wizard[fname] = self.env[model].browse()
+
+    @api.depends("res_model", "res_ids")
+    def _compute_selection_summary(self):
+        for wizard in self:
+            wizard.selection_count = len(wizard._get_selection_ids())
+            counts = wizard._read_selection_counts()
+            if not counts:
+                wizard.selection_summary = False
+                continue
+            shipment_type = wizard._get_selection_shipment_type()
+            picking_types = self.env["stock.picking.type"].browse(
+                [picking_type_id for picking_type_id, __, __ in counts]
+            )
+            names = dict(picking_types.name_get())
+            rows = []
+            for picking_type_id, code, count in counts:
+                excluded = shipment_type and code != shipment_type
+                rows.append(
+                    "<tr{}><td>{}</td><td class='text-right'>{}</td>"
+                    "<td>{}</td></tr>".format(
+                        " class='text-muted'" if excluded else "",
+                        html_escape(names[picking_type_id]),
+                        count,
+                        html_escape(_("Excluded (shipment type)")) if excluded else "",
+                    )
+                )
+            wizard.selection_summary = (
+                "<table class='table table-sm'><thead><tr><th>{}</th>"
+                "<th class='text-right'>{}</th><th/></tr></thead>"
+                "<tbody>{}</tbody></table>".format(
+                    html_escape(_("Operation type")),
+                    html_escape(_("Records")),
+                    "".join(rows),
+                )
+            )
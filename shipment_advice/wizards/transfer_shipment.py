@@ -0,0 +1,135 @@
+# Copyright 2021 Camptocamp SA
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+
+
+class WizardTransferShipment(models.TransientModel):
+    _name = "wizard.transfer.shipment"
+    _inherit = "wizard.shipment.selection.mixin"
+    _description = "Transfer content to another shipment"
+
+    picking_ids = fields.Many2many(
+        comodel_name="stock.picking",
+        string="Transfers to move",
+        compute="_compute_selected_records",
+    )
+    move_line_ids = fields.Many2many(
+        comodel_name="stock.move.line",
+        string="Products to move",
+        compute="_compute_selected_records",
+    )
+    package_level_ids = fields.Many2many(
+        comodel_name="stock.package_level",
+        string="Packages to move",
+        compute="_compute_selected_records",
+    )
+    shipment_advice_id = fields.Many2one(
+        comodel_name="shipment.advice",
+        string="Destination Shipment Advice",
+        required=True,
+        domain=[("state", "=", "in_progress")],
+    )
+    warning = fields.Char(string="Warning", readonly=True)
+
+    @api.model
+    def default_get(self, fields_list):
+        """'default_get' method overloaded."""
+        res = super().default_get(fields_list)
+        active_model = self.env.context.get("active_model")
+        active_ids = self.env.context.get("active_ids")
+        if not active_ids:
+            raise UserError(
+                _("Please select at least one record to move to another shipment.")
+            )
+        if active_model == "stock.picking" and active_ids:
+            res = self._default_get_from_stock_picking(res, active_ids)
+        if active_model == "stock.move.line" and active_ids:
+            res = self._default_get_from_stock_move_line(res, active_ids)
+        if active_model == "stock.package_level" and active_ids:
+            res = self._default_get_from_stock_package_level(res, active_ids)
+        return res
+
+    @api.model
+    def _default_get_from_stock_picking(self, res, ids):
+        pickings = self.env["stock.picking"].browse(ids)
+        # We keep only deliveries not canceled/done and loaded in a started shipment
+        pickings_to_keep = pickings.filtered_domain(
+            [
+                ("state", "not in", ("cancel", "done")),
+                ("picking_type_code", "=", "outgoing"),
+                ("move_line_ids.shipment_advice_id.state", "=", "in_progress"),
+            ]
+        )
+        res.update(self._prepare_selection_values(pickings_to_keep))
+        if not pickings_to_keep:
+            res["warning"] = _(
+                "No transfer to move among selected ones (already done or "
+                "not loaded in a shipment)."
+            )
+        elif pickings != pickings_to_keep:
+            res["warning"] = _(
+                "Transfers to include have been updated, keeping only those "
+                "still in progress and loaded in a shipment."
+            )
+        return res
+
+    @api.model
+    def _default_get_from_stock_move_line(self, res, ids):
+        lines = self.env["stock.move.line"].browse(ids)
+        if not lines._check_entire_package():
+            raise UserError(
+                _(
+                    "You cannot move lines which are part of a package, "
+                    "unless you select all the move lines related to this package."
+                )
+            )
+        lines_to_keep = lines.filtered_domain(
+            [
+                ("state", "not in", ("cancel", "done")),
+                ("picking_code", "=", "outgoing"),
+                ("shipment_advice_id.state", "=", "in_progress"),
+            ]
+        )
+        res.update(self._prepare_selection_values(lines_to_keep))
+        if not lines_to_keep:
+            res["warning"] = _(
+                "No product to move among selected ones (already done or "
+                "not loaded in a shipment)."
+            )
+        elif lines != lines_to_keep:
+            res["warning"] = _(
+                "Products to include have been updated, keeping only those "
+                "still in progress and loaded in a shipment."
+            )
+        return res
+
+    @api.model
+    def _default_get_from_stock_package_level(self, res, ids):
+        package_levels = self.env["stock.package_level"].browse(ids)
+        package_levels_to_keep = package_levels.filtered_domain(
+            [
+                ("state", "not in", ("done", "cancel")),
+                ("picking_type_code", "=", "outgoing"),
+                ("move_line_ids.shipment_advice_id.state", "=", "in_progress"),
+            ]
+        )
+        res.update(self._prepare_selection_values(package_levels_to_keep))
+        if not package_levels_to_keep:
+            res["warning"] = _(
+                "No package to move among selected ones (already done or "
+                "not loaded in a shipment)."
+            )
+        elif package_levels != package_levels_to_keep:
+            res["warning"] = _(
+                "Packages to include have been updated, keeping only those "
+                "still in progress and loaded in a shipment."
+            )
+        return res
+
+    def action_transfer(self):
+        """Move the selected loaded records to the destination shipment."""
+        self.ensure_one()
+        self._get_selection_to_process()._transfer_to_shipment(self.shipment_advice_id)
+        return True
@@ -7,15 +7,20 @@ from odoo.exceptions import UserError
 
 class WizardUnloadShipment(models.TransientModel):
     _name = "wizard.unload.shipment"
+    _inherit = "wizard.shipment.selection.mixin"
     _description = "Unload shipment"
 
     picking_ids = fields.Many2many(
-        comodel_name="stock.picking", string="Transfers to unload",
+        comodel_name="stock.picking",
+        string="Transfers to unload",
+        compute="_compute_selected_records",
     )
     move_line_ids = fields.Many2many(
-        comodel_name="stock.move.line", string="Products to unload"
+        comodel_name="stock.move.line",
+        string="Products to unload",
+        compute="_compute_selected_records",
     )
-    warning = fields.Char(string="Warning", readonly=True)
+    warning = fields.Text(string="Warning", readonly=True)
 
     @api.model
     def default_get(self, fields_list):
@@ -33,22 +38,62 @@ class WizardUnloadShipment(models.TransientModel):
             res = self._default_get_from_stock_move_line(res, active_ids)
         return res
 
+    @api.model
+    def _read_picking_exclusion_reasons(self, ids):
+        """Return the reason of exclusion of the transfers which can't be
+        unloaded, indexed by transfer ID.
+        """
+        self.env["stock.picking"].flush(["state", "picking_type_id"])
+        self.env["stock.move.line"].flush(["picking_id", "shipment_advice_id"])
+        self.env["shipment.advice"].flush(["state"])
+        self.env.cr.execute(
+            """
+            SELECT picking.id,
+                picking.state,
+                picking_type.code,
+                COUNT(shipment.id),
+                bool_and(shipment.state = 'in_progress')
+            FROM stock_picking picking
+            JOIN stock_picking_type picking_type
+                ON picking_type.id = picking.picking_type_id
+            LEFT JOIN stock_move_line ml
+                ON ml.picking_id = picking.id
+                AND ml.shipment_advice_id IS NOT NULL
+            LEFT JOIN shipment_advice shipment
+                ON shipment.id = ml.shipment_advice_id
+            WHERE picking.id IN %s
+            GROUP BY picking.id, picking.state, picking_type.code;
+            """,
+            (tuple(ids),),
+        )
+        reasons = {}
+        for (
+            picking_id,
+            state,
+            code,
+            shipment_count,
+            in_progress,
+        ) in self.env.cr.fetchall():
+            if state in ("cancel", "done"):
+                reasons[picking_id] = _("Already done or canceled")
+            elif code != "outgoing":
+                reasons[picking_id] = _("Not a delivery")
+            elif not shipment_count:
+                reasons[picking_id] = _("Not loaded in a shipment")
+            elif not in_progress:
+                reasons[picking_id] = _("Loaded in a shipment not in progress")
+        return reasons
+
     @api.model
     def _default_get_from_stock_picking(self, res, ids):
         pickings = self.env["stock.picking"].browse(ids)
-        # We keep only deliveries not canceled/done
-        pickings_to_keep = pickings.filtered(
-            lambda o: (
-                o.state not in ["cancel", "done"]
-                and o.move_line_ids.shipment_advice_id
-                and all(
-                    state == "in_progress"
-                    for state in o.move_line_ids.shipment_advice_id.mapped("state")
-                )
-                and o.picking_type_code == "outgoing"
-            )
+        # We keep only deliveries not canceled/done loaded in shipments
+        # in progress
+        reasons = self._read_picking_exclusion_reasons(ids)
+        pickings_to_keep = pickings.browse(
+            [picking_id for picking_id in ids if picking_id not in reasons]
         )
-        res["picking_ids"] = pickings_to_keep.ids
+        res.update(self._prepare_selection_values(pickings_to_keep))
         if not pickings_to_keep:
             res["warning"] = _(
                 "No transfer to unload among selected ones (already done or "
@@ -59,24 +104,53 @@ class WizardUnloadShipment(models.TransientModel):
                 "Transfers to include have been updated, keeping only those "
                 "still in progress and related to a shipment."
             )
+        if reasons:
+            res["warning"] += "\n" + self._format_exclusion_warning(pickings, reasons)
         return res
 
+    @api.model
+    def _read_move_line_exclusion_reasons(self, ids):
+        """Return the reason of exclusion of the move lines which can't be
+        unloaded, indexed by move line ID.
+        """
+        self.env["stock.picking"].flush(["picking_type_id"])
+        self.env["stock.move.line"].flush(["state", "picking_id", "shipment_advice_id"])
+        self.env["shipment.advice"].flush(["state"])
+        self.env.cr.execute(
+            """
+            SELECT ml.id, ml.state, picking_type.code, shipment.state
+            FROM stock_move_line ml
+            LEFT JOIN stock_picking picking ON picking.id = ml.picking_id
+            LEFT JOIN stock_picking_type picking_type
+                ON picking_type.id = picking.picking_type_id
+            LEFT JOIN shipment_advice shipment
+                ON shipment.id = ml.shipment_advice_id
+            WHERE ml.id IN %s;
+            """,
+            (tuple(ids),),
+        )
+        reasons = {}
+        for line_id, state, code, shipment_state in self.env.cr.fetchall():
+            if state in ("cancel", "done"):
+                reasons[line_id] = _("Already done or canceled")
+            elif code != "outgoing":
+                reasons[line_id] = _("Not a delivery")
+            elif not shipment_state:
+                reasons[line_id] = _("Not loaded in a shipment")
+            elif shipment_state != "in_progress":
+                reasons[line_id] = _("Loaded in a shipment not in progress")
+        return reasons
+
     @api.model
     def _default_get_from_stock_move_line(self, res, ids):
         lines = self.env["stock.move.line"].browse(ids)
-        # We keep only deliveries not canceled/done
-        lines_to_keep = lines.filtered(
-            lambda o: (
-                o.state not in ["cancel", "done"]
-                and o.shipment_advice_id
-                and all(
-                    state == "in_progress"
-                    for state in o.shipment_advice_id.mapped("state")
-                )
-                and o.picking_code == "outgoing"
-            )
+        # We keep only deliveries not canceled/done loaded in shipments
+        # in progress
+        reasons = self._read_move_line_exclusion_reasons(ids)
+        lines_to_keep = lines.browse(
+            [line_id for line_id in ids if line_id not in reasons]
         )
-        res["move_line_ids"] = lines_to_keep.ids
+        res.update(self._prepare_selection_values(lines_to_keep))
         if not lines_to_keep:
             res["warning"] = _(
                 "No product to unload among selected ones (already done or "
@@ -87,11 +161,12 @@ class WizardUnloadShipment(models.TransientModel):
                 "Products to include have been updated, keeping only those "
                 "still in progress and related to a shipment."
             )
+        if reasons:
+            res["warning"] += "\n" + self._format_exclusion_warning(lines, reasons)
         return res
 
     def action_unload(self):
         """Unload the selected records from their related shipment."""
         self.ensure_one()
-        self.picking_ids._unload_from_shipment()
-        self.move_line_ids._unload_from_shipment()
+        self._get_selection_to_process()._unload_from_shipment()
         return True
@@ -7,13 +7,14 @@ from odoo.exceptions import UserError
 
 class WizardUnplanShipment(models.TransientModel):
     _name = "wizard.unplan.shipment"
+    _inherit = "wizard.shipment.selection.mixin"
     _description = "Unplan shipment"
 
     picking_ids = fields.Many2many(
         comodel_name="stock.picking", string="Transfers to unplan",
     )
     move_ids = fields.Many2many(comodel_name="stock.move", string="Moves to unplan",)
-    warning = fields.Char(string="Warning", readonly=True)
+    warning = fields.Text(string="Warning", readonly=True)
 
     @api.model
     def default_get(self, fields_list):
@@ -31,20 +32,60 @@ class WizardUnplanShipment(models.TransientModel):
             res = self._default_get_from_stock_move(res, active_ids)
         return res
 
+    @api.model
+    def _read_picking_exclusion_reasons(self, ids):
+        """Return the reason of exclusion of the transfers which can't be
+        unplanned, indexed by transfer ID.
+        """
+        self.env["stock.picking"].flush(["state", "picking_type_id"])
+        self.env["stock.move"].flush(["picking_id", "shipment_advice_id"])
+        self.env["shipment.advice"].flush(["state"])
+        self.env.cr.execute(
+            """
+            SELECT picking.id,
+                picking.state,
+                picking_type.code,
+                COUNT(shipment.id),
+                bool_and(shipment.state IN ('draft', 'confirmed'))
+            FROM stock_picking picking
+            JOIN stock_picking_type picking_type
+                ON picking_type.id = picking.picking_type_id
+            LEFT JOIN stock_move move
+                ON move.picking_id = picking.id
+                AND move.shipment_advice_id IS NOT NULL
+            LEFT JOIN shipment_advice shipment
+                ON shipment.id = move.shipment_advice_id
+            WHERE picking.id IN %s
+            GROUP BY picking.id, picking.state, picking_type.code;
+            """,
+            (tuple(ids),),
+        )
+        reasons = {}
+        for (
+            picking_id,
+            state,
+            code,
+            shipment_count,
+            not_started,
+        ) in self.env.cr.fetchall():
+            if state in ("cancel", "done"):
+                reasons[picking_id] = _("Already done or canceled")
+            elif code not in ("incoming", "outgoing"):
+                reasons[picking_id] = _("Neither a reception nor a delivery")
+            elif not shipment_count:
+                reasons[picking_id] = _("Not planned in a shipment")
+            elif not not_started:
+                reasons[picking_id] = _("Planned in a shipment already started")
+        return reasons
+
     @api.model
     def _default_get_from_stock_picking(self, res, ids):
         pickings = self.env["stock.picking"].browse(ids)
-        # We keep only deliveries and receptions not canceled/done
-        pickings_to_keep = pickings.filtered(
-            lambda o: (
-                o.state not in ["cancel", "done"]
-                and o.move_lines.shipment_advice_id
-                and all(
-                    state in ("draft", "confirmed")
-                    for state in o.move_lines.shipment_advice_id.mapped("state")
-                )
-                and o.picking_type_code in ("incoming", "outgoing")
-            )
+        # We keep only deliveries and receptions not canceled/done planned
+        # in shipments not started yet
+        reasons = self._read_picking_exclusion_reasons(ids)
+        pickings_to_keep = pickings.browse(
+            [picking_id for picking_id in ids if picking_id not in reasons]
         )
         res["picking_ids"] = pickings_to_keep.ids
         if not pickings_to_keep:
@@ -57,29 +98,67 @@ class WizardUnplanShipment(models.TransientModel):
                 "Transfers to include have been updated, keeping only those "
                 "still in progress and related to a shipment."
             )
+        if reasons:
+            res["warning"] += "\n" + self._format_exclusion_warning(pickings, reasons)
         return res
 
+    @api.model
+    def _read_move_exclusion_reasons(self, ids):
+        """Return the reason of exclusion of the moves which can't be
+        unplanned, indexed by move ID.
+        """
+        self.env["stock.move"].flush(
+            ["state", "shipment_advice_id", "package_level_id"]
+        )
+        self.env["stock.move.line"].flush(["move_id", "package_level_id"])
+        self.env["shipment.advice"].flush(["state"])
+        self.env.cr.execute(
+            """
+            SELECT move.id,
+                move.state,
+                shipment.state,
+                EXISTS(
+                    SELECT 1
+                    FROM stock_move_line line
+                    JOIN stock_move_line other_line
+                        ON other_line.package_level_id = line.package_level_id
+                    WHERE line.move_id = move.id
+                        AND other_line.move_id != move.id
+                ) OR EXISTS(
+                    SELECT 1
+                    FROM stock_move other_move
+                    WHERE other_move.package_level_id = move.package_level_id
+                        AND other_move.id != move.id
+                )
+            FROM stock_move move
+            LEFT JOIN shipment_advice shipment
+                ON shipment.id = move.shipment_advice_id
+            WHERE move.id IN %s;
+            """,
+            (tuple(ids),),
+        )
+        reasons = {}
+        for move_id, state, shipment_state, shared in self.env.cr.fetchall():
+            if state in ("cancel", "done"):
+                reasons[move_id] = _("Already done or canceled")
+            elif shared:
+                # The package has to be unplanned as a whole, not a part of it
+                reasons[move_id] = _("Linked to other moves through a package")
+            elif not shipment_state:
+                reasons[move_id] = _("Not planned in a shipment")
+            elif shipment_state not in ("draft", "confirmed"):
+                reasons[move_id] = _("Planned in a shipment already started")
+        return reasons
+
     @api.model
     def _default_get_from_stock_move(self, res, ids):
         moves = self.env["stock.move"].browse(ids)
-        # We keep only deliveries and receptions not canceled/done
-        # and not linked to a package level itself linked to other moves
-        # (we want to unplan the package as a whole, not a part of it)
-        moves_to_keep = self.env["stock.move"]
-        for move in moves:
-            other_moves = (
-                move.move_line_ids.package_level_id.move_line_ids.move_id
-                + move.package_level_id.move_ids
-            ) - move
-            if other_moves:
-                continue
-            moves_to_keep |= move
-        moves_to_keep = moves_to_keep.filtered_domain(
-            [
-                ("state", "not in", ["cancel", "done"]),
-                ("shipment_advice_id", "!=", False),
-                ("shipment_advice_id.state", "in", ("draft", "confirmed")),
-            ]
+        # We keep only moves not canceled/done planned in shipments not
+        # started yet and not linked to a package level itself linked to
+        # other moves
+        reasons = self._read_move_exclusion_reasons(ids)
+        moves_to_keep = moves.browse(
+            [move_id for move_id in ids if move_id not in reasons]
         )
         res["move_ids"] = moves_to_keep.ids
         if not moves_to_keep:
@@ -93,11 +172,13 @@ class WizardUnplanShipment(models.TransientModel):
                 "Moves to include have been updated, keeping only those "
                 "still in progress and related to a shipment."
             )
+        if reasons:
+            res["warning"] += "\n" + self._format_exclusion_warning(moves, reasons)
         return res
 
     def action_unplan(self):
         """Unplan the selected records from their related shipment."""
         self.ensure_one()
-        self.picking_ids.move_lines.shipment_advice_id = False
-        self.move_ids.shipment_advice_id = False
+        self.picking_ids.move_lines._unplan_from_shipment()
+        self.move_ids._unplan_from_shipment()
         return True
@@ -1,7 +1,7 @@
 # Copyright 2021 Camptocamp SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl)
 
-from odoo import fields, models
+from odoo import api, fields, models, tools
 
 
 class StockDock(models.Model):
@@ -9,7 +9,7 @@ class StockDock(models.Model):
     _description = "Dock, used by trucks to load/unload goods"
 
     name = fields.Char(required=True)
-    barcode = fields.Char()
+    barcode = fields.Char(copy=False)
     active = fields.Boolean(string="Active", default=True)
     warehouse_id = fields.Many2one(
         comodel_name="stock.warehouse",
@@ -19,6 +19,16 @@ class StockDock(models.Model):
         check_company=True,
         default=lambda self: self._default_warehouse_id(),
     )
+    max_payload = fields.Float(
+        string="Max. payload (kg)",
+        digits=(16, 2),
+        help="Maximum weight that can be loaded through this dock (0 = no limit).",
+    )
+    max_volume = fields.Float(
+        string="Max. volume (m³)",
+        digits=(16, 2),
+        help="Maximum volume that can be loaded through this dock (0 = no limit).",
+    )
     company_id = fields.Many2one(
         comodel_name="res.company",
         string="Company",
@@ -28,6 +38,48 @@ class StockDock(models.Model):
         index=True,
     )
 
+    _sql_constraints = [
+        (
+            "barcode_company_uniq",
+            "unique(barcode, company_id)",
+            "The barcode of a dock must be unique per company!",
+        ),
+    ]
+
     def _default_warehouse_id(self):
         wh = self.env.ref("stock.warehouse0", raise_if_not_found=False)
         return wh.id or False
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        docks = super().create(vals_list)
+        if any(vals.get("barcode") for vals in vals_list):
+            self.clear_caches()
+        return docks
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {"barcode", "warehouse_id", "active"} & set(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache("barcode", "company_id")
+    def _get_id_by_barcode(self, barcode, company_id):
+        dock = self.sudo().search(
+            [("barcode", "=", barcode), ("company_id", "=", company_id)], limit=1
+        )
+        return dock.id
+
+    @api.model
+    def _find_by_barcode(self, barcode, company=None):
+        """Return the active dock of the company having the barcode, the
+        mapping between barcodes and docks being cached.
+        """
+        company = company or self.env.company
+        return self.browse(self._get_id_by_barcode(barcode, company.id))